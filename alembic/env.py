@@ -9,6 +9,10 @@ from app.models.user import User
 from app.models.book import Book
 from app.models.borrow import Borrow
 from app.models.review import Review
+from app.models.user_recommendation import UserRecommendation
+from app.models.book_cooccurrence import BookCooccurrence
+from app.models.user_preference import UserPreference
+from app.models.book_review_consensus import BookReviewConsensus
 
 
 # Load environment variables from .env
@@ -0,0 +1,31 @@
+"""Add stored sentiment columns to reviews
+
+Revision ID: 3f2a9c1d7b45
+Revises: 87b06190008f
+Create Date: 2026-10-16 09:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7b45'
+down_revision: Union[str, None] = '87b06190008f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reviews', sa.Column('sentiment_label', sa.String(), nullable=True))
+    op.add_column('reviews', sa.Column('sentiment_score', sa.Float(), nullable=True))
+    op.add_column('reviews', sa.Column('sentiment_polarity', sa.Float(), nullable=True))
+    # Existing rows are scored by the `backfill_review_sentiment` Celery task
+
+
+def downgrade() -> None:
+    op.drop_column('reviews', 'sentiment_polarity')
+    op.drop_column('reviews', 'sentiment_score')
+    op.drop_column('reviews', 'sentiment_label')
@@ -0,0 +1,26 @@
+"""Add catalog_version to user_recommendations
+
+Revision ID: a1c9e5b7d3f6
+Revises: f4a8c2e6b9d1
+Create Date: 2026-10-16 17:12:44.530118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c9e5b7d3f6'
+down_revision: Union[str, None] = 'f4a8c2e6b9d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_recommendations', sa.Column('catalog_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('user_recommendations', 'catalog_version')
@@ -0,0 +1,35 @@
+"""Add precomputed user_recommendations table
+
+Revision ID: b8e4d2a6c901
+Revises: 3f2a9c1d7b45
+Create Date: 2026-10-16 11:40:05.918233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4d2a6c901'
+down_revision: Union[str, None] = '3f2a9c1d7b45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_recommendations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('recommendations', sa.JSON(), nullable=False),
+    sa.Column('last_review_id', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_user_recommendations_computed_at'), 'user_recommendations', ['computed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_recommendations_computed_at'), table_name='user_recommendations')
+    op.drop_table('user_recommendations')
@@ -0,0 +1,34 @@
+"""Add item-item book_cooccurrences table
+
+Revision ID: c5a7e9f1d3b2
+Revises: b8e4d2a6c901
+Create Date: 2026-10-16 13:05:47.271934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a7e9f1d3b2'
+down_revision: Union[str, None] = 'b8e4d2a6c901'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('book_cooccurrences',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id', 'neighbor_id')
+    )
+    # Existing borrows and reviews are loaded by the `rebuild_book_cooccurrence` Celery task
+
+
+def downgrade() -> None:
+    op.drop_table('book_cooccurrences')
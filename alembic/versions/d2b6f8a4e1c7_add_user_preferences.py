@@ -0,0 +1,48 @@
+"""Add incrementally maintained user_preferences table
+
+Revision ID: d2b6f8a4e1c7
+Revises: c5a7e9f1d3b2
+Create Date: 2026-10-16 21:34:12.508613
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b6f8a4e1c7'
+down_revision: Union[str, None] = 'c5a7e9f1d3b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_preferences',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('favorite_genres', sa.String(), nullable=True),
+    sa.Column('favorite_authors', sa.String(), nullable=True),
+    sa.Column('preferred_reading_level', sa.String(), nullable=True),
+    sa.Column('avg_rating_given', sa.Float(), nullable=True),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.Column('borrow_count', sa.Integer(), nullable=False),
+    sa.Column('author_counts', sa.JSON(), nullable=False),
+    sa.Column('preference_vector', sa.JSON(), nullable=False),
+    sa.Column('last_review_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_preferences_id'), 'user_preferences', ['id'], unique=False)
+    op.create_index(op.f('ix_user_preferences_user_id'), 'user_preferences', ['user_id'], unique=True)
+    # Profiles of existing users are built by the `backfill_user_preferences` Celery task,
+    # or lazily on their first recommendation request
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_preferences_user_id'), table_name='user_preferences')
+    op.drop_index(op.f('ix_user_preferences_id'), table_name='user_preferences')
+    op.drop_table('user_preferences')
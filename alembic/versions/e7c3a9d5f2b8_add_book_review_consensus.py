@@ -0,0 +1,34 @@
+"""Add rolling book_review_consensus table
+
+Revision ID: e7c3a9d5f2b8
+Revises: d2b6f8a4e1c7
+Create Date: 2026-10-16 22:10:38.114520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c3a9d5f2b8'
+down_revision: Union[str, None] = 'd2b6f8a4e1c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('book_review_consensus',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('summary', sa.String(), nullable=False),
+    sa.Column('last_review_id', sa.Integer(), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('book_review_consensus')
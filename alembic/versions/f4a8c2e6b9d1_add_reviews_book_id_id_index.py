@@ -0,0 +1,26 @@
+"""Add reviews(book_id, id) index for keyset pagination
+
+Revision ID: f4a8c2e6b9d1
+Revises: e7c3a9d5f2b8
+Create Date: 2026-10-16 22:41:53.620174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a8c2e6b9d1'
+down_revision: Union[str, None] = 'e7c3a9d5f2b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_reviews_book_id_id', 'reviews', ['book_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reviews_book_id_id', table_name='reviews')
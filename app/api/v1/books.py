@@ -1,16 +1,20 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 from app.services.book_service import BookService
 from app.services.borrow_service import BorrowService
 from app.services.review_service import ReviewService
-from app.services.recommendation_service import RecommendationService
+from app.services.recommendation_service import RecommendationService, consensus_refresh_marks
+from app.workers.tasks import refresh_book_consensus
 from app.schemas.book_schema import BookCreate, BookUpdate, BookResponse
 from app.schemas.borrow_schema import BorrowUserRequest, BorrowResponse
-from app.schemas.review_schema import ReviewUserCreate, ReviewResponse
+from app.schemas.review_schema import ReviewUserCreate, ReviewResponse, ReviewPage
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.deadline import Deadline
+from app.core.sse import sse_response
 from sqlalchemy.orm import Session
 from app.core.logging import get_logger
 
@@ -151,6 +155,37 @@ async def submit_review(
         raise e
 
 
+@books_router.get("/books/{book_id}/reviews", response_model=ReviewPage)
+async def list_book_reviews(
+    book_id: int,
+    after_id: Optional[int] = Query(None, ge=0, description="Return reviews with an id greater than this cursor"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of records to return"),
+    db: Session = Depends(get_db),
+    book_service: BookService = Depends(),
+    review_service: ReviewService = Depends()
+):
+    """List a book's reviews with keyset pagination; pass `next_after_id` back as `after_id`."""
+    try:
+        book_service.get_book(book_id, db)
+        reviews, next_after_id = review_service.list_book_reviews(book_id, db, after_id=after_id, limit=limit)
+        page = ReviewPage(reviews=reviews, next_after_id=next_after_id, limit=limit)
+        return JSONResponse(content=page.model_dump())
+    except HTTPException as e:
+        logger.error(f"Error listing reviews for Book ID {book_id}: {e.detail}")
+        raise e
+
+
+async def schedule_consensus_refresh(analysis: Dict) -> None:
+    """Enqueue the catch-up task for a book whose consensus still misses reviews, once per debounce period."""
+    if not analysis.get("consensus_pending_reviews"):
+        return
+    key = str(analysis["book_id"])
+    if await consensus_refresh_marks.aget(key) is None:
+        await consensus_refresh_marks.aset(key, True)
+        refresh_book_consensus.delay(analysis["book_id"])
+        logger.info(f"Enqueued consensus refresh for Book ID {analysis['book_id']}")
+
+
 @books_router.get("/books/{book_id}/analysis", response_model=Dict)
 async def get_book_analysis(
     book_id: int,
@@ -158,7 +193,9 @@ async def get_book_analysis(
 ):
     try:
         recommendation_service = RecommendationService(db)
-        analysis = await recommendation_service.get_book_reviews_analysis(book_id)
+        deadline = Deadline.after(settings.LLM_DEADLINE_ANALYSIS_SECONDS)
+        analysis = await recommendation_service.get_book_reviews_analysis(book_id, deadline=deadline)
+        await schedule_consensus_refresh(analysis)
         logger.info(f"Analysis retrieved for Book ID {book_id}")
         return analysis
     except HTTPException as e:
@@ -167,3 +204,33 @@ async def get_book_analysis(
     except Exception as e:
         logger.error(f"Error retrieving analysis for Book ID {book_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving analysis: {str(e)}")
+
+
+@books_router.get("/books/{book_id}/analysis/stream")
+async def stream_book_analysis(
+    book_id: int,
+    db: Session = Depends(get_db),
+    book_service: BookService = Depends()
+):
+    """
+    Server-sent events variant of the analysis: a `stats` event with everything but
+    the summary, `summary` events ({"delta": text}) as the LLM writes it, then `done`
+    with the full analysis.
+    """
+    try:
+        book_service.get_book(book_id, db)
+        recommendation_service = RecommendationService(db)
+        deadline = Deadline.after(settings.LLM_DEADLINE_STREAM_SECONDS)
+        logger.info(f"Streaming analysis for Book ID {book_id}")
+        events = recommendation_service.stream_book_reviews_analysis(book_id, deadline=deadline)
+
+        async def events_with_refresh():
+            async for event, data in events:
+                if event == "done":
+                    await schedule_consensus_refresh(data)
+                yield event, data
+
+        return sse_response(events_with_refresh())
+    except HTTPException as e:
+        logger.error(f"Error streaming analysis for Book ID {book_id}: {e.detail}")
+        raise e
@@ -1,9 +1,13 @@
-from http.client import HTTPException
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Dict
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.database import get_db
-from app.services.recommendation_service import RecommendationService
+from app.core.deadline import Deadline
+from app.core.sse import sse_response
+from app.services.recommendation_service import RecommendationService, recommendation_cache
+from app.services.ai_service import llm_response_cache, llm_router
+from app.schemas.recommendation_schema import BatchRecommendationRequest
 from app.core.logging import get_logger
 
 # Router for recommendation endpoints
@@ -16,13 +20,22 @@ logger = get_logger(__name__)
 async def get_reviews_summary(user_id: int, db: Session = Depends(get_db)):
     try:
         recommendation_service = RecommendationService(db)
-        summary = await recommendation_service.get_genai_reviews_summary(user_id)
+        deadline = Deadline.after(settings.LLM_DEADLINE_REVIEW_SUMMARY_SECONDS)
+        summary = await recommendation_service.get_genai_reviews_summary(user_id, deadline=deadline)
         logger.info(f"GenAI reviews summary retrieved for User ID {user_id}")
         return summary
     except Exception as e:
         logger.error(f"Error retrieving GenAI reviews summary for User ID {user_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving reviews summary: {str(e)}")
 
+@recommendation_router.get("/reviews/summary/stream")
+async def stream_reviews_summary(user_id: int, db: Session = Depends(get_db)):
+    """Server-sent events variant of the reviews summary (`stats`, `summary` deltas, `done`)."""
+    recommendation_service = RecommendationService(db)
+    deadline = Deadline.after(settings.LLM_DEADLINE_STREAM_SECONDS)
+    logger.info(f"Streaming GenAI reviews summary for User ID {user_id}")
+    return sse_response(recommendation_service.stream_genai_reviews_summary(user_id, deadline=deadline))
+
 # Endpoints
 @recommendation_router.get("/recommendations", response_model=List[Dict])
 async def get_recommendations(user_id: int, db: Session = Depends(get_db)):
@@ -34,4 +47,37 @@ async def get_recommendations(user_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"Error retrieving recommendations for User ID {user_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving recommendations for User ID {user_id}, {e}")
-    
+
+
+@recommendation_router.post("/recommendations/batch", response_model=List[Dict])
+async def get_batch_recommendations(request: BatchRecommendationRequest, db: Session = Depends(get_db)):
+    """Score many users against the catalog in one pass (for email and homepage jobs)."""
+    try:
+        recommendation_service = RecommendationService(db)
+        results = await recommendation_service.get_batch_recommendations(request.user_ids, limit=request.limit)
+        logger.info(f"Batch recommendations retrieved for {len(results)} users")
+        return [
+            {"user_id": user_id, "recommendations": recommendations}
+            for user_id, recommendations in results.items()
+        ]
+    except Exception as e:
+        logger.error(f"Error retrieving batch recommendations: {e}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving batch recommendations, {e}")
+
+
+@recommendation_router.get("/recommendations/cache/stats", response_model=Dict)
+async def get_recommendation_cache_stats():
+    """Hit/miss counters of the recommendation cache in this process."""
+    return recommendation_cache.info()
+
+
+@recommendation_router.get("/recommendations/llm-cache/stats", response_model=Dict)
+async def get_llm_cache_stats():
+    """Hit/miss counters of the LLM response cache in this process."""
+    return llm_response_cache.info()
+
+
+@recommendation_router.get("/recommendations/llm-backends/stats", response_model=Dict)
+async def get_llm_backend_stats():
+    """Rolling latency, error rate and circuit state of each LLM backend in this process."""
+    return llm_router.info()
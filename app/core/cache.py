@@ -0,0 +1,377 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.core.redis_client import get_redis
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class CacheStats:
+    """Hit/miss counters of a cache in this process."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def as_dict(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional per-entry TTL."""
+
+    backend = "memory"
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[int] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            self.stats.record(entry is not None)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        # In memory, so there is nothing to move off the event loop
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.stats = CacheStats()
+
+    def info(self) -> Dict:
+        return {"backend": self.backend, "size": len(self.entries), **self.stats.as_dict()}
+
+
+class RedisCache:
+    """
+    JSON values in Redis under a key prefix, expired by Redis TTL. Redis errors count as misses.
+
+    With `max_size`, a sorted set of keys by last access bounds the entry count:
+    every `max_size // 100` writes the least recently used entries above the bound
+    are deleted, so the bound is exceeded by at most that many entries. (Global
+    eviction through `maxmemory-policy` is not used, as it could also evict the
+    version counters and other keys without a TTL.)
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, prefix: str, ttl_seconds: Optional[int] = None, max_size: Optional[int] = None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.index_key = f"{prefix}:__lru__"
+        self.evict_every = max(1, (max_size or 0) // 100)
+        self.writes = 0
+        self.stats = CacheStats()
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.get(self._key(key))
+                if self.max_size:
+                    pipe.zadd(self.index_key, {key: time.time()}, xx=True)
+                raw = pipe.execute()[0]
+        except Exception as e:
+            logger.error(f"Redis cache get failed for {key}: {e}")
+            raw = None
+        self.stats.record(raw is not None)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(self._key(key), json.dumps(value), ex=self.ttl_seconds)
+                if self.max_size:
+                    pipe.zadd(self.index_key, {key: time.time()})
+                pipe.execute()
+            self.writes += 1
+            if self.max_size and self.writes % self.evict_every == 0:
+                self._evict()
+        except Exception as e:
+            logger.error(f"Redis cache set failed for {key}: {e}")
+
+    def _evict(self) -> None:
+        """Delete the least recently used entries above `max_size`."""
+        if self.ttl_seconds:
+            # Keys not touched for a whole TTL have expired in Redis already
+            self.client.zremrangebyscore(self.index_key, 0, time.time() - self.ttl_seconds)
+        excess = self.client.zcard(self.index_key) - self.max_size
+        if excess <= 0:
+            return
+        oldest = self.client.zrange(self.index_key, 0, excess - 1)
+        if oldest:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.delete(*(self._key(key.decode() if isinstance(key, bytes) else key) for key in oldest))
+                pipe.zrem(self.index_key, *oldest)
+                pipe.execute()
+
+    def delete(self, key: str) -> None:
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.delete(self._key(key))
+                pipe.zrem(self.index_key, key)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis cache delete failed for {key}: {e}")
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """`get` on a worker thread, for callers on the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        self.stats = CacheStats()
+
+    def info(self) -> Dict:
+        return {"backend": self.backend, **self.stats.as_dict()}
+
+
+class DiskCache:
+    """
+    JSON values in a SQLite file (WAL mode), shared by every process on the host
+    and kept across restarts. Entries expire after the TTL. Every `max_size // 100`
+    writes, expired entries and the least recently used ones above `max_size` are
+    evicted in one batch. Each process keeps one connection; async callers use
+    `aget`/`aset`, which run the I/O on a worker thread. Errors count as misses.
+    """
+
+    backend = "disk"
+
+    def __init__(self, path: str, max_size: int = 1024, ttl_seconds: Optional[int] = None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = max(1, max_size // 100)
+        self.writes = 0
+        self.lock = threading.Lock()
+        # (path, pid, connection): reopened after a fork or when `path` changes
+        self.conn = None
+        self.stats = CacheStats()
+
+    def _connection(self) -> sqlite3.Connection:
+        """The process's connection, opened (and the schema created) once. Call with `lock` held."""
+        if self.conn is not None and self.conn[:2] == (self.path, os.getpid()):
+            return self.conn[2]
+        if self.conn is not None and self.conn[1] == os.getpid():
+            self.conn[2].close()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at)")
+        conn.commit()
+        self.conn = (self.path, os.getpid(), conn)
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        value = None
+        try:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    now = time.time()
+                    row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+                    if row is not None and row[1] is not None and row[1] < now:
+                        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        row = None
+                    if row is not None:
+                        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                        value = json.loads(row[0])
+        except Exception as e:
+            logger.error(f"Disk cache get failed for {key}: {e}")
+        self.stats.record(value is not None)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    now = time.time()
+                    expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value), expires_at, now),
+                    )
+                    self.writes += 1
+                    if self.writes % self.evict_every == 0:
+                        self._evict(conn, now)
+        except Exception as e:
+            logger.error(f"Disk cache set failed for {key}: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_size
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """`get` on a worker thread, so SQLite I/O does not block the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def delete(self, key: str) -> None:
+        try:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except Exception as e:
+            logger.error(f"Disk cache delete failed for {key}: {e}")
+
+    def clear(self) -> None:
+        try:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("DELETE FROM entries")
+        except Exception as e:
+            logger.error(f"Disk cache clear failed: {e}")
+        self.stats = CacheStats()
+
+    def size(self) -> int:
+        try:
+            with self.lock:
+                return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except Exception as e:
+            logger.error(f"Disk cache size check failed: {e}")
+            return 0
+
+    def info(self) -> Dict:
+        return {"backend": self.backend, "size": self.size(), **self.stats.as_dict()}
+
+
+def build_cache(namespace: str, max_size: int, ttl_seconds: Optional[int] = None, disk_dir: Optional[str] = None):
+    """
+    Redis-backed cache when `REDIS_URL` is configured, otherwise a SQLite file
+    under `disk_dir` when one is given, otherwise an in-process LRU.
+    """
+    client = get_redis()
+    if client is not None:
+        return RedisCache(client, f"luminalib:cache:{namespace}", ttl_seconds, max_size=max_size)
+    if disk_dir:
+        return DiskCache(os.path.join(disk_dir, f"{namespace}.sqlite3"), max_size=max_size, ttl_seconds=ttl_seconds)
+    return LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+
+class VersionCounters:
+    """
+    Monotonic version counters used to build cache keys (e.g. per user, per catalog).
+    Bumping a counter makes every key built from the old value unreachable.
+    Shared through Redis INCR when configured, in-process otherwise.
+    """
+
+    def __init__(self, prefix: str = "luminalib:version"):
+        self.prefix = prefix
+        self.local = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> int:
+        client = get_redis()
+        if client is not None:
+            try:
+                return int(client.get(f"{self.prefix}:{name}") or 0)
+            except Exception as e:
+                logger.error(f"Redis version read failed for {name}: {e}")
+        with self.lock:
+            return self.local.get(name, 0)
+
+    def get_many(self, names: List[str]) -> List[int]:
+        """Several counters in one Redis round trip (MGET)."""
+        client = get_redis()
+        if client is not None:
+            try:
+                return [int(value or 0) for value in client.mget([f"{self.prefix}:{name}" for name in names])]
+            except Exception as e:
+                logger.error(f"Redis version read failed for {names}: {e}")
+        with self.lock:
+            return [self.local.get(name, 0) for name in names]
+
+    async def aget_many(self, names: List[str]) -> List[int]:
+        """`get_many` for callers on the event loop; the Redis read runs on a worker thread."""
+        if get_redis() is None:
+            return self.get_many(names)
+        return await asyncio.to_thread(self.get_many, names)
+
+    async def aget(self, name: str) -> int:
+        return (await self.aget_many([name]))[0]
+
+    def bump(self, name: str) -> int:
+        client = get_redis()
+        if client is not None:
+            try:
+                return int(client.incr(f"{self.prefix}:{name}"))
+            except Exception as e:
+                logger.error(f"Redis version bump failed for {name}: {e}")
+        with self.lock:
+            self.local[name] = self.local.get(name, 0) + 1
+            return self.local[name]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.local.clear()
+
+
+# Shared version counters, bumped by the write paths that invalidate cached results
+cache_versions = VersionCounters()
@@ -15,10 +15,100 @@ class Settings(BaseSettings):
     AZURE_OPENAI_ENDPOINT: Optional[str] = None
     AZURE_API_VERSION: Optional[str] = None
     ENABLE_AGENT: Optional[str] = None
+    #Custom HTTP LLM backend (pooled async client, see app/core/http_client.py)
+    CUSTOM_LLM_URL: str = "https://apifreellm.com/api/v1/chat"
+    LLM_HTTP_TIMEOUT_SECONDS: float = 60.0
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_HTTP_MAX_CONNECTIONS: int = 20
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    #Comma-separated LLM backends to route over: openai, azureai, custom, or custom endpoint URLs (default: LLM_CLIENT)
+    LLM_BACKENDS: Optional[str] = None
+    #Backend routing: calls in the rolling stats window, error rate that ranks a backend last, share of exploration calls
+    LLM_ROUTER_WINDOW: int = 50
+    LLM_ROUTER_MAX_ERROR_RATE: float = 0.5
+    LLM_ROUTER_EXPLORE_RATE: float = 0.05
+    #Hedged requests: wait for the primary backend's p95 latency (this delay until enough samples) before racing a second one
+    LLM_HEDGE_DELAY_SECONDS: float = 2.0
+    LLM_HEDGE_MIN_SAMPLES: int = 5
+    #Deadlines of LLM-backed work per route class, in seconds (0 = none); the fallback summary is served when they run out
+    LLM_DEADLINE_ANALYSIS_SECONDS: float = 10.0
+    LLM_DEADLINE_REVIEW_SUMMARY_SECONDS: float = 10.0
+    LLM_DEADLINE_BACKGROUND_SECONDS: float = 0
+    LLM_DEADLINE_STREAM_SECONDS: float = 60.0
+    #Streamed (SSE) summaries: size of the pieces a non-streaming backend's answer is sent in
+    LLM_STREAM_CHUNK_CHARS: int = 32
+    #LLM retries (exponential backoff with full jitter) and per-backend circuit breaker
+    LLM_MAX_RETRIES: int = 2
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 8.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    #LLM rate limit shared by API and worker processes (0 disables a bucket)
+    LLM_REQUESTS_PER_SECOND: float = 5.0
+    LLM_TOKENS_PER_MINUTE: int = 90000
+    LLM_EXPECTED_COMPLETION_TOKENS: int = 300
+    #Content-addressed LLM response cache (Redis when REDIS_URL is set, otherwise a SQLite file in LLM_CACHE_DIR)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_DIR: str = "data/llm_cache"
+    LLM_CACHE_SIZE: int = 10000
+    LLM_CACHE_TTL_SECONDS: int = 604800
+    #Map-reduce summarization of long texts (estimated tokens per chunk, concurrent LLM calls, summaries per reduce call)
+    SUMMARY_CHUNK_TOKENS: int = 3000
+    SUMMARY_MAX_CONCURRENCY: int = 4
+    SUMMARY_REDUCE_FANIN: int = 8
     #S3 configuration
     S3_BUCKET_NAME: Optional[str] = None
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
+    #Recommendation index configuration
+    BOOK_INDEX_DIR: str = "data/index"
+    BOOK_INDEX_MAX_FEATURES: int = 5000
+    BOOK_INDEX_REBUILD_RATIO: float = 0.2
+    #How often a process checks for an index saved by another process
+    BOOK_INDEX_RELOAD_SECONDS: int = 300
+    # "exact" scores the whole catalog, "lsh" only the approximate nearest-neighbour candidates
+    RECOMMENDATION_INDEX_MODE: str = "exact"
+    LSH_NUM_TABLES: int = 16
+    LSH_NUM_BITS: int = 10
+    LSH_PROBES: int = 4
+    LSH_MIN_CATALOG_SIZE: int = 10000
+    LSH_MAX_CANDIDATE_RATIO: float = 0.3
+    #Precomputed recommendations
+    RECOMMENDATION_TOP_N: int = 20
+    RECOMMENDATION_STALENESS_SECONDS: int = 3600
+    RECOMMENDATION_REFRESH_INTERVAL_SECONDS: int = 300
+    RECOMMENDATION_REFRESH_BATCH_SIZE: int = 500
+    #Item-item collaborative filtering
+    RECOMMENDATION_CF_WEIGHT: float = 0.3
+    COOCCURRENCE_MAX_HISTORY: int = 200
+    COOCCURRENCE_MAX_NEIGHBORS: int = 100
+    #Result caching, shared through Redis when REDIS_URL is set
+    REDIS_URL: Optional[str] = None
+    RECOMMENDATION_CACHE_SIZE: int = 10000
+    RECOMMENDATION_CACHE_TTL_SECONDS: int = 600
+    #Trending leaderboard for cold-start recommendations
+    TRENDING_HALF_LIFE_HOURS: float = 72.0
+    TRENDING_BORROW_WEIGHT: float = 1.0
+    TRENDING_REVIEW_WEIGHT: float = 1.0
+    TRENDING_TOP_SIZE: int = 100
+    TRENDING_SEED_DAYS: int = 30
+    #Rolling review consensus for the book analysis endpoint (new reviews folded per LLM call)
+    BOOK_CONSENSUS_BATCH_SIZE: int = 200
+    #A book's consensus catch-up task is enqueued at most once per this many seconds
+    BOOK_CONSENSUS_REFRESH_DEBOUNCE_SECONDS: int = 300
+    #Representative review sampling for LLM prompts (estimated tokens of the reviews section)
+    ANALYSIS_PROMPT_TOKEN_BUDGET: int = 3000
+    REVIEW_COMMENT_MAX_TOKENS: int = 150
+    REVIEW_DUPLICATE_THRESHOLD: float = 0.8
+    #Reviews embedded in the analysis response; the rest are paged through GET /api/books/{book_id}/reviews
+    ANALYSIS_EMBEDDED_REVIEWS: int = 20
+    #Cached GenAI review summaries and book analyses
+    ANALYSIS_CACHE_SIZE: int = 5000
+    ANALYSIS_CACHE_TTL_SECONDS: int = 86400
+    #Single-flight coalescing of identical LLM-backed requests (cross-process lock through Redis)
+    SINGLE_FLIGHT_LOCK_TTL_SECONDS: float = 120.0
+    SINGLE_FLIGHT_WAIT_SECONDS: float = 60.0
+    SINGLE_FLIGHT_POLL_SECONDS: float = 0.2
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,25 @@
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    Time budget of one request, passed down to the LLM calls it makes so that
+    waits, retries and timeouts never run past it.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def after(cls, seconds: Optional[float]) -> Optional["Deadline"]:
+        """A deadline `seconds` from now, or None (no deadline) for 0/None."""
+        return cls(seconds) if seconds else None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
@@ -0,0 +1,38 @@
+import asyncio
+import weakref
+import httpx
+from app.core.config import settings
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+# One pooled client per event loop: httpx connections belong to the loop that opened
+# them, and Celery tasks run each coroutine in a fresh loop via asyncio.run
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Shared, connection-pooled async HTTP client for outbound LLM calls on the
+    running event loop. Keep-alive connections are reused across requests.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT_SECONDS, connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_http_client() -> None:
+    """Close the running loop's client, e.g. on application shutdown."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+from app.core.redis_client import get_redis
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class TokenBucketLimiter:
+    """
+    Two token buckets checked together: one for requests per second and one for
+    (estimated) tokens per minute. Each bucket holds at most one period's worth,
+    so bursts are capped at the provider limit and throughput converges to it.
+
+    When `REDIS_URL` is configured the buckets live in one Redis hash and are
+    refilled and taken in a Lua script, so the API and Celery workers share one
+    budget. Otherwise (or when Redis fails) the buckets live in this process.
+    A rate of 0 disables that bucket.
+    """
+
+    # Refill both buckets to the Redis server's clock, take from them only if both have enough
+    # and return the seconds to wait otherwise (as a string; Lua numbers become integers)
+    SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local req_rate, tok_rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local req_cap, tok_cap, need = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+    local state = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts')
+    local req = tonumber(state[1]) or req_cap
+    local tok = tonumber(state[2]) or tok_cap
+    local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+    req = math.min(req_cap, req + elapsed * req_rate)
+    tok = math.min(tok_cap, tok + elapsed * tok_rate)
+    local wait = 0
+    if req_cap > 0 and req < 1 then wait = math.max(wait, (1 - req) / req_rate) end
+    if tok_cap > 0 and tok < need then wait = math.max(wait, (need - tok) / tok_rate) end
+    if wait == 0 then
+        if req_cap > 0 then req = req - 1 end
+        if tok_cap > 0 then tok = tok - need end
+    end
+    redis.call('HSET', KEYS[1], 'req', req, 'tok', tok, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], 120)
+    return tostring(wait)
+    """
+
+    def __init__(self, name: str, requests_per_second: float, tokens_per_minute: float):
+        self.key = f"luminalib:ratelimit:{name}"
+        self.request_rate = max(0.0, requests_per_second)
+        self.token_rate = max(0.0, tokens_per_minute) / 60.0
+        self.request_capacity = max(1.0, self.request_rate) if self.request_rate else 0.0
+        self.token_capacity = max(0.0, tokens_per_minute)
+        self.lock = threading.Lock()
+        self.script = None
+        self.clear()
+
+    def clear(self) -> None:
+        """Refill the in-process buckets (a Redis hash is left untouched)."""
+        with self.lock:
+            self.requests = self.request_capacity
+            self.tokens = self.token_capacity
+            self.updated_at = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.request_capacity or self.token_capacity)
+
+    def _clamp(self, tokens: int) -> float:
+        # A call larger than the whole minute budget would otherwise wait forever
+        return min(float(max(tokens, 0)), self.token_capacity) if self.token_capacity else 0.0
+
+    def _take_local(self, tokens: float, now: float) -> float:
+        """Take one request and `tokens` tokens if both buckets allow; otherwise return the seconds to wait."""
+        with self.lock:
+            elapsed = max(0.0, now - self.updated_at) if self.updated_at is not None else 0.0
+            self.updated_at = now
+            self.requests = min(self.request_capacity, self.requests + elapsed * self.request_rate)
+            self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_rate)
+            wait = 0.0
+            if self.request_capacity and self.requests < 1:
+                wait = max(wait, (1 - self.requests) / self.request_rate)
+            if self.token_capacity and self.tokens < tokens:
+                wait = max(wait, (tokens - self.tokens) / self.token_rate)
+            if wait == 0.0:
+                if self.request_capacity:
+                    self.requests -= 1
+                if self.token_capacity:
+                    self.tokens -= tokens
+            return wait
+
+    def _take_redis(self, client, tokens: float) -> float:
+        if self.script is None:
+            self.script = client.register_script(self.SCRIPT)
+        wait = self.script(
+            keys=[self.key],
+            args=[self.request_rate, self.token_rate, self.request_capacity, self.token_capacity, tokens],
+        )
+        return float(wait)
+
+    def try_acquire(self, tokens: int = 0, now: Optional[float] = None) -> float:
+        """Take capacity for one call if available. Returns 0 on success, else the seconds to wait."""
+        if not self.enabled:
+            return 0.0
+        tokens = self._clamp(tokens)
+        client = get_redis()
+        if client is not None:
+            try:
+                return self._take_redis(client, tokens)
+            except Exception as e:
+                logger.error(f"Redis rate limiter failed for {self.key}: {e}")
+        return self._take_local(tokens, time.monotonic() if now is None else now)
+
+    async def acquire(self, tokens: int = 0, max_wait: Optional[float] = None) -> bool:
+        """
+        Wait until one call of about `tokens` tokens fits the budget. Returns False,
+        without taking anything, as soon as the wait would exceed `max_wait` seconds.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                if waited:
+                    logger.info(f"Rate limiter {self.key} delayed a call by {waited:.2f}s")
+                return True
+            if max_wait is not None and waited + wait > max_wait:
+                logger.warning(f"Rate limiter {self.key} wait of {wait:.2f}s exceeds the remaining budget")
+                return False
+            await asyncio.sleep(wait)
+            waited += wait
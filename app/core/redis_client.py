@@ -0,0 +1,21 @@
+import redis
+from app.core.config import settings
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+_client = None
+
+
+def get_redis():
+    """
+    Shared Redis client when `REDIS_URL` is configured, otherwise None.
+    Callers fall back to in-process state when this returns None.
+    """
+    global _client
+    if not settings.REDIS_URL:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _client
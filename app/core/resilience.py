@@ -0,0 +1,77 @@
+import random
+import threading
+import time
+from typing import Optional
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based): exponential backoff
+    with full jitter, uniform in [0, min(max_seconds, base_seconds * 2 ** attempt)].
+    """
+    return random.uniform(0, min(max_seconds, base_seconds * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Per-backend circuit breaker in this process.
+
+    Closed: calls go through, and `failure_threshold` consecutive failures open
+    the circuit. Open: calls are rejected immediately for `reset_seconds`.
+    Half-open: after that, one trial call is let through; its success closes
+    the circuit and its failure opens it again. A trial that never reports back
+    (e.g. a cancelled hedge) is replaced by another after `reset_seconds`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def available(self, now: Optional[float] = None) -> bool:
+        """Whether `allow` would let a call through, without taking the half-open trial."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return self.state == self.CLOSED or now - self.opened_at >= self.reset_seconds
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Whether a call may be attempted now; moving to half-open lets exactly one through."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if now - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = now
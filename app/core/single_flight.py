@@ -0,0 +1,116 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key.
+
+    In this process, callers that arrive while a computation for their key is
+    running await that computation and share its result (or exception). Across
+    processes, when `REDIS_URL` is configured, the leader holds a short-lived
+    Redis lock; other processes poll `cache_get` for the leader's result
+    instead of starting the same computation, and compute themselves only if
+    the lock goes away without a result or `wait_seconds` pass. Redis calls
+    run on a worker thread so they do not block the event loop.
+    """
+
+    # Delete the lock only if it still holds our token
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, namespace: str,
+                 lock_ttl_seconds: float = settings.SINGLE_FLIGHT_LOCK_TTL_SECONDS,
+                 wait_seconds: float = settings.SINGLE_FLIGHT_WAIT_SECONDS,
+                 poll_seconds: float = settings.SINGLE_FLIGHT_POLL_SECONDS):
+        self.namespace = namespace
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        # Futures belong to one event loop, so flights are keyed by loop as well
+        self.in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 cache_get: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Return `await fn()`, shared with every concurrent caller of the same key."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        existing = self.in_flight.get(flight_key)
+        if existing is not None:
+            try:
+                # Shielded so a follower that gives up does not cancel the shared result
+                return await asyncio.shield(existing)
+            except asyncio.CancelledError:
+                if not existing.cancelled():
+                    raise
+                # The leader was cancelled, not this caller: compute it here instead
+                return await self.do(key, fn, cache_get)
+
+        future = loop.create_future()
+        self.in_flight[flight_key] = future
+        try:
+            result = await self._run_across_processes(key, fn, cache_get)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody was waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.in_flight.pop(flight_key, None)
+
+    async def _run_across_processes(self, key: str, fn: Callable[[], Awaitable[Any]],
+                                    cache_get: Optional[Callable[[], Awaitable[Any]]]) -> Any:
+        client = get_redis()
+        if client is None or cache_get is None:
+            return await fn()
+
+        lock_key = f"luminalib:singleflight:{self.namespace}:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await asyncio.to_thread(
+                client.set, lock_key, token, nx=True, px=int(self.lock_ttl_seconds * 1000)
+            )
+        except Exception as e:
+            logger.error(f"Redis single-flight lock failed for {lock_key}: {e}")
+            return await fn()
+
+        if acquired:
+            try:
+                return await fn()
+            finally:
+                try:
+                    await asyncio.to_thread(client.eval, self.RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.error(f"Redis single-flight release failed for {lock_key}: {e}")
+
+        # Another process is computing this key: wait for its result to reach the cache
+        deadline = time.monotonic() + self.wait_seconds
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_seconds)
+                cached = await cache_get()
+                if cached is not None:
+                    return cached
+                if not await asyncio.to_thread(client.exists, lock_key):
+                    break
+        except Exception as e:
+            logger.error(f"Redis single-flight wait failed for {lock_key}: {e}")
+        return await fn()
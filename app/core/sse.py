@@ -0,0 +1,21 @@
+import json
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+
+def format_sse(event: str, data) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    """Send an async iterable of (event, data) pairs as `text/event-stream`, unbuffered by proxies."""
+    async def body():
+        async for event, data in events:
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
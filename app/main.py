@@ -1,15 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.openapi.utils import get_openapi
 from app.api.v1.auth import auth_router
 from app.api.v1.books import books_router
 from app.api.v1.recommendations import recommendation_router
 from app.api.v1.auth import verify_token
+from app.core.config import settings
+from app.core.http_client import close_http_client
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not settings.REDIS_URL:
+        logger.warning(
+            "REDIS_URL is not set: caches and their version counters are per process, "
+            "so invalidations do not reach other API or worker processes"
+        )
+    yield
+    # Release the pooled LLM connections
+    await close_http_client()
 
 
 app = FastAPI(
     title="LuminaLib",
     description="An intelligent library system",
     version="1.0.0",
+    lifespan=lifespan,
     openapi_tags=[
         {
             "name": "Authentication",
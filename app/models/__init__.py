@@ -4,5 +4,8 @@ from app.models.book import Book
 from app.models.review import Review
 from app.models.borrow import Borrow
 from app.models.user_preference import UserPreference
+from app.models.user_recommendation import UserRecommendation
+from app.models.book_cooccurrence import BookCooccurrence
+from app.models.book_review_consensus import BookReviewConsensus
 
-__all__ = ["User", "Book", "Review", "Borrow", "UserPreference"]
+__all__ = ["User", "Book", "Review", "Borrow", "UserPreference", "UserRecommendation", "BookCooccurrence", "BookReviewConsensus"]
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey
+from app.core.database import Base
+
+
+class BookCooccurrence(Base):
+    """
+    One non-zero entry of the item-item co-occurrence matrix (COO layout).
+    `weight` counts the users who interacted with both books; diagonal entries
+    (book_id == neighbor_id) count the users who interacted with the book at all.
+    """
+    __tablename__ = 'book_cooccurrences'
+
+    book_id = Column(Integer, ForeignKey('books.id'), primary_key=True)
+    neighbor_id = Column(Integer, ForeignKey('books.id'), primary_key=True)
+    weight = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from app.core.database import Base
+from datetime import datetime
+
+
+class BookReviewConsensus(Base):
+    """
+    Rolling LLM consensus of a book's reviews. Reviews up to `last_review_id`
+    are folded into `summary`; later refreshes only send the newer reviews.
+    """
+    __tablename__ = 'book_review_consensus'
+
+    book_id = Column(Integer, ForeignKey('books.id'), primary_key=True)
+    summary = Column(String, nullable=False)
+    # Watermark: newest review folded into the summary, and how many reviews it covers
+    last_review_id = Column(Integer, nullable=False, default=0)
+    review_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -1,15 +1,21 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 class Review(Base):
     __tablename__ = 'reviews'
+    # Keyset pagination over a book's reviews (GET /api/books/{book_id}/reviews)
+    __table_args__ = (Index('ix_reviews_book_id_id', 'book_id', 'id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
     book_id = Column(Integer, ForeignKey('books.id'))
     rating = Column(Integer, nullable=False) 
     comment = Column(String, nullable=True)
+    # Sentiment of the comment, computed once when the review is written
+    sentiment_label = Column(String, nullable=True)  # POSITIVE, NEUTRAL, NEGATIVE
+    sentiment_score = Column(Float, nullable=True)  # Polarity normalized to 0.0-1.0
+    sentiment_polarity = Column(Float, nullable=True)  # Raw TextBlob polarity, -1.0 to 1.0
 
     # Relationship
     book = relationship("Book", back_populates="reviews")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, JSON
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -8,7 +8,7 @@ class UserPreference(Base):
     __tablename__ = 'user_preferences'
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True, unique=True)
     
     # Explicit preferences (user-defined)
     favorite_genres = Column(String, nullable=True)  # Comma-separated genres
@@ -18,6 +18,15 @@ class UserPreference(Base):
     preferred_reading_level = Column(String, nullable=True)  # beginner, intermediate, advanced
     avg_rating_given = Column(Float, nullable=True)  # Average rating user gives
     
+    # Running aggregates, updated on every review and borrow by PreferenceService
+    review_count = Column(Integer, nullable=False, default=0)
+    borrow_count = Column(Integer, nullable=False, default=0)
+    author_counts = Column(JSON, nullable=False, default=dict)  # {author: reviews + borrows}
+    # Sparse preference vector over the catalog: {book_id: affinity} of positively reviewed books
+    preference_vector = Column(JSON, nullable=False, default=dict)
+    # Newest review folded into the aggregates
+    last_review_id = Column(Integer, nullable=False, default=0)
+    
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, JSON
+from app.core.database import Base
+from datetime import datetime
+
+
+class UserRecommendation(Base):
+    __tablename__ = 'user_recommendations'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    # Ranked top-N recommendation dicts, as returned by RecommendationService.get_recommendations
+    recommendations = Column(JSON, nullable=False)
+    # Newest review of the user that was taken into account (0 when the user had none)
+    last_review_id = Column(Integer, nullable=False, default=0)
+    # cache_versions "catalog" value the ranking was computed against; a book upload, edit or delete makes the row stale
+    catalog_version = Column(Integer, nullable=False, default=0)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
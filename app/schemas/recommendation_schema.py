@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class BatchRecommendationRequest(BaseModel):
+    """Request body for scoring many users in one pass."""
+    user_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    limit: int = Field(5, ge=1, le=100)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -25,4 +25,11 @@ class ReviewResponse(BaseModel):
     rating: int
     comment: Optional[str] = None
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReviewPage(BaseModel):
+    """One keyset page of a book's reviews; pass `next_after_id` back as `after_id`."""
+    reviews: List[ReviewResponse]
+    next_after_id: Optional[int] = None
+    limit: int
@@ -2,12 +2,24 @@ from dotenv import load_dotenv
 import os
 import inspect
 from openai import AsyncAzureOpenAI
-from pydantic_ai import Agent
+from pydantic_ai import Agent, RunContext
 from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.openai import OpenAIProvider
 from termcolor import colored
-import requests
-from app.core.config import settings
+import asyncio
+import hashlib
+import json
+import re
 import time
+import weakref
+from typing import List, Optional
+from app.core.config import settings
+from app.core.cache import build_cache
+from app.core.deadline import Deadline
+from app.core.http_client import get_http_client
+from app.core.rate_limit import TokenBucketLimiter
+from app.core.resilience import backoff_delay
+from app.services.llm_router import LLMBackendError, LLMRouter
 from app.core.logging import get_logger
 
 #logger configuration
@@ -28,79 +40,212 @@ AZURE_OPENAI_API_KEY = settings.AZURE_OPENAI_API_KEY
 AZURE_OPENAI_ENDPOINT = settings.AZURE_OPENAI_ENDPOINT
 AZURE_API_VERSION = settings.AZURE_API_VERSION
 
+# LLM answers keyed by a hash of backend, model and prompts; shared by the API and the Celery worker
+llm_response_cache = build_cache(
+    "llm_responses",
+    max_size=settings.LLM_CACHE_SIZE,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    disk_dir=settings.LLM_CACHE_DIR,
+)
 
-class LLMAgent:
 
-    agent = None
-    system_prompt = ""
+# Provider budget shared by every process that calls the LLM
+llm_rate_limiter = TokenBucketLimiter("llm", settings.LLM_REQUESTS_PER_SECOND, settings.LLM_TOKENS_PER_MINUTE)
 
-    def __init__(self, system_prompt=system_prompt):
 
+def estimate_call_tokens(system_prompt: str, query: str) -> int:
+    """Prompt tokens (~4 characters each) plus the expected completion length."""
+    return (len(system_prompt) + len(query)) // 4 + settings.LLM_EXPECTED_COMPLETION_TOKENS
 
-        self.system_prompt = system_prompt
-    
-            
-        if LLM_CLIENT == "openai":
-            logger.info("=== LLM client: OpenAI===")
-
-            model = OpenAIModel(AI_MODEL, api_key=LLM_API_KEY)
-            self.agent = Agent(
-                model,
-                system_prompt=self.system_prompt,
-            )
 
-        elif LLM_CLIENT == "azureai":
-            logger.info("=== LLM client: Azure OpenAI===")
+class CustomHTTPBackend:
+    """The custom chat HTTP API, called through the shared pooled async client."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = f"custom:{url}"
+
+    async def call(self, system_prompt: str, query: str):
+        response = await get_http_client().post(
+            self.url,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {LLM_API_KEY}"
+            },
+            json={
+                "message": system_prompt + "\n\n" + query
+            }
+        )
+        if response.status_code != 200:
+            # Throttling and server errors are worth retrying, other client errors are not
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise LLMBackendError(f"Custom API error (status {response.status_code}): {response.text}", retryable=retryable)
+        return response.json().get("response", None)
+
+    async def stream(self, system_prompt: str, query: str):
+        # The API has no streaming mode: the answer is sent in pieces once it is complete
+        answer = await self.call(system_prompt, query)
+        for piece in text_pieces(answer or "", settings.LLM_STREAM_CHUNK_CHARS):
+            yield piece
+
+
+def text_pieces(text: str, size: int):
+    """Cut `text` into consecutive pieces of about `size` characters, ending after a space."""
+    start = 0
+    while start < len(text):
+        end = text.find(" ", start + max(1, size) - 1)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end]
+        start = end
+
+
+def call_instructions(ctx: RunContext[str]) -> str:
+    """The system prompt of a call travels as the run's deps, so one agent serves every prompt."""
+    return ctx.deps
+
+
+class PydanticAIBackend:
+    """
+    OpenAI or Azure OpenAI through a pydantic_ai `Agent`.
+
+    The agent, model and provider client are built once per event loop and
+    reused by every call, on the pooled HTTP client of that loop. Calls only
+    differ in their run arguments (instructions as deps, content as the user
+    prompt), so concurrent calls can share the agent.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # (http client, agent) per event loop, as for the shared HTTP client
+        self.agents = weakref.WeakKeyDictionary()
+
+    def _model(self, http_client) -> OpenAIModel:
+        if self.name == "azureai":
             client = AsyncAzureOpenAI(
                 azure_endpoint=AZURE_OPENAI_ENDPOINT,
                 api_version=AZURE_API_VERSION,
                 api_key=AZURE_OPENAI_API_KEY,
+                http_client=http_client,
             )
-            model = OpenAIModel(AI_MODEL, openai_client=client)
-            self.agent = Agent(
-                model,
-                system_prompt=self.system_prompt,
-            )
-        
+            return OpenAIModel(AI_MODEL, provider=OpenAIProvider(openai_client=client))
+        return OpenAIModel(AI_MODEL, provider=OpenAIProvider(api_key=LLM_API_KEY, http_client=http_client))
 
-    
-    def custom_agent_response(self, query, retry=1):
-        try:
-            response = requests.post(
-                "https://apifreellm.com/api/v1/chat",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {LLM_API_KEY}"
-                },
-                json={
-                    "message": self.system_prompt + "\n\n" + query
-                }
-            )
-            if response.status_code == 200:
-                self.agent = response.json()
-                return response.json()
-            elif retry > 0:
-                time.sleep(25)
-                logger.error(f"Custom API error (status {response.status_code}): {response.text}. Retrying...")
-                return self.custom_agent_response(query, retry=retry-1)
-            else:
-                logger.error(f"Custom API error (status {response.status_code}): {response.text}. No more retries.")
-                self.agent=response
-                return response.json()
-        except Exception as e:
-            if retry > 0:
-                time.sleep(25)
-                logger.error(f"Custom API request failed with exception: {e}. Retrying...")
-                return self.custom_agent_response(query, retry=retry-1)
-            else:
-                logger.error(f"Custom API request failed with exception: {e}. No more retries.")
-                self.agent=str(e)
-                return {"response": None}
+    def agent(self) -> Agent:
+        loop = asyncio.get_running_loop()
+        http_client = get_http_client()
+        entry = self.agents.get(loop)
+        if entry is None or entry[0] is not http_client:
+            logger.info(f"=== LLM client: {self.name} ===")
+            agent = Agent(self._model(http_client), deps_type=str)
+            agent.instructions(call_instructions)
+            entry = (http_client, agent)
+            self.agents[loop] = entry
+        return entry[1]
+
+    async def call(self, system_prompt: str, query: str):
+        result = await self.agent().run(query, deps=system_prompt)
+        return result.output
+
+    async def stream(self, system_prompt: str, query: str):
+        async with self.agent().run_stream(query, deps=system_prompt) as result:
+            async for delta in result.stream_text(delta=True, debounce_by=None):
+                yield delta
+
+
+def build_llm_backends(spec: Optional[str] = None) -> List:
+    """
+    Backends from a comma-separated `LLM_BACKENDS` spec: "openai", "azureai",
+    "custom" (at `CUSTOM_LLM_URL`) or the URL of another custom endpoint.
+    Without a spec, the single backend selected by `LLM_CLIENT`.
+    """
+    spec = spec if spec is not None else settings.LLM_BACKENDS
+    entries = [entry.strip() for entry in (spec or "").split(",") if entry.strip()]
+    if not entries:
+        entries = [LLM_CLIENT if LLM_CLIENT in ["openai", "azureai"] else "custom"]
+    backends = []
+    for entry in entries:
+        if entry in ["openai", "azureai"]:
+            backends.append(PydanticAIBackend(entry))
+        else:
+            backends.append(CustomHTTPBackend(settings.CUSTOM_LLM_URL if entry == "custom" else entry))
+    logger.info(f"=== LLM backends: {', '.join(backend.name for backend in backends)} ===")
+    return backends
+
+
+# Routes every LLM call over the configured backends
+llm_router = LLMRouter(build_llm_backends())
+
+
+def llm_cache_key(system_prompt: str, query: str) -> str:
+    """Content address of an LLM call: SHA-256 of the backend set, model, system prompt and query."""
+    payload = json.dumps([llm_router.name, AI_MODEL, system_prompt, query])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMAgent:
+    """
+    A fixed system prompt plus the shared call path (cache, rate limit,
+    routing, retries). Holds no connection state, so one instance can be
+    kept and called concurrently; per-call content goes in the user query.
+    """
+
+    system_prompt = ""
+
+    def __init__(self, system_prompt=system_prompt):
+        self.system_prompt = system_prompt
+
+    async def _call_with_retries(self, query, caller_name, hedge=False, deadline: Optional[Deadline] = None):
+        """
+        Call the router, retrying failures with exponential backoff and jitter.
+        Returns None without calling when every backend's circuit is open, and
+        as soon as the deadline leaves no room for the next wait, call or retry.
+        """
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            if not llm_router.available():
+                logger.warning(f"{__name__}: {caller_name}, circuits of all LLM backends are open, failing fast")
+                return None
+            if deadline is not None and deadline.expired:
+                logger.warning(f"{__name__}: {caller_name}, deadline of {deadline.seconds}s exceeded before the LLM call")
+                return None
+            # Wait for a share of the provider's request and token budget
+            max_wait = deadline.remaining() if deadline is not None else None
+            if not await llm_rate_limiter.acquire(estimate_call_tokens(self.system_prompt, query), max_wait=max_wait):
+                return None
+            try:
+                call = llm_router.call(self.system_prompt, query, hedge=hedge)
+                # The call is cut off (and its requests cancelled) when the budget runs out
+                answer = await (asyncio.wait_for(call, timeout=deadline.remaining()) if deadline is not None else call)
+                logger.info(
+                    colored(
+                        f"{__name__}: {caller_name}, Agent Response: {answer}", "yellow"
+                    )
+                )
+                return answer
+            except asyncio.TimeoutError:
+                logger.warning(f"{__name__}: {caller_name}, deadline of {deadline.seconds}s exceeded during the LLM call")
+                return None
+            except Exception as e:
+                if not getattr(e, "retryable", True) or attempt == settings.LLM_MAX_RETRIES:
+                    logger.error(f"LLM call failed: {e}. No more retries.")
+                    return None
+                delay = backoff_delay(attempt, settings.LLM_BACKOFF_BASE_SECONDS, settings.LLM_BACKOFF_MAX_SECONDS)
+                if deadline is not None and delay >= deadline.remaining():
+                    logger.error(f"LLM call failed: {e}. No budget left to retry.")
+                    return None
+                logger.error(f"LLM call failed: {e}. Retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+        return None
 
     # @classmethod
-    async def generate_answer(self, user_query):
+    async def generate_answer(self, user_query, hedge=False, deadline: Optional[Deadline] = None):
+        """
+        Answer `user_query` under this agent's system prompt. `hedge` marks
+        latency-sensitive calls, which may race a second backend when the first is slow.
+        Returns None when the `deadline` runs out first.
+        """
         try:
-            caller_name = inspect.stack()[1].function
+            # currentframe is cheap; inspect.stack() reads source files for every frame
+            caller_name = inspect.currentframe().f_back.f_code.co_name
             logger.info(
                 colored(
                     f"{__name__}: {caller_name}, System Prompt: {self.system_prompt}",
@@ -115,41 +260,214 @@ class LLMAgent:
                     f"{__name__}: {caller_name}, User Prompt: {combined_query}", "green"
                 )
             )
-            if LLM_CLIENT not in ["openai", "azureai"]:
-                response = self.custom_agent_response(combined_query)
-                logger.info(
-                    colored(
-                        f"{__name__}: {caller_name}, Agent Response: {response}", "yellow"
-                    )
-                )
-                
-                return response.get("response", None)
-            else:
-                result = await self.agent.run(combined_query)
+            # Identical prompts to the same backends and model are answered from the cache
+            cache_key = llm_cache_key(self.system_prompt, combined_query)
+            if settings.LLM_CACHE_ENABLED:
+                cached = await llm_response_cache.aget(cache_key)
+                if cached is not None:
+                    logger.info(f"{__name__}: {caller_name}, LLM response cache hit {cache_key[:12]}")
+                    return cached
 
-            logger.info(
-                colored(
-                    f"{__name__}: {caller_name}, Agent Response: {result.data}", "yellow"
-                )
-            )
+            answer = await self._call_with_retries(combined_query, caller_name, hedge=hedge, deadline=deadline)
 
-            return result.data
+            if answer is not None and settings.LLM_CACHE_ENABLED:
+                await llm_response_cache.aset(cache_key, answer)
+            return answer
         except Exception as e:
             logger.error(f"Error in generate_answer: {e}")
             return None
 
-class AIService:
-    async def summarize(self, text: str) -> str:
+    async def stream_answer(self, user_query, deadline: Optional[Deadline] = None):
+        """
+        Stream the answer to `user_query` as text pieces, e.g. for server-sent events.
+        Nothing is yielded when no call can be made (open circuits, rate budget or
+        deadline exhausted, or every backend failed before answering); a failure or
+        the deadline once pieces are out is raised. Complete answers are cached,
+        and a cached answer is yielded whole. Streams are not retried.
+        """
+        cache_key = llm_cache_key(self.system_prompt, user_query)
+        if settings.LLM_CACHE_ENABLED:
+            cached = await llm_response_cache.aget(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        if not llm_router.available():
+            logger.warning(f"{__name__}: stream_answer, circuits of all LLM backends are open, failing fast")
+            return
+        if deadline is not None and deadline.expired:
+            return
+        max_wait = deadline.remaining() if deadline is not None else None
+        if not await llm_rate_limiter.acquire(estimate_call_tokens(self.system_prompt, user_query), max_wait=max_wait):
+            return
+
+        # The stream is read by one task (backend clients keep per-task state), which
+        # is cancelled when the deadline passes or the consumer stops listening
+        queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for piece in llm_router.stream(self.system_prompt, user_query):
+                    queue.put_nowait(piece)
+                queue.put_nowait(None)
+            except Exception as e:
+                queue.put_nowait(e)
+
+        producer = asyncio.create_task(produce())
+        pieces = []
         try:
-            system_prompt = f"""You are an expert summarization assistant.
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=deadline.remaining() if deadline is not None else None)
+                except asyncio.TimeoutError:
+                    item = LLMBackendError(f"deadline of {deadline.seconds}s exceeded during the LLM stream")
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    if pieces:
+                        raise item
+                    logger.error(f"LLM stream failed before its first piece: {item}")
+                    return
+                pieces.append(item)
+                yield item
+        finally:
+            producer.cancel()
+        answer = "".join(pieces)
+        if answer and settings.LLM_CACHE_ENABLED:
+            await llm_response_cache.aset(cache_key, answer)
+
+class AIService:
+    """
+    Summarization on top of `LLMAgent`.
+
+    Text that fits in one chunk is summarized in one call. Longer text (whole
+    books) goes through map-reduce: it is split into token-bounded chunks on
+    paragraph and sentence boundaries, the chunks are summarized concurrently
+    with at most `SUMMARY_MAX_CONCURRENCY` calls in flight, and the partial
+    summaries are combined `SUMMARY_REDUCE_FANIN` at a time until one is left.
+    Tokens are estimated at ~4 characters per token.
+    """
+
+    CHARS_PER_TOKEN = 4
+    SUMMARY_PROMPT = """You are an expert summarization assistant.
                                 Return only the summary of the user's text.
-                                Do not add titles, labels, bullet points, explanations, or extra commentary.
-            {text}"""
-            agent = LLMAgent(system_prompt=system_prompt)
-            answer = await agent.generate_answer("")
-            return answer
+                                Do not add titles, labels, bullet points, explanations, or extra commentary."""
+    CHUNK_PROMPT = """You are an expert summarization assistant.
+                                The user's text is one section of a longer document.
+                                Return only a summary of this section that keeps its key events, ideas and names.
+                                Do not add titles, labels, bullet points, explanations, or extra commentary."""
+    REDUCE_PROMPT = """You are an expert summarization assistant.
+                                The user's text is a sequence of summaries of consecutive sections of one document.
+                                Return only a single summary of the whole document that combines them in order.
+                                Do not add titles, labels, bullet points, explanations, or extra commentary."""
+
+    def __init__(self, chunk_tokens: int = settings.SUMMARY_CHUNK_TOKENS,
+                 max_concurrency: int = settings.SUMMARY_MAX_CONCURRENCY,
+                 reduce_fanin: int = settings.SUMMARY_REDUCE_FANIN):
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.reduce_fanin = max(2, reduce_fanin)
+        self.summary_agent = LLMAgent(system_prompt=self.SUMMARY_PROMPT)
+        self.chunk_agent = LLMAgent(system_prompt=self.CHUNK_PROMPT)
+        self.reduce_agent = LLMAgent(system_prompt=self.REDUCE_PROMPT)
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunks of at most `chunk_tokens` estimated tokens, preferring paragraph and sentence breaks."""
+        max_chars = self.chunk_tokens * self.CHARS_PER_TOKEN
+        pieces = []
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = paragraph.strip()
+            while len(paragraph) > max_chars:
+                window = paragraph[:max_chars]
+                cut = max(window.rfind(". "), window.rfind("? "), window.rfind("! "))
+                cut = cut + 1 if cut > 0 else window.rfind(" ")
+                if cut <= 0:
+                    cut = max_chars
+                pieces.append(paragraph[:cut].strip())
+                paragraph = paragraph[cut:].strip()
+            if paragraph:
+                pieces.append(paragraph)
+
+        chunks, current = [], ""
+        for piece in pieces:
+            if current and len(current) + 2 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _summarize_once(self, agent: LLMAgent, text: str, semaphore: asyncio.Semaphore = None,
+                              hedge: bool = False, deadline: Optional[Deadline] = None) -> Optional[str]:
+        # The text is the user message; the agent's system prompt stays the same for every call
+        if semaphore is None:
+            return await agent.generate_answer(text, hedge=hedge, deadline=deadline)
+        async with semaphore:
+            return await agent.generate_answer(text, hedge=hedge, deadline=deadline)
+
+    async def summarize(self, text: str, hedge: bool = False, deadline: Optional[Deadline] = None,
+                        map_reduce: bool = False) -> str:
+        """
+        Summarize `text`; `hedge` is for interactive callers. With `map_reduce`, for
+        raw document text only, text over one chunk is summarized map-reduce style;
+        prompts that carry their own instructions are always sent in one call.
+        Returns None when the `deadline` runs out first.
+        """
+        try:
+            if not map_reduce or len(text) <= self.chunk_tokens * self.CHARS_PER_TOKEN:
+                return await self._summarize_once(self.summary_agent, text, hedge=hedge, deadline=deadline)
+            return await self._map_reduce(text, deadline)
         except Exception as e:
             logger.error(f"Error in AIService.summarize: {e}")
             raise Exception(f"Error in AIService.summarize: {e}")
 
-        
\ No newline at end of file
+    async def stream_summary(self, text: str, deadline: Optional[Deadline] = None):
+        """Summarize `text` in one call as a stream of text pieces (see LLMAgent.stream_answer)."""
+        async for piece in self.summary_agent.stream_answer(text, deadline=deadline):
+            yield piece
+
+    async def _map_reduce(self, text: str, deadline: Optional[Deadline] = None) -> Optional[str]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+        chunks = self.split_text(text)
+        split_seconds = time.perf_counter() - started
+
+        # Map: summarize every chunk, bounded by the semaphore
+        stage_started = time.perf_counter()
+        partials = await asyncio.gather(*(self._summarize_once(self.chunk_agent, chunk, semaphore, deadline=deadline) for chunk in chunks))
+        map_seconds = time.perf_counter() - stage_started
+        partials = [partial for partial in partials if partial]
+        if len(partials) < len(chunks):
+            logger.warning(f"{len(chunks) - len(partials)} of {len(chunks)} chunk summaries failed")
+        if not partials:
+            return None
+
+        # Reduce: combine `reduce_fanin` consecutive summaries per call, level by level
+        stage_started = time.perf_counter()
+        levels = 0
+        while len(partials) > 1:
+            groups = [partials[i:i + self.reduce_fanin] for i in range(0, len(partials), self.reduce_fanin)]
+            combined = await asyncio.gather(*(
+                self._summarize_once(self.reduce_agent, "\n\n".join(group), semaphore, deadline=deadline) if len(group) > 1 else self._passthrough(group[0])
+                for group in groups
+            ))
+            reduced = [summary for summary, group in zip(combined, groups) if len(group) > 1]
+            if not any(reduced):
+                # Nothing was reduced (e.g. the deadline ran out), so there is no summary
+                logger.warning(f"All {len(reduced)} reduce calls of level {levels + 1} failed")
+                return None
+            # A failed reduce call keeps its inputs, so no section is lost
+            partials = [summary or "\n\n".join(group) for summary, group in zip(combined, groups)]
+            levels += 1
+        reduce_seconds = time.perf_counter() - stage_started
+
+        logger.info(
+            f"Map-reduce summary of {len(text)} chars in {len(chunks)} chunks: "
+            f"split {split_seconds:.3f}s, map {map_seconds:.3f}s, reduce {reduce_seconds:.3f}s ({levels} levels)"
+        )
+        return partials[0]
+
+    @staticmethod
+    async def _passthrough(summary: str) -> str:
+        return summary
@@ -0,0 +1,122 @@
+from typing import List
+import numpy as np
+from scipy import sparse
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class LSHIndex:
+    """
+    Random-projection (SimHash) LSH over L2-normalised sparse vectors.
+
+    Each of `num_tables` hash tables projects a vector onto `num_bits` random
+    hyperplanes and uses the sign pattern as a bucket code; vectors with a high
+    cosine similarity are likely to share a bucket in at least one table.
+    Buckets are stored as sorted code arrays per table, so lookups are a
+    `np.searchsorted` and memory stays at a few integers per book.
+
+    Recall/latency trade-off:
+    - more `num_tables` -> higher recall, more candidates to score
+    - more `num_bits` -> smaller buckets, lower recall, fewer candidates
+    - `probes` -> also visit the buckets reached by flipping the least
+      confident bits of the query (multi-probe), raising recall without more tables
+
+    Measured with `python -m benchmarks.ann_benchmark`, the default 16 tables x
+    10 bits reaches recall@10 of 0.58 at 20k books with the same latency as
+    exact scoring, and 0.78 at 200k books. Configurations with higher recall
+    score so many candidates that they are slower than exact scoring, which is
+    why `RECOMMENDATION_INDEX_MODE` defaults to "exact".
+    """
+
+    def __init__(self, num_tables: int = 16, num_bits: int = 10, probes: int = 4, seed: int = 42,
+                 chunk_rows: int = 4096):
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.probes = min(probes, num_bits)
+        self.seed = seed
+        # Rows projected at once by build, bounding the dense chunk_rows x (tables * bits) buffer
+        self.chunk_rows = chunk_rows
+        self.size = 0
+        self.planes = None
+        self.sorted_codes: List[np.ndarray] = []
+        self.sorted_rows: List[np.ndarray] = []
+
+    def _init_planes(self, dims: int) -> None:
+        rng = np.random.default_rng(self.seed)
+        self.planes = rng.standard_normal((dims, self.num_tables * self.num_bits)).astype(np.float32)
+
+    def _projections(self, vectors) -> np.ndarray:
+        projected = vectors @ self.planes
+        if sparse.issparse(projected):
+            projected = projected.toarray()
+        return np.asarray(projected).reshape(-1, self.num_tables, self.num_bits)
+
+    def _codes(self, projections: np.ndarray) -> np.ndarray:
+        weights = (1 << np.arange(self.num_bits, dtype=np.int64))
+        return ((projections > 0).astype(np.int64) * weights).sum(axis=2)
+
+    def build(self, matrix) -> None:
+        """Hash every row of the matrix into all tables, projecting `chunk_rows` rows at a time."""
+        self._init_planes(matrix.shape[1])
+        self.size = matrix.shape[0]
+        self.sorted_codes = []
+        self.sorted_rows = []
+        if self.size == 0:
+            return
+        codes = np.empty((self.size, self.num_tables), dtype=np.int64)
+        for start in range(0, self.size, self.chunk_rows):
+            stop = min(start + self.chunk_rows, self.size)
+            codes[start:stop] = self._codes(self._projections(matrix[start:stop]))
+        for table in range(self.num_tables):
+            order = np.argsort(codes[:, table], kind="stable")
+            self.sorted_codes.append(codes[order, table])
+            self.sorted_rows.append(order)
+        logger.info(f"Built LSH index over {self.size} vectors ({self.num_tables} tables x {self.num_bits} bits)")
+
+    def save(self, path: str) -> None:
+        """Write the hash tables to an .npz file; the planes are regenerated from the seed on load."""
+        np.savez(
+            path,
+            config=np.array([self.num_tables, self.num_bits, self.probes, self.seed, self.planes.shape[0], self.size]),
+            codes=np.array(self.sorted_codes, dtype=np.int64).reshape(self.num_tables, self.size),
+            rows=np.array(self.sorted_rows, dtype=np.int64).reshape(self.num_tables, self.size),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LSHIndex":
+        with np.load(path) as data:
+            num_tables, num_bits, probes, seed, dims, size = (int(value) for value in data["config"])
+            index = cls(num_tables, num_bits, probes, seed)
+            index._init_planes(dims)
+            index.size = size
+            index.sorted_codes = list(data["codes"])
+            index.sorted_rows = list(data["rows"])
+        return index
+
+    def _probe_codes(self, projections: np.ndarray) -> np.ndarray:
+        """Bucket codes to visit per query and table: the exact bucket plus single-bit flips of the least confident bits."""
+        codes = self._codes(projections)
+        if self.probes == 0:
+            return codes[:, :, None]
+        least_confident = np.argsort(np.abs(projections), axis=2)[:, :, :self.probes]
+        flipped = codes[:, :, None] ^ (1 << least_confident.astype(np.int64))
+        return np.concatenate([codes[:, :, None], flipped], axis=2)
+
+    def query(self, vectors) -> np.ndarray:
+        """Return the sorted, unique candidate rows for a batch of query vectors."""
+        if self.planes is None:
+            return np.array([], dtype=np.int64)
+        probe_codes = self._probe_codes(self._projections(vectors))
+        found = []
+        for table in range(len(self.sorted_codes)):
+            table_codes = probe_codes[:, table, :].ravel()
+            starts = np.searchsorted(self.sorted_codes[table], table_codes, side="left")
+            ends = np.searchsorted(self.sorted_codes[table], table_codes, side="right")
+            for start, end in zip(starts, ends):
+                if end > start:
+                    found.append(self.sorted_rows[table][start:end])
+        if not found:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(found))
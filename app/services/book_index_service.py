@@ -0,0 +1,468 @@
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlalchemy.orm import Session
+from app.models.book import Book
+from app.services.ann_index_service import LSHIndex
+from app.core.cache import cache_versions
+from app.core.config import settings
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+def book_text(book) -> str:
+    """Text representation of a book used for content similarity."""
+    return f"{book.title} {book.author} {book.description or ''} {book.summary or ''}"
+
+
+class BookIndexService:
+    """
+    Process-wide TF-IDF index of the book catalog.
+
+    The vectorizer is fitted once over the whole catalog and the L2-normalised
+    book vectors are kept as a CSR matrix (one row per book) that is persisted
+    with `scipy.sparse.save_npz`, so a restart only has to load it from disk.
+
+    Books that are uploaded, edited or get a summary are re-vectorized into a
+    small delta matrix, and their old rows in the base matrix are masked out,
+    so the request path never copies the catalog. The `update_book_index`
+    Celery task folds the delta into the base matrix, persists it and refits
+    the vocabulary once enough of the catalog has changed. Other processes
+    pick up a newer saved index at most every `reload_seconds`; until then
+    they serve their own delta, and `sync_catalog` adds books they missed.
+
+    Similarity queries run either exactly over the whole catalog or, in "lsh"
+    mode, only over candidates retrieved from a random-projection LSH index
+    built lazily on top of the same matrix.
+    """
+
+    MATRIX_FILE = "book_vectors.npz"
+    IDS_FILE = "book_ids.npy"
+    VECTORIZER_FILE = "vectorizer.joblib"
+    LSH_FILE = "lsh_tables.npz"
+
+    def __init__(self, index_dir: str = settings.BOOK_INDEX_DIR,
+                 max_features: int = settings.BOOK_INDEX_MAX_FEATURES,
+                 rebuild_ratio: float = settings.BOOK_INDEX_REBUILD_RATIO,
+                 mode: str = settings.RECOMMENDATION_INDEX_MODE,
+                 reload_seconds: float = settings.BOOK_INDEX_RELOAD_SECONDS):
+        self.index_dir = index_dir
+        self.max_features = max_features
+        self.rebuild_ratio = rebuild_ratio
+        self.reload_seconds = reload_seconds
+        self.mode = mode
+        self.lsh_num_tables = settings.LSH_NUM_TABLES
+        self.lsh_num_bits = settings.LSH_NUM_BITS
+        self.lsh_probes = settings.LSH_PROBES
+        self.lsh_min_catalog_size = settings.LSH_MIN_CATALOG_SIZE
+        self.lsh_max_candidate_ratio = settings.LSH_MAX_CANDIDATE_RATIO
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop the in-memory index (files on disk are left untouched)."""
+        with self.lock:
+            self.vectorizer: Optional[TfidfVectorizer] = None
+            self.matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+            self.book_ids = np.array([], dtype=np.int64)
+            self.row_of = {}
+            # Base rows that are still current; rows of edited or deleted books are masked out
+            self.live = np.array([], dtype=bool)
+            self.dead_rows = 0
+            # Vectors of books added or edited since the base matrix was built or loaded
+            self.delta_matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+            self.delta_ids: List[int] = []
+            self.delta_row_of = {}
+            self.max_indexed_id = 0
+            self.updates_since_fit = 0
+            self.loaded_mtime = None
+            self.checked_at = None
+            self.lsh: Optional[LSHIndex] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.book_ids) - self.dead_rows + len(self.delta_ids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _disk_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._path(self.MATRIX_FILE))
+        except OSError:
+            return None
+
+    def _set_rows(self, matrix, book_ids) -> None:
+        """Replace the base matrix and empty the delta."""
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.book_ids = np.asarray(book_ids, dtype=np.int64)
+        self.row_of = {int(book_id): row for row, book_id in enumerate(self.book_ids)}
+        self.live = np.ones(len(self.book_ids), dtype=bool)
+        self.dead_rows = 0
+        self._set_delta(sparse.csr_matrix((0, self.matrix.shape[1]), dtype=np.float64), [])
+        self.max_indexed_id = int(self.book_ids.max()) if len(self.book_ids) else 0
+        self.lsh = None
+
+    def _set_delta(self, matrix, book_ids: List[int]) -> None:
+        self.delta_matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.delta_ids = list(book_ids)
+        self.delta_row_of = {book_id: row for row, book_id in enumerate(self.delta_ids)}
+
+    def _mask_base_row(self, book_id: int) -> bool:
+        row = self.row_of.get(book_id)
+        if row is None or not self.live[row]:
+            return False
+        self.live[row] = False
+        self.dead_rows += 1
+        return True
+
+    def _fold(self) -> None:
+        """Merge the delta into the base matrix, dropping masked rows. Copies the catalog, so only the worker does it."""
+        if not self.delta_ids and not self.dead_rows:
+            return
+        matrix = sparse.vstack([self.matrix[self.live], self.delta_matrix], format="csr")
+        book_ids = np.concatenate([self.book_ids[self.live], np.array(self.delta_ids, dtype=np.int64)])
+        self._set_rows(matrix, book_ids)
+
+    def _contains(self, book_id: int) -> bool:
+        if book_id in self.delta_row_of:
+            return True
+        row = self.row_of.get(book_id)
+        return row is not None and bool(self.live[row])
+
+    def contains(self, book_ids) -> np.ndarray:
+        """Boolean mask of which of the given book ids are indexed."""
+        with self.lock:
+            return np.array([self._contains(int(book_id)) for book_id in book_ids], dtype=bool)
+
+    def load(self) -> bool:
+        """Load the index from disk. Returns False when no index has been saved yet."""
+        with self.lock:
+            mtime = self._disk_mtime()
+            if mtime is None:
+                return False
+            try:
+                vectorizer = joblib.load(self._path(self.VECTORIZER_FILE))
+                book_ids = np.load(self._path(self.IDS_FILE))
+                matrix = sparse.load_npz(self._path(self.MATRIX_FILE))
+            except Exception as e:
+                logger.error(f"Failed to load book index from {self.index_dir}: {e}")
+                return False
+            if matrix.shape[0] != len(book_ids):
+                logger.warning(f"Book index on disk is inconsistent ({matrix.shape[0]} rows, {len(book_ids)} ids), ignoring it")
+                return False
+            self.vectorizer = vectorizer
+            self._set_rows(matrix, book_ids)
+            self.lsh = self._load_lsh()
+            self.loaded_mtime = mtime
+            self.checked_at = time.monotonic()
+            logger.info(f"Loaded book index with {self.size} books from {self.index_dir}")
+            return True
+
+    def _lsh_enabled(self) -> bool:
+        return self.mode == "lsh" and self.size >= self.lsh_min_catalog_size
+
+    def _load_lsh(self) -> Optional[LSHIndex]:
+        """LSH tables saved with the base matrix, if they match it and the current settings."""
+        if not self._lsh_enabled() or not os.path.exists(self._path(self.LSH_FILE)):
+            return None
+        try:
+            lsh = LSHIndex.load(self._path(self.LSH_FILE))
+        except Exception as e:
+            logger.error(f"Failed to load LSH tables from {self.index_dir}: {e}")
+            return None
+        settings_match = (lsh.num_tables, lsh.num_bits, lsh.probes) == (
+            self.lsh_num_tables, self.lsh_num_bits, min(self.lsh_probes, self.lsh_num_bits))
+        if not settings_match or lsh.size != len(self.book_ids) or lsh.planes.shape[0] != self.matrix.shape[1]:
+            return None
+        return lsh
+
+    def save(self) -> None:
+        """
+        Persist the index, folding the delta into the base matrix first.
+        The matrix is written last because its mtime marks a new version.
+        """
+        with self.lock:
+            if self.vectorizer is None:
+                return
+            try:
+                self._fold()
+                os.makedirs(self.index_dir, exist_ok=True)
+                tmp_vectorizer = self._path(self.VECTORIZER_FILE + ".tmp")
+                joblib.dump(self.vectorizer, tmp_vectorizer)
+                os.replace(tmp_vectorizer, self._path(self.VECTORIZER_FILE))
+
+                tmp_ids = self._path("book_ids.tmp.npy")
+                np.save(tmp_ids, self.book_ids)
+                os.replace(tmp_ids, self._path(self.IDS_FILE))
+
+                # Hash the folded matrix here, off the request path, so loading processes do not have to
+                if self._lsh_enabled():
+                    tmp_lsh = self._path("lsh_tables.tmp.npz")
+                    self._lsh_index().save(tmp_lsh)
+                    os.replace(tmp_lsh, self._path(self.LSH_FILE))
+                elif os.path.exists(self._path(self.LSH_FILE)):
+                    os.remove(self._path(self.LSH_FILE))
+
+                tmp_matrix = self._path("book_vectors.tmp.npz")
+                sparse.save_npz(tmp_matrix, self.matrix, compressed=False)
+                os.replace(tmp_matrix, self._path(self.MATRIX_FILE))
+                self.loaded_mtime = self._disk_mtime()
+                self.checked_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Failed to save book index to {self.index_dir}: {e}")
+
+    def build(self, db: Session) -> None:
+        """Fit the vectorizer over the whole catalog and rebuild every book vector."""
+        with self.lock:
+            rows = db.query(Book.id, Book.title, Book.author, Book.description, Book.summary).all()
+            if not rows:
+                self.clear()
+                return
+            vectorizer = TfidfVectorizer(max_features=self.max_features, stop_words='english')
+            try:
+                matrix = vectorizer.fit_transform([book_text(row) for row in rows])
+            except ValueError as e:
+                # Empty vocabulary, e.g. every book text consists of stop words only
+                logger.error(f"Unable to build book index: {e}")
+                self.clear()
+                return
+            self.vectorizer = vectorizer
+            self._set_rows(matrix, [row.id for row in rows])
+            self.updates_since_fit = 0
+            logger.info(f"Built book index with {self.size} books and {len(vectorizer.vocabulary_)} terms")
+            self.save()
+
+    def _load_if_newer(self) -> None:
+        """Load the saved index when another process wrote a newer version."""
+        self.checked_at = time.monotonic()
+        mtime = self._disk_mtime()
+        if mtime is not None and mtime != self.loaded_mtime:
+            self.load()
+
+    def ensure_ready(self, db: Session) -> bool:
+        """
+        Make sure an index is available. Versions saved by other processes are
+        picked up at most every `reload_seconds`, replacing this process's delta.
+        """
+        with self.lock:
+            if (self.vectorizer is None or self.checked_at is None
+                    or time.monotonic() - self.checked_at >= self.reload_seconds):
+                self._load_if_newer()
+            if self.vectorizer is None:
+                self.build(db)
+            return self.vectorizer is not None
+
+    def _write_rows(self, books: List) -> None:
+        """Vectorize books with the current vocabulary into the delta, masking their base rows."""
+        books = list({book.id: book for book in books}.values())
+        vectors = sparse.csr_matrix(self.vectorizer.transform([book_text(book) for book in books]))
+        book_ids = {book.id for book in books}
+        if book_ids & self.delta_row_of.keys():
+            keep = np.array([book_id not in book_ids for book_id in self.delta_ids], dtype=bool)
+            self._set_delta(self.delta_matrix[keep], [book_id for book_id in self.delta_ids if book_id not in book_ids])
+        for book in books:
+            self._mask_base_row(book.id)
+        self._set_delta(sparse.vstack([self.delta_matrix, vectors], format="csr"),
+                        self.delta_ids + [book.id for book in books])
+        self.max_indexed_id = max(self.max_indexed_id, max(book_ids))
+        self.updates_since_fit += len(books)
+
+    def _needs_refit(self) -> bool:
+        return self.updates_since_fit > max(1, int(self.rebuild_ratio * self.size))
+
+    def upsert_books(self, books: Iterable, db: Session) -> None:
+        """
+        Re-vectorize the given books in this process's index. Persisting them (and
+        refitting a stale vocabulary) is left to `refresh_books`, run by the
+        `update_book_index` task.
+        """
+        books = [book for book in books if book is not None]
+        if not books:
+            return
+        with self.lock:
+            try:
+                if not self.ensure_ready(db):
+                    return
+                self._write_rows(books)
+                cache_versions.bump("catalog")
+            except Exception as e:
+                logger.error(f"Failed to update book index for books {[book.id for book in books]}: {e}")
+
+    def upsert_book(self, book, db: Session) -> None:
+        self.upsert_books([book], db)
+
+    def _remove_rows(self, book_ids: Iterable[int]) -> bool:
+        book_ids = set(book_ids)
+        removed = False
+        if book_ids & self.delta_row_of.keys():
+            keep = np.array([book_id not in book_ids for book_id in self.delta_ids], dtype=bool)
+            self._set_delta(self.delta_matrix[keep], [book_id for book_id in self.delta_ids if book_id not in book_ids])
+            removed = True
+        for book_id in book_ids:
+            removed = self._mask_base_row(book_id) or removed
+        return removed
+
+    def remove_book(self, book_id: int) -> None:
+        """Drop a deleted book from this process's index; `refresh_books` persists the removal."""
+        with self.lock:
+            if self._remove_rows([book_id]):
+                cache_versions.bump("catalog")
+
+    def refresh_books(self, book_ids: Iterable[int], db: Session) -> None:
+        """
+        Bring the persisted index up to date for the given books: rows of existing
+        books are re-vectorized, rows of deleted books are dropped, and the delta is
+        folded in and saved, or the index is refitted over the whole catalog once
+        more than `rebuild_ratio` of it changed since the last fit. Runs in the
+        Celery worker, starting from the newest saved version.
+        """
+        book_ids = list(dict.fromkeys(book_ids))
+        with self.lock:
+            self._load_if_newer()
+            if not self.ensure_ready(db):
+                return
+            books = (
+                db.query(Book.id, Book.title, Book.author, Book.description, Book.summary)
+                .filter(Book.id.in_(book_ids))
+                .all()
+            )
+            found = {book.id for book in books}
+            self._remove_rows(book_id for book_id in book_ids if book_id not in found)
+            if books:
+                self._write_rows(books)
+            if self._needs_refit():
+                self.build(db)
+            else:
+                self.save()
+            cache_versions.bump("catalog")
+
+    def vectors_for(self, books: List, db: Session):
+        """
+        Return the index rows for the given books, in order, as a CSR matrix.
+        Books that are not indexed yet are vectorized and added on the fly.
+        """
+        with self.lock:
+            if not self.ensure_indexed(books, db):
+                return None
+            book_ids = [book.id for book in books]
+            in_base = [i for i, book_id in enumerate(book_ids) if book_id not in self.delta_row_of]
+            in_delta = [i for i, book_id in enumerate(book_ids) if book_id in self.delta_row_of]
+            stacked = sparse.vstack([
+                self.matrix[np.array([self.row_of[book_ids[i]] for i in in_base], dtype=np.int64)],
+                self.delta_matrix[np.array([self.delta_row_of[book_ids[i]] for i in in_delta], dtype=np.int64)],
+            ], format="csr")
+            # Back to the order of `books`
+            return stacked[np.argsort(np.array(in_base + in_delta, dtype=np.int64))]
+
+    def ensure_indexed(self, books: List, db: Session) -> bool:
+        """Vectorize and add any of the given books that are not indexed yet."""
+        with self.lock:
+            if not self.ensure_ready(db):
+                return False
+            missing = [book for book in books if not self._contains(book.id)]
+            if missing:
+                self._write_rows(missing)
+            return True
+
+    def sync_catalog(self, db: Session) -> bool:
+        """
+        Index catalog books added after the newest indexed one, e.g. by another
+        process. One range query on the primary key, which finds nothing in the
+        common case; the rows are only written in this process's memory.
+        """
+        with self.lock:
+            if not self.ensure_ready(db):
+                return False
+            missing = (
+                db.query(Book.id, Book.title, Book.author, Book.description, Book.summary)
+                .filter(Book.id > self.max_indexed_id)
+                .all()
+            )
+            if missing:
+                self._write_rows(missing)
+            return True
+
+    def _lsh_index(self) -> LSHIndex:
+        """LSH over the base matrix; delta rows are always scored exactly."""
+        if self.lsh is None:
+            self.lsh = LSHIndex(self.lsh_num_tables, self.lsh_num_bits, self.lsh_probes)
+            self.lsh.build(self.matrix)
+        return self.lsh
+
+    def most_similar(self, liked_vectors, exclude_ids: Iterable[int] = (), mode: Optional[str] = None,
+                     min_candidates: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score indexed books by their max cosine similarity to any liked vector.
+
+        In "lsh" mode only the LSH candidates and the delta rows are scored; the
+        exact path over the whole catalog is used for small catalogs, when LSH returns fewer than
+        `min_candidates` books, or when it returns so many that scoring them
+        would cost as much as an exact scan. Returns (book_ids, scores).
+        """
+        mode = mode or self.mode
+        exclude = np.fromiter(exclude_ids, dtype=np.int64)
+        with self.lock:
+            delta_ids = np.array(self.delta_ids, dtype=np.int64)
+            delta_rows = np.nonzero(~np.isin(delta_ids, exclude))[0]
+            rows = None
+            if mode == "lsh" and self.size >= self.lsh_min_catalog_size:
+                rows = self._lsh_index().query(liked_vectors)
+                rows = rows[rows < len(self.book_ids)]
+                rows = rows[self.live[rows] & ~np.isin(self.book_ids[rows], exclude)]
+                candidates = len(rows) + len(delta_rows)
+                if candidates < min_candidates or candidates > self.lsh_max_candidate_ratio * self.size:
+                    logger.info(f"LSH returned {candidates} candidates, falling back to exact search")
+                    rows = None
+            if rows is None:
+                # Multiply the whole matrix and mask afterwards; slicing nearly every row would copy the catalog
+                keep = self.live & ~np.isin(self.book_ids, exclude)
+                book_ids = self.book_ids[keep]
+                scores = self._max_similarity(self.matrix, liked_vectors)[keep]
+            else:
+                book_ids = self.book_ids[rows]
+                scores = self._max_similarity(self.matrix[rows], liked_vectors)
+            return (
+                np.concatenate([book_ids, delta_ids[delta_rows]]),
+                np.concatenate([scores, self._max_similarity(self.delta_matrix[delta_rows], liked_vectors)]),
+            )
+
+    @staticmethod
+    def _max_similarity(matrix, liked_vectors) -> np.ndarray:
+        if matrix.shape[0] == 0:
+            return np.array([], dtype=np.float64)
+        return (matrix @ liked_vectors.T).max(axis=1).toarray().ravel()
+
+    def most_similar_batch(self, liked_vectors, groups: List[List[int]],
+                           exclude_groups: List[Iterable[int]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Exact `most_similar` for many users at once.
+
+        `liked_vectors` stacks the liked books of every user; `groups[i]` lists the
+        rows of `liked_vectors` that belong to user i. The whole catalog is scored
+        against all liked books with a single sparse matrix multiply, then reduced
+        to each user's max similarity. Returns (book_ids, scores) per group.
+        """
+        with self.lock:
+            similarities = sparse.vstack([
+                self.matrix @ liked_vectors.T, self.delta_matrix @ liked_vectors.T
+            ], format="csc")
+            book_ids = np.concatenate([self.book_ids, np.array(self.delta_ids, dtype=np.int64)])
+            live = np.concatenate([self.live, np.ones(len(self.delta_ids), dtype=bool)])
+        results = []
+        for columns, exclude_ids in zip(groups, exclude_groups):
+            keep = live & ~np.isin(book_ids, np.fromiter(exclude_ids, dtype=np.int64))
+            scores = similarities[:, columns].max(axis=1).toarray().ravel()
+            results.append((book_ids[keep], scores[keep]))
+        return results
+
+
+# Shared instance used by the API and the Celery worker
+book_index = BookIndexService()
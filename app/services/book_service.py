@@ -3,7 +3,8 @@ from fastapi import HTTPException, UploadFile
 from typing import List
 from sqlalchemy.orm import Session
 from app.models.book import Book
-from app.workers.tasks import generate_summary
+from app.workers.tasks import generate_summary, update_book_index
+from app.services.book_index_service import book_index
 from io import BytesIO
 from PyPDF2 import PdfReader
 import docx
@@ -40,6 +41,8 @@ class BookService:
         db.add(new_book)
         db.commit()
         db.refresh(new_book)
+        book_index.upsert_book(new_book, db)
+        update_book_index.delay([new_book.id])
         generate_summary.delay(new_book.id, text)
 
         return new_book
@@ -107,6 +110,8 @@ class BookService:
         db.add(book)
         db.commit()
         db.refresh(book)
+        book_index.upsert_book(book, db)
+        update_book_index.delay([book.id])
         return book
 
     def delete_book(self, book_id: int, db: Session) -> None:
@@ -124,6 +129,8 @@ class BookService:
         file_path = book.file_path
         db.delete(book)
         db.commit()
+        book_index.remove_book(book_id)
+        update_book_index.delay([book_id])
 
         if file_path and os.path.exists(file_path):
             try:
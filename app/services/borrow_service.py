@@ -2,6 +2,9 @@ from sqlalchemy.orm import Session
 from app.models.borrow import Borrow  # SQLAlchemy model
 from datetime import datetime
 from fastapi import HTTPException
+from app.services.cooccurrence_service import CooccurrenceService
+from app.services.preference_service import PreferenceService
+from app.services.trending_service import trending_books
 from app.core.logging import get_logger
 
 #logging configuration
@@ -33,6 +36,9 @@ class BorrowService:
             db.add(new_borrow)
             db.commit()
             db.refresh(new_borrow)
+            CooccurrenceService().record_interaction(user_id, book_id, db)
+            PreferenceService().record_borrow(user_id, book_id, db)
+            trending_books.record_borrow(book_id, db)
             return new_borrow
         except Exception as e:
             db.rollback()
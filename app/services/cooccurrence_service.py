@@ -0,0 +1,168 @@
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, literal, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models.book_cooccurrence import BookCooccurrence
+from app.models.borrow import Borrow
+from app.models.review import Review
+from app.core.config import settings
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+def _recency(item: Tuple[int, datetime | None]) -> Tuple:
+    """Sort key for (book_id, last borrowed at) pairs, most recent first when sorted in reverse."""
+    book_id, last_at = item
+    return last_at is not None, last_at or datetime.min, book_id
+
+
+class CooccurrenceService:
+    """
+    Item-item collaborative filtering over borrow and review co-occurrence.
+
+    The co-occurrence matrix C is stored sparsely in `book_cooccurrences`:
+    C[a, b] is the number of users who interacted (borrowed or reviewed) with
+    both a and b, and C[a, a] the number of users who interacted with a.
+    Every new (user, book) interaction bumps one row and one column of C, so
+    the model stays current without batch jobs, and a recommendation request
+    only reads the neighbour lists of the user's liked books.
+    Similarity is the cosine-normalised count C[a, b] / sqrt(C[a, a] * C[b, b]).
+
+    Each user contributes only their `max_history` most recently borrowed
+    books, both incrementally and in `rebuild`, so a heavy reader costs at most
+    max_history^2 matrix entries. Reviews require a borrow, so the latest
+    borrow time orders a user's books.
+    """
+
+    def __init__(self, max_history: int = settings.COOCCURRENCE_MAX_HISTORY,
+                 max_neighbors: int = settings.COOCCURRENCE_MAX_NEIGHBORS):
+        self.max_history = max_history
+        self.max_neighbors = max_neighbors
+
+    def _interactions(self, user_id: int, db: Session) -> Dict[int, Tuple[int, datetime | None]]:
+        """Number of borrow and review rows and the latest borrow time per book for a user."""
+        borrowed = db.query(Borrow.book_id.label("book_id"), Borrow.borrowed_at.label("at")).filter(Borrow.user_id == user_id)
+        reviewed = db.query(Review.book_id.label("book_id"), literal(None).label("at")).filter(Review.user_id == user_id)
+        rows = union_all(borrowed, reviewed).subquery()
+        counts = db.query(rows.c.book_id, func.count(), func.max(rows.c.at)).group_by(rows.c.book_id).all()
+        return {book_id: (count, last_at) for book_id, count, last_at in counts if book_id is not None}
+
+    def _increment(self, entries: List[Dict], db: Session) -> None:
+        """Atomically add to matrix entries, inserting the ones that do not exist yet."""
+        if not entries:
+            return
+        dialect = db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(BookCooccurrence).values(entries)
+        statement = statement.on_conflict_do_update(
+            index_elements=[BookCooccurrence.book_id, BookCooccurrence.neighbor_id],
+            set_={"weight": BookCooccurrence.weight + statement.excluded.weight},
+        )
+        db.execute(statement)
+
+    def record_interaction(self, user_id: int, book_id: int, db: Session) -> None:
+        """
+        Update the matrix after a borrow or review row has been committed.
+        Only the first interaction of a user with a book counts.
+        """
+        try:
+            interactions = self._interactions(user_id, db)
+            if interactions.get(book_id, (0, None))[0] != 1:
+                return
+            history = sorted(((other, last_at) for other, (_, last_at) in interactions.items() if other != book_id),
+                             key=_recency, reverse=True)
+            others = [other for other, _ in history[:self.max_history - 1]]
+            entries = [{"book_id": book_id, "neighbor_id": book_id, "weight": 1.0}]
+            for other in others:
+                entries.append({"book_id": book_id, "neighbor_id": other, "weight": 1.0})
+                entries.append({"book_id": other, "neighbor_id": book_id, "weight": 1.0})
+            self._increment(entries, db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to update co-occurrence for user {user_id} and book {book_id}: {e}")
+
+    def neighbor_similarities(self, book_ids: Iterable[int], db: Session) -> Dict[int, Dict[int, float]]:
+        """
+        Read the neighbour lists of the given books as {book_id: {neighbor_id: similarity}}.
+        Each list is cut to the `max_neighbors` largest co-occurrence counts in the query.
+        """
+        book_ids = list(set(book_ids))
+        if not book_ids:
+            return {}
+        rank = func.row_number().over(
+            partition_by=BookCooccurrence.book_id, order_by=BookCooccurrence.weight.desc()
+        ).label("rank")
+        ranked = (
+            db.query(BookCooccurrence.book_id, BookCooccurrence.neighbor_id, BookCooccurrence.weight, rank)
+            .filter(BookCooccurrence.book_id.in_(book_ids))
+            .filter(BookCooccurrence.book_id != BookCooccurrence.neighbor_id)
+            .subquery()
+        )
+        rows = (
+            db.query(ranked.c.book_id, ranked.c.neighbor_id, ranked.c.weight)
+            .filter(ranked.c.rank <= self.max_neighbors)
+            .all()
+        )
+        neighbor_ids = {row.neighbor_id for row in rows}
+        if not neighbor_ids:
+            return {}
+        diagonal = dict(
+            db.query(BookCooccurrence.book_id, BookCooccurrence.weight)
+            .filter(BookCooccurrence.book_id == BookCooccurrence.neighbor_id)
+            .filter(BookCooccurrence.book_id.in_(neighbor_ids | set(book_ids)))
+            .all()
+        )
+        similarities = {}
+        for row in rows:
+            norm = math.sqrt(diagonal.get(row.book_id, 0.0) * diagonal.get(row.neighbor_id, 0.0))
+            if norm > 0:
+                similarities.setdefault(row.book_id, {})[row.neighbor_id] = min(1.0, row.weight / norm)
+        return similarities
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Recompute the whole matrix from borrows and reviews as C = X^T X of the user-book matrix X,
+        keeping each user's `max_history` most recent books as record_interaction does.
+        """
+        borrowed = db.query(Borrow.user_id.label("user_id"), Borrow.book_id.label("book_id"),
+                            Borrow.borrowed_at.label("at"))
+        reviewed = db.query(Review.user_id.label("user_id"), Review.book_id.label("book_id"),
+                            literal(None).label("at"))
+        rows = union_all(borrowed, reviewed).subquery()
+        histories = {}
+        for user_id, book_id, last_at in (
+            db.query(rows.c.user_id, rows.c.book_id, func.max(rows.c.at))
+            .filter(rows.c.book_id != None)
+            .group_by(rows.c.user_id, rows.c.book_id)
+        ):
+            histories.setdefault(user_id, []).append((book_id, last_at))
+        pairs = [
+            (user_id, book_id)
+            for user_id, history in histories.items()
+            for book_id, _ in sorted(history, key=_recency, reverse=True)[:self.max_history]
+        ]
+
+        db.query(BookCooccurrence).delete()
+        if pairs:
+            users = np.array([user_id for user_id, _ in pairs])
+            books = np.array([book_id for _, book_id in pairs])
+            user_index = {user_id: i for i, user_id in enumerate(np.unique(users))}
+            interactions = sparse.csr_matrix(
+                (np.ones(len(pairs)), ([user_index[u] for u in users], books)),
+                shape=(len(user_index), int(books.max()) + 1),
+            )
+            matrix = (interactions.T @ interactions).tocoo()
+            db.bulk_insert_mappings(BookCooccurrence, [
+                {"book_id": int(a), "neighbor_id": int(b), "weight": float(w)}
+                for a, b, w in zip(matrix.row, matrix.col, matrix.data)
+            ])
+        db.commit()
+        logger.info(f"Rebuilt co-occurrence matrix from {len(pairs)} user-book interactions")
+        return len(pairs)
@@ -0,0 +1,238 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class LLMBackendError(Exception):
+    """A backend call that failed; `retryable` is False for errors a retry cannot fix."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class BackendStats:
+    """Latency and outcome of the last `window` calls to one backend."""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self.lock:
+            self.samples.append((latency, ok))
+
+    def error_rate(self) -> float:
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def latencies(self) -> List[float]:
+        """Latencies of the successful calls in the window, sorted."""
+        with self.lock:
+            return sorted(latency for latency, ok in self.samples if ok)
+
+    def mean_latency(self) -> Optional[float]:
+        latencies = self.latencies()
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def percentile(self, q: float) -> Optional[float]:
+        latencies = self.latencies()
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": len(self.samples),
+            "error_rate": round(self.error_rate(), 4),
+            "mean_latency": self.mean_latency(),
+            "p95_latency": self.percentile(0.95),
+        }
+
+
+class LLMRouter:
+    """
+    Routes LLM calls over several backends.
+
+    Each backend (anything with a `name`, `async call(system_prompt, query)` and,
+    for streamed answers, an async generator `stream(system_prompt, query)`)
+    keeps rolling latency and error stats and has its own circuit breaker.
+    Calls go to the healthy backend with the lowest mean latency, with backends
+    above `max_error_rate` errors ranked last; a small `explore_rate` of calls
+    goes to a random healthy backend so the stats of the others stay fresh.
+    A failed call fails over to the next backend. Hedged calls start a
+    duplicate on the second backend when the first has not answered within its
+    p95 latency, and take whichever answers first. Streamed calls fail over
+    only until the first piece of the answer is out.
+    """
+
+    def __init__(self, backends: List, window: int = settings.LLM_ROUTER_WINDOW,
+                 max_error_rate: float = settings.LLM_ROUTER_MAX_ERROR_RATE,
+                 explore_rate: float = settings.LLM_ROUTER_EXPLORE_RATE,
+                 hedge_delay_seconds: float = settings.LLM_HEDGE_DELAY_SECONDS,
+                 hedge_min_samples: int = settings.LLM_HEDGE_MIN_SAMPLES):
+        self.backends = list(backends)
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.explore_rate = explore_rate
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self.reset()
+
+    @property
+    def name(self) -> str:
+        return "+".join(backend.name for backend in self.backends)
+
+    def reset(self) -> None:
+        """Forget the stats and close every circuit."""
+        self.stats = {backend.name: BackendStats(self.window) for backend in self.backends}
+        self.breakers = {
+            backend.name: CircuitBreaker(backend.name, settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
+            for backend in self.backends
+        }
+
+    def available(self) -> List:
+        """Backends whose circuit lets calls through, best first."""
+        healthy = [backend for backend in self.backends if self.breakers[backend.name].available()]
+
+        def rank(backend):
+            stats = self.stats[backend.name]
+            # Backends without successful calls yet rank first, so they get measured
+            return (stats.error_rate() > self.max_error_rate, stats.mean_latency() or 0.0)
+
+        ranked = sorted(healthy, key=rank)
+        if len(ranked) > 1 and random.random() < self.explore_rate:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def hedge_delay(self, backend) -> float:
+        stats = self.stats[backend.name]
+        if len(stats.samples) < self.hedge_min_samples:
+            return self.hedge_delay_seconds
+        return stats.percentile(0.95) or self.hedge_delay_seconds
+
+    def _record(self, backend, started: float, error: Optional[Exception] = None) -> None:
+        self.stats[backend.name].record(time.perf_counter() - started, ok=error is None)
+        if error is None:
+            self.breakers[backend.name].record_success()
+        elif getattr(error, "retryable", True):
+            self.breakers[backend.name].record_failure()
+
+    async def _timed_call(self, backend, system_prompt: str, query: str):
+        started = time.perf_counter()
+        try:
+            answer = await backend.call(system_prompt, query)
+        except Exception as e:
+            self._record(backend, started, e)
+            raise
+        self._record(backend, started)
+        return answer
+
+    async def call(self, system_prompt: str, query: str, hedge: bool = False):
+        """
+        Answer from the best backend, failing over on errors. Raises the last
+        error when every backend failed, or a non-retryable LLMBackendError
+        when every circuit is open.
+        """
+        candidates = self.available()
+        if not candidates:
+            raise LLMBackendError("No healthy LLM backend (all circuits open)", retryable=False)
+        if hedge and len(candidates) > 1:
+            return await self._hedged_call(candidates, system_prompt, query)
+        return await self._failover_call(candidates, system_prompt, query)
+
+    async def _failover_call(self, candidates: List, system_prompt: str, query: str):
+        error = None
+        for backend in candidates:
+            if not self.breakers[backend.name].allow():
+                continue
+            try:
+                return await self._timed_call(backend, system_prompt, query)
+            except Exception as e:
+                logger.warning(f"LLM backend {backend.name} failed: {e}")
+                error = e
+        raise error or LLMBackendError("No healthy LLM backend (all circuits open)", retryable=False)
+
+    async def _hedged_call(self, candidates: List, system_prompt: str, query: str):
+        primary, rest = candidates[0], candidates[1:]
+        if not self.breakers[primary.name].allow():
+            return await self._failover_call(rest, system_prompt, query)
+
+        tasks = [asyncio.create_task(self._timed_call(primary, system_prompt, query))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+            if done:
+                error = tasks[0].exception()
+                if error is None:
+                    return tasks[0].result()
+                logger.warning(f"LLM backend {primary.name} failed: {error}")
+                return await self._failover_call(rest, system_prompt, query)
+
+            # The primary is slower than its p95: race a duplicate on the next backend
+            hedge_backend = next((backend for backend in rest if self.breakers[backend.name].allow()), None)
+            if hedge_backend is None:
+                return await tasks[0]
+            logger.info(f"Hedging slow LLM backend {primary.name} with {hedge_backend.name}")
+            tasks.append(asyncio.create_task(self._timed_call(hedge_backend, system_prompt, query)))
+
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The slower request is abandoned once an answer is in
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def stream(self, system_prompt: str, query: str):
+        """
+        Stream the answer of the best backend as text pieces. A backend failing
+        before its first piece fails over to the next one; a failure after that
+        is raised, since part of the answer is already out. Latency is measured
+        to the end of the stream.
+        """
+        candidates = self.available()
+        if not candidates:
+            raise LLMBackendError("No healthy LLM backend (all circuits open)", retryable=False)
+        error = None
+        for backend in candidates:
+            if not self.breakers[backend.name].allow():
+                continue
+            started = time.perf_counter()
+            streamed = False
+            try:
+                async for piece in backend.stream(system_prompt, query):
+                    streamed = True
+                    yield piece
+            except Exception as e:
+                self._record(backend, started, e)
+                if streamed:
+                    raise
+                logger.warning(f"LLM backend {backend.name} failed: {e}")
+                error = e
+                continue
+            self._record(backend, started)
+            return
+        raise error or LLMBackendError("No healthy LLM backend (all circuits open)", retryable=False)
+
+    def info(self) -> Dict:
+        return {
+            backend.name: {**self.stats[backend.name].as_dict(), "circuit": self.breakers[backend.name].state}
+            for backend in self.backends
+        }
@@ -0,0 +1,166 @@
+from typing import Dict, Iterable, Optional
+from sqlalchemy.orm import Session, joinedload
+from app.models.book import Book
+from app.models.borrow import Borrow
+from app.models.review import Review
+from app.models.user_preference import UserPreference
+from app.services.sentiment_service import SentimentService
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class PreferenceService:
+    """
+    Incrementally maintained preference profile of a user (`user_preferences`).
+
+    Every review and borrow folds into one row: running review/borrow counts,
+    the running average rating, per-author interaction counts and a sparse
+    preference vector {book_id: affinity} of the books the user reviewed
+    positively. Recommendation requests read that row instead of rescanning
+    and re-scoring the user's reviews. A missing row is rebuilt from the
+    user's reviews and borrows.
+    """
+
+    # Affinity = 0.6 * sentiment score + 0.4 * rating / 5; books above the threshold are liked
+    SENTIMENT_WEIGHT = 0.6
+    RATING_WEIGHT = 0.4
+    LIKED_THRESHOLD = 0.6
+    FAVORITE_AUTHORS = 3
+
+    def __init__(self):
+        self.sentiment_service = SentimentService()
+
+    def review_affinity(self, review) -> Optional[float]:
+        """Combined sentiment and rating score of a review; None for reviews without a comment."""
+        if not review.comment:
+            return None
+        sentiment = self.sentiment_service.get_review_sentiment(review)
+        return (sentiment["score"] * self.SENTIMENT_WEIGHT) + (review.rating / 5.0 * self.RATING_WEIGHT)
+
+    def _new_profile(self, user_id: int) -> UserPreference:
+        return UserPreference(
+            user_id=user_id, review_count=0, borrow_count=0,
+            author_counts={}, preference_vector={}, last_review_id=0,
+        )
+
+    def _count_author(self, profile: UserPreference, author: Optional[str]) -> None:
+        if not author:
+            return
+        counts = dict(profile.author_counts or {})
+        counts[author] = counts.get(author, 0) + 1
+        profile.author_counts = counts
+        top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:self.FAVORITE_AUTHORS]
+        profile.favorite_authors = ",".join(author for author, _ in top)
+
+    def _apply_review(self, profile: UserPreference, review, author: Optional[str]) -> None:
+        count = (profile.review_count or 0) + 1
+        average = profile.avg_rating_given or 0.0
+        profile.review_count = count
+        profile.avg_rating_given = average + (review.rating - average) / count
+        profile.last_review_id = max(profile.last_review_id or 0, review.id or 0)
+        self._count_author(profile, author)
+
+        affinity = self.review_affinity(review)
+        if affinity is not None and affinity > self.LIKED_THRESHOLD and review.book_id is not None:
+            # JSON object keys are strings; reassign so SQLAlchemy sees the change
+            vector = dict(profile.preference_vector or {})
+            key = str(review.book_id)
+            vector[key] = max(affinity, vector.get(key, 0.0))
+            profile.preference_vector = vector
+
+    def _apply_borrow(self, profile: UserPreference, author: Optional[str]) -> None:
+        profile.borrow_count = (profile.borrow_count or 0) + 1
+        self._count_author(profile, author)
+
+    def rebuild_profile(self, user_id: int, db: Session) -> UserPreference:
+        """Recompute a user's profile from all of their reviews and borrows (not committed)."""
+        profile = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+        if profile is None:
+            profile = self._new_profile(user_id)
+            db.add(profile)
+        else:
+            profile.review_count = 0
+            profile.borrow_count = 0
+            profile.avg_rating_given = None
+            profile.author_counts = {}
+            profile.favorite_authors = None
+            profile.preference_vector = {}
+            profile.last_review_id = 0
+
+        reviews = (
+            db.query(Review)
+            .options(joinedload(Review.book))
+            .filter(Review.user_id == user_id)
+            .order_by(Review.id)
+            .all()
+        )
+        for review in reviews:
+            self._apply_review(profile, review, review.book.author if review.book else None)
+        borrowed_authors = (
+            db.query(Book.author)
+            .join(Borrow, Borrow.book_id == Book.id)
+            .filter(Borrow.user_id == user_id)
+            .all()
+        )
+        for (author,) in borrowed_authors:
+            self._apply_borrow(profile, author)
+        return profile
+
+    def get_profiles(self, user_ids: Iterable[int], db: Session) -> Dict[int, UserPreference]:
+        """Read the profiles of many users in one query, building the ones that do not exist yet."""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        profiles = {
+            profile.user_id: profile
+            for profile in db.query(UserPreference).filter(UserPreference.user_id.in_(user_ids)).all()
+        }
+        missing = [user_id for user_id in user_ids if user_id not in profiles]
+        if missing:
+            try:
+                for user_id in missing:
+                    profiles[user_id] = self.rebuild_profile(user_id, db)
+                db.commit()
+            except Exception as e:
+                # The rollback detaches the new profiles, which are still served for this request
+                db.rollback()
+                logger.error(f"Failed to store preference profiles for users {missing}: {e}")
+        return profiles
+
+    def get_profile(self, user_id: int, db: Session) -> UserPreference:
+        return self.get_profiles([user_id], db)[user_id]
+
+    def liked_book_ids(self, profile: UserPreference) -> Dict[int, float]:
+        """The profile's preference vector keyed by integer book id."""
+        return {int(book_id): affinity for book_id, affinity in (profile.preference_vector or {}).items()}
+
+    def record_review(self, review, db: Session) -> None:
+        """Fold a committed review into its author's profile."""
+        try:
+            profile = db.query(UserPreference).filter(UserPreference.user_id == review.user_id).first()
+            if profile is None:
+                # A new profile is built from every row, including this review
+                self.rebuild_profile(review.user_id, db)
+            elif review.id is None or review.id > (profile.last_review_id or 0):
+                author = db.query(Book.author).filter(Book.id == review.book_id).scalar()
+                self._apply_review(profile, review, author)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to update preferences of user {review.user_id} for review {review.id}: {e}")
+
+    def record_borrow(self, user_id: int, book_id: int, db: Session) -> None:
+        """Fold a committed borrow into the user's profile."""
+        try:
+            profile = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+            if profile is None:
+                self.rebuild_profile(user_id, db)
+            else:
+                author = db.query(Book.author).filter(Book.id == book_id).scalar()
+                self._apply_borrow(profile, author)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to update preferences of user {user_id} for borrow of book {book_id}: {e}")
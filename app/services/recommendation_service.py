@@ -1,137 +1,217 @@
-from sqlalchemy.orm import Session
+import numpy as np
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func
+from datetime import datetime, timedelta
 from app.models.book import Book
 from app.models.review import Review
+from app.models.user_preference import UserPreference
+from app.models.user_recommendation import UserRecommendation
+from app.models.book_review_consensus import BookReviewConsensus
+from app.core.config import settings
+from app.core.cache import build_cache, cache_versions
+from app.core.deadline import Deadline
+from app.core.single_flight import SingleFlight
 from app.services.ai_service import AIService
-from typing import List, Dict, Tuple
-from textblob import TextBlob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from typing import List, Dict, Optional, Tuple
+from app.services.sentiment_service import SentimentService
+from app.services.cooccurrence_service import CooccurrenceService
+from app.services.preference_service import PreferenceService
+from app.services.review_sampling_service import ReviewSamplingService
+from app.services.book_index_service import book_index
+from app.services.trending_service import trending_books
 from app.core.logging import get_logger 
 
 #logging configuration
 logger = get_logger(__name__)
 
+# Per-user recommendation results, keyed on the user's and the catalog's version
+recommendation_cache = build_cache(
+    "recommendations",
+    max_size=settings.RECOMMENDATION_CACHE_SIZE,
+    ttl_seconds=settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+)
+
+
+async def recommendation_cache_key(user_id: int, limit: int) -> str:
+    user_version, catalog_version = await cache_versions.aget_many([f"user:{user_id}", "catalog"])
+    return f"{user_id}:{limit}:v{user_version}:c{catalog_version}"
+
+
+# LLM-backed review summaries, keyed on the user's or the book's review version
+review_summary_cache = build_cache(
+    "review-summary",
+    max_size=settings.ANALYSIS_CACHE_SIZE,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+)
+book_analysis_cache = build_cache(
+    "book-analysis",
+    max_size=settings.ANALYSIS_CACHE_SIZE,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+)
+
+# Books whose consensus catch-up task was enqueued recently, so repeated requests enqueue it once
+consensus_refresh_marks = build_cache(
+    "consensus-refresh",
+    max_size=settings.ANALYSIS_CACHE_SIZE,
+    ttl_seconds=settings.BOOK_CONSENSUS_REFRESH_DEBOUNCE_SECONDS,
+)
+
+
+# Concurrent identical requests share one computation (and one LLM call)
+review_summary_flights = SingleFlight("review-summary")
+book_analysis_flights = SingleFlight("book-analysis")
+
+
+async def review_summary_cache_key(user_id: int) -> str:
+    user_version, catalog_version = await cache_versions.aget_many([f"user:{user_id}", "catalog"])
+    return f"{user_id}:v{user_version}:c{catalog_version}"
+
+
+async def book_analysis_cache_key(book_id: int) -> str:
+    book_version, catalog_version = await cache_versions.aget_many([f"book:{book_id}", "catalog"])
+    return f"{book_id}:v{book_version}:c{catalog_version}"
+
+
 class RecommendationService:
     def __init__(self, db: Session):
         self.db = db
         self.ai_service = AIService()
+        self.sentiment_service = SentimentService()
+        self.cooccurrence_service = CooccurrenceService()
+        self.preference_service = PreferenceService()
+        self.review_sampling_service = ReviewSamplingService()
 
-    def analyze_sentiment_textblob(self, text: str) -> Dict:
+    def get_user_reviews_with_books(self, user_id: int) -> List[Review]:
+        """Fetch a user's reviews together with their books in a single joined query."""
+        return (
+            self.db.query(Review)
+            .options(joinedload(Review.book))
+            .filter(Review.user_id == user_id)
+            .all()
+        )
+
+    def get_liked_books(self, profiles: Dict) -> Dict[int, List[Tuple]]:
         """
-        Analyze sentiment using TextBlob (lightweight, no ML model loading).
-        Returns sentiment label and polarity score.
-        Polarity ranges from -1 (negative) to 1 (positive).
+        Liked books of each user from their stored preference vector, loaded with
+        one column-projected query for all users: {user_id: [(book, affinity), ...]}.
         """
-        if not text:
-            return {"label": "NEUTRAL", "score": 0.5}
-        
-        try:
-            blob = TextBlob(text)
-            polarity = blob.sentiment.polarity
-            
-            # Convert polarity to label and normalized score
-            if polarity > 0.1:
-                label = "POSITIVE"
-                score = (polarity + 1) / 2  # Normalize to 0.5-1.0
-            elif polarity < -0.1:
-                label = "NEGATIVE"
-                score = (polarity + 1) / 2  # Normalize to 0.0-0.5
-            else:
-                label = "NEUTRAL"
-                score = 0.5
-            
-            return {"label": label, "score": score, "polarity": polarity}
-        except Exception as e:
-            logger.error(f"Sentiment analysis error: {e}")
-            return {"label": "NEUTRAL", "score": 0.5}
+        vectors = {user_id: self.preference_service.liked_book_ids(profile) for user_id, profile in profiles.items()}
+        book_rows = self._fetch_book_rows({book_id for vector in vectors.values() for book_id in vector})
+        return {
+            user_id: [(book_rows[book_id], affinity) for book_id, affinity in vector.items() if book_id in book_rows]
+            for user_id, vector in vectors.items()
+        }
 
-    def get_books_with_positive_sentiment(self, user_id: int) -> List[Tuple[Book, float]]:
-        
-        user_reviews = self.db.query(Review).filter(Review.user_id == user_id).all()
-        
-        positive_books = []
-        for review in user_reviews:
-            book = self.db.query(Book).filter(Book.id == review.book_id).first()
-            if not book:
-                continue
-            
-            # Analyze sentiment of review comment
-            if review.comment:
-                sentiment = self.analyze_sentiment_textblob(review.comment)
-                
-                # Calculate combined score: sentiment + rating
-                sentiment_score = sentiment["score"]
-                rating_score = review.rating / 5.0
-                combined_score = (sentiment_score * 0.6) + (rating_score * 0.4)
-                
-                # Only include positive reviews (score > 0.6)
-                if combined_score > 0.6:
-                    positive_books.append((book, combined_score))
-        
-        return positive_books
-
-    def get_similar_books(self, liked_books: List[Tuple[Book, float]], all_books: List[Book]) -> List[Tuple[Book, float]]:
-        
+    def get_similar_books(self, liked_books: List[Tuple[Book, float]], min_candidates: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score the catalog against the user's liked books.
+        Returns parallel (book_ids, scores) arrays of candidate books, liked books excluded.
+        """
         if not liked_books:
-            return []
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
         
         # Extract liked book IDs
-        liked_book_ids = {book.id for book, _ in liked_books}
-        
-        # Get candidate books (not already liked)
-        candidate_books = [book for book in all_books if book.id not in liked_book_ids]
-        
-        if not candidate_books:
-            return []
-        
-        # Prepare text representations
-        liked_texts = []
-        for book, _ in liked_books:
-            text = f"{book.title} {book.author} {book.description or ''} {book.summary or ''}"
-            liked_texts.append(text)
-        
-        candidate_texts = []
-        for book in candidate_books:
-            text = f"{book.title} {book.author} {book.description or ''} {book.summary or ''}"
-            candidate_texts.append(text)
+        liked_book_ids = [book.id for book, _ in liked_books]
         
-        # Calculate TF-IDF vectors
+        # Look up the cached TF-IDF vectors instead of refitting over the catalog
         try:
-            vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
-            all_texts = liked_texts + candidate_texts
-            tfidf_matrix = vectorizer.fit_transform(all_texts)
+            liked_vectors = book_index.vectors_for([book for book, _ in liked_books], self.db)
+            if liked_vectors is None or not book_index.sync_catalog(self.db):
+                return self._neutral_scores(liked_book_ids)
             
-            # Calculate similarity between liked and candidate books
-            liked_vectors = tfidf_matrix[:len(liked_texts)]
-            candidate_vectors = tfidf_matrix[len(liked_texts):]
-            
-            # Compute cosine similarity
-            similarities = cosine_similarity(candidate_vectors, liked_vectors)
-            
-            # Get max similarity for each candidate book
-            max_similarities = np.max(similarities, axis=1)
-            
-            # Create list of similar books with scores
-            similar_books = []
-            for idx, book in enumerate(candidate_books):
-                similarity_score = float(max_similarities[idx])
-                similar_books.append((book, similarity_score))
-            
-            return similar_books
+            # Max cosine similarity of each candidate to any liked book, either exact
+            # over the catalog or over the approximate nearest-neighbour candidates
+            return book_index.most_similar(
+                liked_vectors, exclude_ids=liked_book_ids, min_candidates=min_candidates
+            )
         
         except Exception as e:
             logger.error(f"Similarity calculation error: {e}")
             # Fallback: return candidates with neutral score
-            return [(book, 0.5) for book in candidate_books]
+            return self._neutral_scores(liked_book_ids)
 
-    def rank_by_score(self, books_with_scores: List[Tuple[Book, float]]) -> List[Dict]:
-        
-        # Sort by score (descending)
-        ranked = sorted(books_with_scores, key=lambda x: x[1], reverse=True)
-        
+    def _neutral_scores(self, liked_book_ids) -> Tuple[np.ndarray, np.ndarray]:
+        """Every book except the liked ones with a neutral score, used when the index is unavailable."""
+        book_ids = np.array(
+            [book_id for (book_id,) in self.db.query(Book.id).filter(~Book.id.in_(liked_book_ids)).order_by(Book.id)],
+            dtype=np.int64,
+        )
+        return book_ids, np.full(len(book_ids), 0.5)
+
+    def blend_collaborative(self, book_ids: np.ndarray, scores: np.ndarray, liked_books: List[Tuple[Book, float]],
+                            neighbor_similarities: Dict[int, Dict[int, float]] | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Blend item-item co-occurrence into the content scores:
+        score = (1 - w) * content + w * max co-occurrence similarity to a liked book,
+        with w = RECOMMENDATION_CF_WEIGHT. Only the neighbour lists of the liked books are read.
+        """
+        liked_book_ids = {book.id for book, _ in liked_books}
+        if neighbor_similarities is None:
+            neighbor_similarities = self.cooccurrence_service.neighbor_similarities(liked_book_ids, self.db)
+        
+        cf_scores = {}
+        for liked_id in liked_book_ids:
+            for neighbor_id, similarity in neighbor_similarities.get(liked_id, {}).items():
+                if neighbor_id not in liked_book_ids:
+                    cf_scores[neighbor_id] = max(similarity, cf_scores.get(neighbor_id, 0.0))
+        if not cf_scores:
+            return book_ids, scores
+        
+        weight = settings.RECOMMENDATION_CF_WEIGHT
+        cf_ids = np.fromiter(cf_scores.keys(), dtype=np.int64, count=len(cf_scores))
+        cf_values = np.fromiter(cf_scores.values(), dtype=np.float64, count=len(cf_scores))
+        blended = (1 - weight) * np.asarray(scores, dtype=np.float64)
+        
+        # Align the neighbour scores with the candidate arrays via a sorted lookup
+        order = np.argsort(cf_ids)
+        positions = np.minimum(np.searchsorted(cf_ids, book_ids, sorter=order), len(cf_ids) - 1)
+        matched = cf_ids[order[positions]] == book_ids
+        blended[matched] += weight * cf_values[order[positions[matched]]]
+        
+        # Neighbours the content path did not score, e.g. outside the LSH candidates
+        unscored = ~np.isin(cf_ids, book_ids) & book_index.contains(cf_ids)
+        return (
+            np.concatenate([book_ids, cf_ids[unscored]]),
+            np.concatenate([blended, weight * cf_values[unscored]]),
+        )
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions of the k highest scores, best first, by partial selection
+        (O(n + k log k) instead of sorting every candidate). Ties keep input order.
+        """
+        if k <= 0 or len(scores) == 0:
+            return np.array([], dtype=np.int64)
+        if k < len(scores):
+            # k-th highest score; of the books tied with it keep the earliest ones
+            threshold = -np.partition(-scores, k - 1)[k - 1]
+            above = np.nonzero(scores > threshold)[0]
+            tied = np.nonzero(scores == threshold)[0][:k - len(above)]
+            selected = np.concatenate([above, tied])
+        else:
+            selected = np.arange(len(scores))
+        return selected[np.lexsort((selected, -scores[selected]))]
+
+    def _fetch_book_rows(self, book_ids) -> Dict:
+        """Load only the response columns of the given books."""
+        book_ids = [int(book_id) for book_id in book_ids]
+        if not book_ids:
+            return {}
+        rows = (
+            self.db.query(Book.id, Book.title, Book.author, Book.description, Book.summary)
+            .filter(Book.id.in_(book_ids))
+            .all()
+        )
+        return {row.id: row for row in rows}
+
+    def _recommendation_dicts(self, book_ids, scores, book_rows: Dict) -> List[Dict]:
         recommendations = []
-        for book, score in ranked:
+        for book_id, score in zip(book_ids, scores):
+            book = book_rows.get(int(book_id))
+            if book is None:
+                continue
+            score = float(score)
             recommendations.append({
                 "id": book.id,
                 "title": book.title,
@@ -141,93 +221,249 @@ class RecommendationService:
                 "score": round(score, 3),
                 "reason": f"Similar to books you enjoyed (match: {int(score * 100)}%)"
             })
-        
         return recommendations
 
+    def rank_by_score(self, book_ids: np.ndarray, scores: np.ndarray, limit: int) -> List[Dict]:
+        """Select the top `limit` candidates and build response dicts for those books only."""
+        top = self.top_k(scores, limit)
+        return self._recommendation_dicts(book_ids[top], scores[top], self._fetch_book_rows(book_ids[top]))
+
+    def _explore_books(self, limit: int, reason: str) -> List[Dict]:
+        """
+        Cold-start suggestions: the most popular books of the trending leaderboard,
+        padded with the first books of the catalog while the leaderboard is short.
+        """
+        trending_books.ensure_seeded(self.db)
+        book_ids = [book_id for book_id, _ in trending_books.top_books(limit)]
+        book_rows = self._fetch_book_rows(book_ids)
+        books = [book_rows[book_id] for book_id in book_ids if book_id in book_rows]
+        if len(books) < limit:
+            books += (
+                self.db.query(Book.id, Book.title, Book.author, Book.description, Book.summary)
+                .filter(~Book.id.in_([book.id for book in books]))
+                .order_by(Book.id)
+                .limit(limit - len(books))
+                .all()
+            )
+        return [
+            {
+                "id": book.id,
+                "title": book.title,
+                "author": book.author,
+                "description": book.description,
+                "summary": book.summary,
+                "score": 0.5,
+                "reason": reason
+            }
+            for book in books
+        ]
+
     async def get_recommendations(self, user_id: int, limit: int = 5) -> List[Dict]:
+        """
+        Serve recommendations from the result cache, then from the precomputed
+        user_recommendations row. Falls back to live computation (and stores the
+        result) when there is no row, it is older than RECOMMENDATION_STALENESS_SECONDS,
+        it predates the user's latest review or the latest catalog change, or it holds
+        fewer entries than requested.
+        Cache entries are invalidated by bumping the user's version (new review,
+        refreshed row) or the catalog version (book uploaded, edited or deleted).
+        """
+        cache_key = await recommendation_cache_key(user_id, limit)
+        cached = await recommendation_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        # Read before computing, so a catalog change during the computation leaves the row stale
+        catalog_version = await cache_versions.aget("catalog")
+        recommendations = self.get_stored_recommendations(user_id, limit, catalog_version)
+        if recommendations is None:
+            recommendations = await self.compute_recommendations(user_id, limit=max(limit, settings.RECOMMENDATION_TOP_N))
+            self.store_recommendations(user_id, recommendations, catalog_version=catalog_version)
+            recommendations = recommendations[:limit]
+        await recommendation_cache.aset(cache_key, recommendations)
+        return recommendations
+
+    def latest_review_id(self, user_id: int) -> int:
+        """Id of the user's newest review, from the preference profile when there is one."""
+        last_review_id = (
+            self.db.query(UserPreference.last_review_id).filter(UserPreference.user_id == user_id).scalar()
+        )
+        if last_review_id is None:
+            last_review_id = self.db.query(func.max(Review.id)).filter(Review.user_id == user_id).scalar()
+        return last_review_id or 0
+
+    def get_stored_recommendations(self, user_id: int, limit: int, catalog_version: int | None = None) -> List[Dict] | None:
+        """
+        Primary-key lookup of precomputed recommendations; None on a miss, a row older
+        than the staleness limit, or a row computed before the user's latest review or
+        the latest catalog change.
+        """
+        if limit > settings.RECOMMENDATION_TOP_N:
+            return None
+        row = self.db.get(UserRecommendation, user_id)
+        if row is None:
+            return None
+        if row.computed_at < datetime.utcnow() - timedelta(seconds=settings.RECOMMENDATION_STALENESS_SECONDS):
+            return None
+        if catalog_version is None:
+            catalog_version = cache_versions.get("catalog")
+        if row.catalog_version != catalog_version:
+            return None
+        if (row.last_review_id or 0) < self.latest_review_id(user_id):
+            return None
+        return row.recommendations[:limit]
+
+    def store_recommendations(self, user_id: int, recommendations: List[Dict], last_review_id: int | None = None,
+                              catalog_version: int | None = None) -> None:
+        """Upsert the precomputed recommendations of a user."""
+        try:
+            if last_review_id is None:
+                last_review_id = self.db.query(func.max(Review.id)).filter(Review.user_id == user_id).scalar() or 0
+            if catalog_version is None:
+                catalog_version = cache_versions.get("catalog")
+            row = self.db.get(UserRecommendation, user_id)
+            if row is None:
+                row = UserRecommendation(user_id=user_id)
+                self.db.add(row)
+            row.recommendations = recommendations
+            row.last_review_id = last_review_id
+            row.catalog_version = catalog_version
+            row.computed_at = datetime.utcnow()
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to store recommendations for user {user_id}: {e}")
+
+    async def compute_recommendations(self, user_id: int, limit: int = 5) -> List[Dict]:
         """
         Main recommendation function following the pattern:
-        1. Get books with positive sentiment from user reviews
-        2. Find similar books to those liked books
+        1. Get books with positive sentiment from the user's stored preference profile
+        2. Find similar books to those liked books (content similarity blended with borrow/review co-occurrence)
         3. Rank by similarity score
         4. Return top N recommendations
         
-        If user has no reviews, return all available books.
-        """
-        # Fetch all books from database
-        all_books = self.db.query(Book).all()
-        
-        # Fetch user's reviews
-        user_reviews = self.db.query(Review).filter(Review.user_id == user_id).all()
-        
-        # If user has no reviews, return all books
-        if not user_reviews:
-            return [
-                {
-                    "id": book.id,
-                    "title": book.title,
-                    "author": book.author,
-                    "description": book.description,
-                    "summary": book.summary,
-                    "score": 0.5,
-                    "reason": "Explore our collection"
-                }
-                for book in all_books[:limit]
-            ]
+        If user has no reviews, return trending books.
+        """
+        # Read the user's preference profile instead of rescanning their reviews
+        profile = self.preference_service.get_profile(user_id, self.db)
+        
+        # If user has no reviews, return trending books
+        if not profile.review_count:
+            return self._explore_books(limit, "Explore our collection")
         
         # Step 1: Get books with positive sentiment
-        liked_books = self.get_books_with_positive_sentiment(user_id)
+        liked_books = self.get_liked_books({user_id: profile})[user_id]
         
-        # If no positive reviews, return all books
+        # If no positive reviews, return trending books
         if not liked_books:
-            return [
-                {
-                    "id": book.id,
-                    "title": book.title,
-                    "author": book.author,
-                    "description": book.description,
-                    "summary": book.summary,
-                    "score": 0.5,
-                    "reason": "Try something new"
-                }
-                for book in all_books[:limit]
-            ]
+            return self._explore_books(limit, "Try something new")
         
         # Step 2: Get similar books to liked books
-        similar_books = self.get_similar_books(liked_books, all_books)
-        
-        # Step 3: Rank by score
-        ranked_recommendations = self.rank_by_score(similar_books)
+        book_ids, scores = self.get_similar_books(liked_books, min_candidates=limit)
+        book_ids, scores = self.blend_collaborative(book_ids, scores, liked_books)
         
-        # Step 4: Return top N recommendations
-        return ranked_recommendations[:limit]
+        # Steps 3 and 4: Select the top N by score and build their responses
+        return self.rank_by_score(book_ids, scores, limit)
 
-    async def get_genai_reviews_summary(self, user_id: int) -> Dict:
-        # Fetch all reviews by the user
-        user_reviews = self.db.query(Review).filter(Review.user_id == user_id).all()
+    async def get_batch_recommendations(self, user_ids: List[int], limit: int = 5) -> Dict[int, List[Dict]]:
+        """
+        Recommendations for many users in one pass.
         
-        if not user_reviews:
-            return {
-                "user_id": user_id,
-                "total_reviews": 0,
-                "average_rating": None,
-                "summary": "No reviews found for this user.",
-                "sentiment_breakdown": {"positive": 0, "neutral": 0, "negative": 0},
-                "reviewed_books": []
-            }
+        Preference profiles of all users are read in one query, every user's liked books are
+        stacked into one matrix and the catalog is scored against all of them with a
+        single sparse matrix multiply. Each user's list matches what
+        get_recommendations returns with the exact index mode.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        
+        profiles = self.preference_service.get_profiles(user_ids, self.db)
+        liked_books_by_user = self.get_liked_books(profiles)
+        
+        results = {}
+        liked_by_user = {}
+        for user_id in user_ids:
+            if not profiles[user_id].review_count:
+                results[user_id] = self._explore_books(limit, "Explore our collection")
+                continue
+            liked_books = liked_books_by_user[user_id]
+            if not liked_books:
+                results[user_id] = self._explore_books(limit, "Try something new")
+                continue
+            liked_by_user[user_id] = liked_books
+        
+        if not liked_by_user:
+            return {user_id: results[user_id] for user_id in user_ids}
+        
+        # Stack the distinct liked books of all users and remember which rows belong to whom
+        liked_rows = {}
+        for liked_books in liked_by_user.values():
+            for book, _ in liked_books:
+                liked_rows.setdefault(book.id, (len(liked_rows), book))
+        stacked_books = [book for _, book in sorted(liked_rows.values(), key=lambda item: item[0])]
+        
+        try:
+            liked_vectors = book_index.vectors_for(stacked_books, self.db)
+            if liked_vectors is None or not book_index.sync_catalog(self.db):
+                raise ValueError("book index is unavailable")
+            groups = [[liked_rows[book.id][0] for book, _ in liked_books] for liked_books in liked_by_user.values()]
+            excludes = [{book.id for book, _ in liked_books} for liked_books in liked_by_user.values()]
+            scored = book_index.most_similar_batch(liked_vectors, groups, excludes)
+        except Exception as e:
+            logger.error(f"Batch similarity calculation error: {e}")
+            scored = None
+        
+        neighbor_similarities = self.cooccurrence_service.neighbor_similarities(liked_rows.keys(), self.db)
+        selected = {}
+        for position, (user_id, liked_books) in enumerate(liked_by_user.items()):
+            if scored is None:
+                book_ids, scores = self._neutral_scores([book.id for book, _ in liked_books])
+            else:
+                book_ids, scores = scored[position]
+            book_ids, scores = self.blend_collaborative(book_ids, scores, liked_books, neighbor_similarities)
+            top = self.top_k(scores, limit)
+            selected[user_id] = (book_ids[top], scores[top])
+        
+        # Load the response columns of every selected book in one query
+        book_rows = self._fetch_book_rows({int(book_id) for book_ids, _ in selected.values() for book_id in book_ids})
+        for user_id, (book_ids, scores) in selected.items():
+            results[user_id] = self._recommendation_dicts(book_ids, scores, book_rows)
         
-        # Collect review data and analyze sentiment
+        return {user_id: results[user_id] for user_id in user_ids}
+
+    async def get_genai_reviews_summary(self, user_id: int, deadline: Optional[Deadline] = None) -> Dict:
+        """
+        GenAI summary of a user's reviews, served from the result cache while the
+        user's version (bumped by a new review) and the catalog version are unchanged.
+        Concurrent misses for the same user share one computation. The fallback
+        summary is served when the LLM does not answer within `deadline`.
+        """
+        cache_key = await review_summary_cache_key(user_id)
+        cached = await review_summary_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def compute():
+            summary, complete = await self.compute_genai_reviews_summary(user_id, deadline)
+            # Fallback summaries are not cached, so the next request retries the LLM
+            if complete:
+                await review_summary_cache.aset(cache_key, summary)
+            return summary
+        
+        return await review_summary_flights.do(cache_key, compute, cache_get=lambda: review_summary_cache.aget(cache_key))
+
+    def _user_review_stats(self, user_reviews: List[Review]) -> Tuple[List[Dict], Dict, float | None]:
+        """Per-review data, sentiment breakdown and average rating of a user's reviews."""
         reviews_data = []
         sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0}
         total_rating = 0
         
         for review in user_reviews:
-            book = self.db.query(Book).filter(Book.id == review.book_id).first()
+            book = review.book
             book_title = book.title if book else "Unknown Book"
             book_author = book.author if book else "Unknown Author"
             
             # Analyze sentiment of the comment
-            sentiment = self.analyze_sentiment_textblob(review.comment or "")
+            sentiment = self.sentiment_service.get_review_sentiment(review)
             sentiment_label = sentiment["label"].lower()
             sentiment_counts[sentiment_label] = sentiment_counts.get(sentiment_label, 0) + 1
             
@@ -242,40 +478,34 @@ class RecommendationService:
             })
         
         # Calculate average rating
-        average_rating = round(total_rating / len(user_reviews), 2)
-        
-        # Prepare text for AI summarization
-        reviews_text = "\n".join([
-            f"- Book: '{r['book_title']}' by {r['book_author']}, Rating: {r['rating']}/5, Comment: {r['comment']}"
-            for r in reviews_data
-        ])
+        average_rating = round(total_rating / len(user_reviews), 2) if user_reviews else None
+        return reviews_data, sentiment_counts, average_rating
+
+    def _user_summary_prompt(self, reviews_data: List[Dict], average_rating: float, sentiment_counts: Dict) -> str:
+        # Prepare text for AI summarization from a representative sample that fits the prompt budget
+        format_line = lambda r: f"- Book: '{r['book_title']}' by {r['book_author']}, Rating: {r['rating']}/5, Comment: {r['comment']}"
+        sampled = self.review_sampling_service.select(reviews_data, format_line)
+        reviews_text = "\n".join(format_line(r) for r in sampled)
         
-        # Generate AI summary
-        try:
-            ai_prompt = f"""Analyze and summarize the following book reviews from a single user. 
+        return f"""Analyze and summarize the following book reviews from a single user. 
                             Provide insights about their reading preferences, favorite genres/authors, and overall sentiment.
                             Keep the summary concise (2-3 paragraphs).
 
-                            User Reviews:
+                            User Reviews ({len(sampled)} representative of {len(reviews_data)}):
                             {reviews_text}
 
                             Average Rating: {average_rating}/5
-                            Total Reviews: {len(user_reviews)}
+                            Total Reviews: {len(reviews_data)}
                             Sentiment Breakdown: {sentiment_counts['positive']} positive, {sentiment_counts['neutral']} neutral, {sentiment_counts['negative']} negative"""
 
-            ai_summary = await self.ai_service.summarize(ai_prompt)
-            
-            if not ai_summary:
-                ai_summary = self._generate_fallback_summary(reviews_data, average_rating, sentiment_counts)
-        except Exception as e:
-            logger.error(f"AI summarization failed: {e}")
-            ai_summary = self._generate_fallback_summary(reviews_data, average_rating, sentiment_counts)
-        
+    @staticmethod
+    def _user_summary_result(user_id: int, reviews_data: List[Dict], average_rating: float | None,
+                             sentiment_counts: Dict, summary: str | None) -> Dict:
         return {
             "user_id": user_id,
-            "total_reviews": len(user_reviews),
+            "total_reviews": len(reviews_data),
             "average_rating": average_rating,
-            "summary": ai_summary,
+            "summary": summary,
             "sentiment_breakdown": sentiment_counts,
             "reviewed_books": [
                 {"title": r["book_title"], "author": r["book_author"], "rating": r["rating"]}
@@ -283,47 +513,120 @@ class RecommendationService:
             ]
         }
 
-    async def get_book_reviews_analysis(self, book_id: int) -> Dict:
-        """
-        Get GenAI-aggregated summary of all reviews for a specific book.
-        """
-        # Fetch the book
-        book = self.db.query(Book).filter(Book.id == book_id).first()
-        if not book:
-            return {
-                "book_id": book_id,
-                "error": "Book not found"
-            }
+    async def compute_genai_reviews_summary(self, user_id: int, deadline: Optional[Deadline] = None) -> Tuple[Dict, bool]:
+        """Build the reviews summary; the flag is False when the fallback summary was used."""
+        # Fetch all reviews by the user along with their books
+        user_reviews = self.get_user_reviews_with_books(user_id)
+        reviews_data, sentiment_counts, average_rating = self._user_review_stats(user_reviews)
         
-        # Fetch all reviews for this book
-        book_reviews = self.db.query(Review).filter(Review.book_id == book_id).all()
+        if not reviews_data:
+            return self._user_summary_result(user_id, [], None, sentiment_counts, "No reviews found for this user."), True
         
-        if not book_reviews:
-            return {
-                "book_id": book_id,
-                "book_title": book.title,
-                "book_author": book.author,
-                "total_reviews": 0,
-                "average_rating": None,
-                "summary": book.summary or "No reviews yet for this book.",
-                "sentiment_breakdown": {"positive": 0, "neutral": 0, "negative": 0},
-                "reviews": []
-            }
+        # Generate AI summary
+        try:
+            ai_prompt = self._user_summary_prompt(reviews_data, average_rating, sentiment_counts)
+            ai_summary = await self.ai_service.summarize(ai_prompt, hedge=True, deadline=deadline)
+            complete = bool(ai_summary)
+            
+            if not ai_summary:
+                ai_summary = self._generate_fallback_summary(reviews_data, average_rating, sentiment_counts)
+        except Exception as e:
+            logger.error(f"AI summarization failed: {e}")
+            complete = False
+            ai_summary = self._generate_fallback_summary(reviews_data, average_rating, sentiment_counts)
         
-        # Collect review data and analyze sentiment
+        return self._user_summary_result(user_id, reviews_data, average_rating, sentiment_counts, ai_summary), complete
+
+    @staticmethod
+    def _result_events(result: Dict) -> List[Tuple[str, Dict]]:
+        """Stream events of an already finished result: its stats, the whole summary, then the result."""
+        events = [("stats", {key: value for key, value in result.items() if key != "summary"})]
+        if result.get("summary"):
+            events.append(("summary", {"delta": result["summary"]}))
+        events.append(("done", result))
+        return events
+
+    async def stream_genai_reviews_summary(self, user_id: int, deadline: Optional[Deadline] = None):
+        """
+        The reviews summary as (event, data) pairs for server-sent events: "stats"
+        with everything but the summary, "summary" pieces ({"delta": text}) as the
+        LLM writes them, then "done" with the full result. If the LLM does not
+        finish, the summary in "done" is the fallback summary and nothing is cached.
+        """
+        cache_key = await review_summary_cache_key(user_id)
+        cached = await review_summary_cache.aget(cache_key)
+        if cached is not None:
+            for event in self._result_events(cached):
+                yield event
+            return
+        
+        user_reviews = self.get_user_reviews_with_books(user_id)
+        reviews_data, sentiment_counts, average_rating = self._user_review_stats(user_reviews)
+        if not reviews_data:
+            for event in self._result_events(self._user_summary_result(user_id, [], None, sentiment_counts, "No reviews found for this user.")):
+                yield event
+            return
+        
+        result = self._user_summary_result(user_id, reviews_data, average_rating, sentiment_counts, None)
+        yield "stats", {key: value for key, value in result.items() if key != "summary"}
+        
+        pieces = []
+        try:
+            ai_prompt = self._user_summary_prompt(reviews_data, average_rating, sentiment_counts)
+            async for piece in self.ai_service.stream_summary(ai_prompt, deadline=deadline):
+                pieces.append(piece)
+                yield "summary", {"delta": piece}
+            complete = bool(pieces)
+        except Exception as e:
+            logger.error(f"AI summary stream failed for user {user_id}: {e}")
+            complete = False
+        
+        if complete:
+            result["summary"] = "".join(pieces)
+            await review_summary_cache.aset(cache_key, result)
+        else:
+            result["summary"] = self._generate_fallback_summary(reviews_data, average_rating, sentiment_counts)
+        yield "done", result
+
+    async def get_book_reviews_analysis(self, book_id: int, max_consensus_batches: int | None = 1,
+                                        deadline: Optional[Deadline] = None) -> Dict:
+        """
+        Get GenAI-aggregated summary of all reviews for a specific book, served from
+        the result cache while the book's version (bumped by a new review) and the
+        catalog version are unchanged. Concurrent misses for the same book share
+        one computation. LLM work stops when `deadline` runs out.
+        """
+        cache_key = await book_analysis_cache_key(book_id)
+        cached = await book_analysis_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def compute():
+            analysis, complete = await self.compute_book_reviews_analysis(book_id, max_consensus_batches, deadline)
+            # Only cache once the consensus covers every review, so pending batches keep being folded
+            if complete:
+                await book_analysis_cache.aset(cache_key, analysis)
+            return analysis
+        
+        return await book_analysis_flights.do(f"{cache_key}:b{max_consensus_batches}", compute,
+                                              cache_get=lambda: book_analysis_cache.aget(cache_key))
+
+    def _book_review_stats(self, book_reviews: List[Review]) -> Tuple[List[Dict], Dict, float | None]:
+        """Per-review data, sentiment breakdown and average rating of a book's reviews."""
         reviews_data = []
         sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0}
         total_rating = 0
         
         for review in book_reviews:
             # Analyze sentiment of the comment
-            sentiment = self.analyze_sentiment_textblob(review.comment or "")
+            sentiment = self.sentiment_service.get_review_sentiment(review)
             sentiment_label = sentiment["label"].lower()
             sentiment_counts[sentiment_label] = sentiment_counts.get(sentiment_label, 0) + 1
             
             total_rating += review.rating
             
             reviews_data.append({
+                "review_id": review.id,
                 "user_id": review.user_id,
                 "rating": review.rating,
                 "comment": review.comment or "",
@@ -331,50 +634,230 @@ class RecommendationService:
             })
         
         # Calculate average rating
-        average_rating = round(total_rating / len(book_reviews), 2)
+        average_rating = round(total_rating / len(book_reviews), 2) if book_reviews else None
+        return reviews_data, sentiment_counts, average_rating
+
+    @staticmethod
+    def _book_analysis_result(book: Book, reviews_data: List[Dict], average_rating: float | None,
+                              sentiment_counts: Dict, summary: str | None, pending_reviews: int = 0) -> Dict:
+        # Only the oldest few reviews are embedded; clients page through the rest with
+        # GET /api/books/{book_id}/reviews?after_id=<reviews_next_after_id>
+        embedded = reviews_data[:settings.ANALYSIS_EMBEDDED_REVIEWS]
+        next_after_id = embedded[-1]["review_id"] if embedded and len(reviews_data) > len(embedded) else None
         
-        # Prepare text for AI summarization
-        reviews_text = "\n".join([
-            f"- Rating: {r['rating']}/5, Comment: {r['comment']}, Sentiment: {r['sentiment']}"
-            for r in reviews_data
-        ])
+        return {
+            "book_id": book.id,
+            "book_title": book.title,
+            "book_author": book.author,
+            "total_reviews": len(reviews_data),
+            "average_rating": average_rating,
+            "summary": summary,
+            "sentiment_breakdown": sentiment_counts,
+            "reviews": [
+                {"user_id": r["user_id"], "rating": r["rating"], "sentiment": r["sentiment"]}
+                for r in embedded
+            ],
+            "reviews_next_after_id": next_after_id,
+            # Reviews not folded into the summary yet
+            "consensus_pending_reviews": pending_reviews
+        }
+
+    async def compute_book_reviews_analysis(self, book_id: int, max_consensus_batches: int | None = 1,
+                                            deadline: Optional[Deadline] = None) -> Tuple[Dict, bool]:
+        """
+        Build the book analysis. The summary is a stored rolling consensus; each call
+        folds at most `max_consensus_batches` batches of new reviews into it (None
+        folds all). The flag is True when the consensus covers every review.
+        """
+        # Fetch the book
+        book = self.db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            return {
+                "book_id": book_id,
+                "error": "Book not found"
+            }, False
         
-        # Generate AI summary
-        try:
-            ai_prompt = f"""Analyze and summarize the following reviews for the book "{book.title}" by {book.author}.
+        # Fetch all reviews for this book, oldest first so the consensus watermark only moves forward
+        book_reviews = self.db.query(Review).filter(Review.book_id == book_id).order_by(Review.id).all()
+        reviews_data, sentiment_counts, average_rating = self._book_review_stats(book_reviews)
+        
+        if not reviews_data:
+            return self._book_analysis_result(book, [], None, sentiment_counts,
+                                              book.summary or "No reviews yet for this book."), True
+        
+        # Fold the reviews that arrived since the last refresh into the stored consensus
+        ai_summary = await self.refresh_book_consensus(book, reviews_data, average_rating, sentiment_counts,
+                                                       max_consensus_batches, deadline)
+        consensus = self.db.get(BookReviewConsensus, book_id)
+        watermark = consensus.last_review_id if consensus else 0
+        pending = sum(1 for r in reviews_data if r["review_id"] > watermark)
+        
+        return self._book_analysis_result(book, reviews_data, average_rating, sentiment_counts, ai_summary,
+                                          pending), pending == 0
+
+    def _consensus_prompt(self, book: Book, consensus: BookReviewConsensus | None, batch: List[Dict],
+                          reviews_data: List[Dict], average_rating: float, sentiment_counts: Dict) -> str:
+        """Prompt that starts the book's consensus from, or folds into it, one batch of reviews."""
+        format_line = lambda r: f"- Rating: {r['rating']}/5, Comment: {r['comment']}, Sentiment: {r['sentiment']}"
+        # Only a representative sample of the batch that fits the prompt budget is sent
+        sampled = self.review_sampling_service.select(batch, format_line)
+        reviews_text = "\n".join(format_line(r) for r in sampled)
+        stats_text = f"""Average Rating: {average_rating}/5
+                            Total Reviews: {len(reviews_data)}
+                            Sentiment: {sentiment_counts['positive']} positive, {sentiment_counts['neutral']} neutral, {sentiment_counts['negative']} negative"""
+        
+        if consensus is None:
+            return f"""Analyze and summarize the following reviews for the book "{book.title}" by {book.author}.
                             Provide a concise rolling consensus of what readers think about this book.
                             Include overall sentiment and key themes from the reviews.
 
                             Book Summary: {book.summary or 'No summary available'}
 
-                            Reviews:
+                            Reviews ({len(sampled)} representative of {len(batch)}):
                             {reviews_text}
 
-                            Average Rating: {average_rating}/5
-                            Total Reviews: {len(book_reviews)}
-                            Sentiment: {sentiment_counts['positive']} positive, {sentiment_counts['neutral']} neutral, {sentiment_counts['negative']} negative"""
+                            {stats_text}"""
+        return f"""Update the rolling consensus of what readers think about the book "{book.title}" by {book.author}.
+                            The previous consensus covers {consensus.review_count} review(s). Revise it with the new reviews below
+                            and return only the updated consensus, keeping it concise.
+                            Include overall sentiment and key themes from the reviews.
+
+                            Previous Consensus:
+                            {consensus.summary}
+
+                            New Reviews ({len(sampled)} representative of {len(batch)}):
+                            {reviews_text}
+
+                            {stats_text}"""
 
-            ai_summary = await self.ai_service.summarize(ai_prompt)
+    def _store_consensus(self, book: Book, consensus: BookReviewConsensus | None, batch: List[Dict],
+                         summary: str) -> BookReviewConsensus | None:
+        """Store `summary` as the consensus up to the last review of `batch`; None when the write failed."""
+        try:
+            if consensus is None:
+                consensus = BookReviewConsensus(book_id=book.id, review_count=0)
+                self.db.add(consensus)
+            consensus.summary = summary
+            consensus.last_review_id = batch[-1]["review_id"]
+            consensus.review_count = (consensus.review_count or 0) + len(batch)
+            self.db.commit()
+            return consensus
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to store review consensus for book {book.id}: {e}")
+            return None
+
+    async def refresh_book_consensus(self, book: Book, reviews_data: List[Dict], average_rating: float,
+                                     sentiment_counts: Dict, max_batches: int | None = 1,
+                                     deadline: Optional[Deadline] = None) -> str:
+        """
+        Bring the book's rolling review consensus up to date and return it.
+
+        Reviews newer than the stored watermark are folded in batches of
+        BOOK_CONSENSUS_BATCH_SIZE, each LLM call seeing only the previous consensus
+        and a representative sample of one batch within ANALYSIS_PROMPT_TOKEN_BUDGET,
+        so prompt size does not grow with the number of reviews.
+        The aggregate stats in the prompt still cover every review.
+        No new batch is started once `deadline` has run out; without any stored
+        consensus the fallback summary is returned.
+        """
+        consensus = self.db.get(BookReviewConsensus, book.id)
+        watermark = consensus.last_review_id if consensus else 0
+        pending = [r for r in reviews_data if r["review_id"] > watermark]
+        batch_size = max(1, settings.BOOK_CONSENSUS_BATCH_SIZE)
+        
+        batches = 0
+        while pending and (max_batches is None or batches < max_batches):
+            if deadline is not None and deadline.expired:
+                logger.warning(f"Deadline reached with {len(pending)} review(s) of book {book.id} left to fold")
+                break
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            ai_prompt = self._consensus_prompt(book, consensus, batch, reviews_data, average_rating, sentiment_counts)
             
+            try:
+                ai_summary = await self.ai_service.summarize(ai_prompt, hedge=True, deadline=deadline)
+            except Exception as e:
+                logger.error(f"AI summarization failed for book {book.id}: {e}")
+                ai_summary = None
             if not ai_summary:
-                ai_summary = self._generate_book_fallback_summary(book, reviews_data, average_rating, sentiment_counts)
-        except Exception as e:
-            logger.error(f"AI summarization failed for book {book_id}: {e}")
-            ai_summary = self._generate_book_fallback_summary(book, reviews_data, average_rating, sentiment_counts)
+                break
+            
+            stored = self._store_consensus(book, consensus, batch, ai_summary)
+            if stored is None:
+                return ai_summary
+            consensus = stored
+            batches += 1
+        
+        if consensus is None:
+            return self._generate_book_fallback_summary(book, reviews_data, average_rating, sentiment_counts)
+        return consensus.summary
+
+    async def stream_book_reviews_analysis(self, book_id: int, deadline: Optional[Deadline] = None):
+        """
+        The book analysis as (event, data) pairs for server-sent events, like
+        `stream_genai_reviews_summary`. At most one batch of new reviews is folded
+        into the consensus, with that LLM call streamed; an up to date consensus is
+        sent whole. If the LLM does not finish, "done" carries the stored consensus
+        or the fallback summary.
+        """
+        cache_key = await book_analysis_cache_key(book_id)
+        cached = await book_analysis_cache.aget(cache_key)
+        if cached is not None:
+            for event in self._result_events(cached):
+                yield event
+            return
         
-        return {
-            "book_id": book_id,
-            "book_title": book.title,
-            "book_author": book.author,
-            "total_reviews": len(book_reviews),
-            "average_rating": average_rating,
-            "summary": ai_summary,
-            "sentiment_breakdown": sentiment_counts,
-            "reviews": [
-                {"user_id": r["user_id"], "rating": r["rating"], "sentiment": r["sentiment"]}
-                for r in reviews_data
-            ]
-        }
+        book = self.db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            yield "done", {"book_id": book_id, "error": "Book not found"}
+            return
+        
+        book_reviews = self.db.query(Review).filter(Review.book_id == book_id).order_by(Review.id).all()
+        reviews_data, sentiment_counts, average_rating = self._book_review_stats(book_reviews)
+        if not reviews_data:
+            result = self._book_analysis_result(book, [], None, sentiment_counts, book.summary or "No reviews yet for this book.")
+            await book_analysis_cache.aset(cache_key, result)
+            for event in self._result_events(result):
+                yield event
+            return
+        
+        consensus = self.db.get(BookReviewConsensus, book.id)
+        watermark = consensus.last_review_id if consensus else 0
+        pending = [r for r in reviews_data if r["review_id"] > watermark]
+        result = self._book_analysis_result(book, reviews_data, average_rating, sentiment_counts, None, len(pending))
+        yield "stats", {key: value for key, value in result.items() if key != "summary"}
+        if not pending:
+            result["summary"] = consensus.summary
+            await book_analysis_cache.aset(cache_key, result)
+            yield "summary", {"delta": consensus.summary}
+            yield "done", result
+            return
+        
+        batch = pending[:max(1, settings.BOOK_CONSENSUS_BATCH_SIZE)]
+        pieces = []
+        try:
+            ai_prompt = self._consensus_prompt(book, consensus, batch, reviews_data, average_rating, sentiment_counts)
+            async for piece in self.ai_service.stream_summary(ai_prompt, deadline=deadline):
+                pieces.append(piece)
+                yield "summary", {"delta": piece}
+            complete = bool(pieces)
+        except Exception as e:
+            logger.error(f"AI summary stream failed for book {book.id}: {e}")
+            complete = False
+        
+        if complete:
+            result["summary"] = "".join(pieces)
+            stored = self._store_consensus(book, consensus, batch, result["summary"])
+            if stored is not None:
+                result["consensus_pending_reviews"] = len(pending) - len(batch)
+            # Only cache once the consensus covers every review
+            if stored is not None and not result["consensus_pending_reviews"]:
+                await book_analysis_cache.aset(cache_key, result)
+        elif consensus is not None:
+            result["summary"] = consensus.summary
+        else:
+            result["summary"] = self._generate_book_fallback_summary(book, reviews_data, average_rating, sentiment_counts)
+        yield "done", result
 
     def _generate_book_fallback_summary(self, book: Book, reviews_data: List[Dict], average_rating: float, sentiment_counts: Dict) -> str:
         """
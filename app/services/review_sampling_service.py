@@ -0,0 +1,104 @@
+import re
+from typing import Callable, Dict, List
+from app.core.config import settings
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class ReviewSamplingService:
+    """
+    Picks a representative subset of reviews that fits an LLM prompt budget.
+
+    Reviews are grouped into strata by (rating, sentiment) and drawn from the
+    strata in proportion to their size, so the sample keeps the shape of the
+    full distribution. Within a stratum longer comments come first, and
+    comments that are near-duplicates (word-shingle Jaccard similarity) of an
+    already selected one are skipped. Very long comments are truncated.
+    Token counts are estimated at ~4 characters per token.
+    """
+
+    CHARS_PER_TOKEN = 4
+    SHINGLE_SIZE = 3
+
+    def __init__(self, token_budget: int = settings.ANALYSIS_PROMPT_TOKEN_BUDGET,
+                 comment_max_tokens: int = settings.REVIEW_COMMENT_MAX_TOKENS,
+                 duplicate_threshold: float = settings.REVIEW_DUPLICATE_THRESHOLD):
+        self.token_budget = token_budget
+        self.comment_max_tokens = comment_max_tokens
+        self.duplicate_threshold = duplicate_threshold
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        return len(text) // cls.CHARS_PER_TOKEN + 1
+
+    def _truncate(self, comment: str) -> str:
+        max_chars = self.comment_max_tokens * self.CHARS_PER_TOKEN
+        if len(comment) <= max_chars:
+            return comment
+        return comment[:max_chars].rsplit(" ", 1)[0] + "..."
+
+    def _shingles(self, comment: str) -> frozenset:
+        words = re.findall(r"\w+", comment.lower())
+        if len(words) < self.SHINGLE_SIZE:
+            return frozenset([" ".join(words)])
+        return frozenset(" ".join(words[i:i + self.SHINGLE_SIZE]) for i in range(len(words) - self.SHINGLE_SIZE + 1))
+
+    def _is_duplicate(self, shingles: frozenset, selected: List[frozenset]) -> bool:
+        for other in selected:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= self.duplicate_threshold:
+                return True
+        return False
+
+    def select(self, reviews: List[Dict], format_line: Callable[[Dict], str]) -> List[Dict]:
+        """
+        Return the reviews to put in the prompt, in their original order, with long
+        comments truncated. `format_line` renders one review as its prompt line.
+        """
+        strata = {}
+        for position, review in enumerate(reviews):
+            key = (review.get("rating"), review.get("sentiment"))
+            strata.setdefault(key, []).append((position, review))
+        for members in strata.values():
+            members.sort(key=lambda member: (-len(member[1].get("comment") or ""), member[0]))
+
+        total = len(reviews)
+        picked = {key: 0 for key in strata}
+        cursors = {key: 0 for key in strata}
+        chosen = []
+        selected_shingles = []
+        used_tokens = 0
+        min_cost = None
+        while True:
+            open_strata = [key for key in strata if cursors[key] < len(strata[key])]
+            if not open_strata:
+                break
+            # Draw from the stratum furthest below its proportional share
+            drawn = sum(picked.values()) + 1
+            key = max(open_strata, key=lambda k: (len(strata[k]) / total * drawn - picked[k], len(strata[k])))
+            position, review = strata[key][cursors[key]]
+            cursors[key] += 1
+
+            comment = review.get("comment") or ""
+            shingles = self._shingles(comment)
+            if comment and self._is_duplicate(shingles, selected_shingles):
+                continue
+            candidate = {**review, "comment": self._truncate(comment)}
+            cost = self.estimate_tokens(format_line(candidate)) + 1
+            min_cost = cost if min_cost is None else min(min_cost, cost)
+            if used_tokens + cost > self.token_budget:
+                # Stop once not even the shortest line seen so far would fit
+                if self.token_budget - used_tokens < min_cost:
+                    break
+                continue
+            used_tokens += cost
+            picked[key] += 1
+            if comment:
+                selected_shingles.append(shingles)
+            chosen.append((position, candidate))
+
+        if len(chosen) < total:
+            logger.info(f"Sampled {len(chosen)} of {total} reviews into ~{used_tokens} prompt tokens")
+        return [candidate for _, candidate in sorted(chosen, key=lambda item: item[0])]
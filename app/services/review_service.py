@@ -2,8 +2,14 @@ from sqlalchemy.orm import Session
 from app.models.review import Review as ReviewModel
 from app.models.borrow import Borrow as BorrowModel
 from app.services.borrow_service import BorrowService
+from app.services.sentiment_service import SentimentService
+from app.services.cooccurrence_service import CooccurrenceService
+from app.services.preference_service import PreferenceService
+from app.services.trending_service import trending_books
 from app.core.database import SessionLocal
+from app.core.cache import cache_versions
 from datetime import datetime
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 from app.core.logging import get_logger
 
@@ -27,7 +33,31 @@ class ReviewService:
             comment=review_text,
             rating=rating,
         )
+        # Score the comment once here so read paths never have to run TextBlob
+        SentimentService().score_review(new_review)
         db.add(new_review)
         db.commit()
         db.refresh(new_review)
-        return new_review
\ No newline at end of file
+        CooccurrenceService().record_interaction(user_id, book_id, db)
+        PreferenceService().record_review(new_review, db)
+        trending_books.record_review(book_id, rating, db)
+        # Cached recommendations and review summaries of this user, and the book's
+        # cached analysis, are keyed on these versions
+        cache_versions.bump(f"user:{user_id}")
+        cache_versions.bump(f"book:{book_id}")
+        return new_review
+
+    def list_book_reviews(self, book_id: int, db: Session, after_id: Optional[int] = None,
+                          limit: int = 20) -> Tuple[List[ReviewModel], Optional[int]]:
+        """
+        Keyset page of a book's reviews in id order, served by the reviews(book_id, id)
+        index. Returns the page and the cursor for the next one (None on the last page).
+        """
+        query = db.query(ReviewModel).filter(ReviewModel.book_id == book_id)
+        if after_id is not None:
+            query = query.filter(ReviewModel.id > after_id)
+        # One extra row tells whether another page follows
+        rows = query.order_by(ReviewModel.id).limit(limit + 1).all()
+        page = rows[:limit]
+        next_after_id = page[-1].id if len(rows) > limit else None
+        return page, next_after_id
@@ -0,0 +1,60 @@
+from typing import Dict
+from textblob import TextBlob
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class SentimentService:
+    def __init__(self):
+        pass
+
+    def analyze_sentiment_textblob(self, text: str) -> Dict:
+        """
+        Analyze sentiment using TextBlob (lightweight, no ML model loading).
+        Returns sentiment label and polarity score.
+        Polarity ranges from -1 (negative) to 1 (positive).
+        """
+        if not text:
+            return {"label": "NEUTRAL", "score": 0.5, "polarity": 0.0}
+        
+        try:
+            blob = TextBlob(text)
+            polarity = blob.sentiment.polarity
+            
+            # Convert polarity to label and normalized score
+            if polarity > 0.1:
+                label = "POSITIVE"
+                score = (polarity + 1) / 2  # Normalize to 0.5-1.0
+            elif polarity < -0.1:
+                label = "NEGATIVE"
+                score = (polarity + 1) / 2  # Normalize to 0.0-0.5
+            else:
+                label = "NEUTRAL"
+                score = 0.5
+            
+            return {"label": label, "score": score, "polarity": polarity}
+        except Exception as e:
+            logger.error(f"Sentiment analysis error: {e}")
+            return {"label": "NEUTRAL", "score": 0.5, "polarity": 0.0}
+
+    def score_review(self, review) -> None:
+        """Compute the sentiment of a review comment and store it on the review row."""
+        sentiment = self.analyze_sentiment_textblob(review.comment or "")
+        review.sentiment_label = sentiment["label"]
+        review.sentiment_score = sentiment["score"]
+        review.sentiment_polarity = sentiment["polarity"]
+
+    def get_review_sentiment(self, review) -> Dict:
+        """
+        Return the stored sentiment of a review.
+        Rows written before sentiment was stored are scored on the fly until the backfill has run.
+        """
+        if review.sentiment_label is None:
+            return self.analyze_sentiment_textblob(review.comment or "")
+        return {
+            "label": review.sentiment_label,
+            "score": review.sentiment_score,
+            "polarity": review.sentiment_polarity,
+        }
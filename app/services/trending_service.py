@@ -0,0 +1,215 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.borrow import Borrow
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.logging import get_logger
+
+#logging configuration
+logger = get_logger(__name__)
+
+
+class TrendingLeaderboard:
+    """
+    Time-decayed popularity of books, updated on every borrow and review.
+
+    Decay uses growing increments instead of rescoring: an event at time t adds
+    weight * 2 ** ((t - epoch) / half_life), so comparing stored scores is the
+    same as comparing decayed scores at any later time and nothing has to be
+    touched when time passes. The epoch is moved forward (and every score
+    scaled down) before the increments get too large for a float.
+
+    Scores live in a Redis sorted set when `REDIS_URL` is configured, so reads
+    are a ZREVRANGE. Otherwise they live in this process, with the top
+    `top_size` books kept sorted; scores only grow, so a book can only enter
+    or rise in that list and it stays exact without rescanning.
+    """
+
+    KEY = "luminalib:trending:books"
+    EPOCH_KEY = "luminalib:trending:epoch"
+    # Largest exponent before the epoch is moved, 2 ** 256 is far from float overflow
+    MAX_EXPONENT = 256
+
+    def __init__(self, half_life_hours: float = settings.TRENDING_HALF_LIFE_HOURS,
+                 top_size: int = settings.TRENDING_TOP_SIZE,
+                 seed_days: int = settings.TRENDING_SEED_DAYS):
+        self.half_life_seconds = half_life_hours * 3600
+        self.top_size = top_size
+        self.seed_days = seed_days
+        self.lock = threading.Lock()
+        self.seed_lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop the in-process leaderboard (a Redis sorted set is left untouched)."""
+        with self.lock:
+            self.epoch = time.time()
+            self.scores = {}
+            self.top: List[Tuple[float, int]] = []
+            self.seeded = False
+
+    def _exponent(self, now: float, epoch: float) -> float:
+        return (now - epoch) / self.half_life_seconds
+
+    def record_event(self, book_id: int, weight: float, now: Optional[float] = None) -> None:
+        """Add a weighted borrow or review event for a book."""
+        if book_id is None or weight <= 0:
+            return
+        now = time.time() if now is None else now
+        client = get_redis()
+        if client is not None:
+            try:
+                epoch = self._redis_epoch(client, now)
+                if self._exponent(now, epoch) > self.MAX_EXPONENT:
+                    epoch = self._rescale_redis(client, now)
+                client.zincrby(self.KEY, weight * 2 ** self._exponent(now, epoch), book_id)
+                return
+            except Exception as e:
+                logger.error(f"Redis trending update failed for book {book_id}: {e}")
+        with self.lock:
+            if self._exponent(now, self.epoch) > self.MAX_EXPONENT:
+                self._rescale_local(now)
+            score = self.scores.get(book_id, 0.0) + weight * 2 ** self._exponent(now, self.epoch)
+            self.scores[book_id] = score
+            self._promote(book_id, score)
+
+    def record_borrow(self, book_id: int, db: Session) -> None:
+        """Record a committed borrow; a seed run right now already counts it."""
+        if not self.ensure_seeded(db):
+            self.record_event(book_id, settings.TRENDING_BORROW_WEIGHT)
+
+    def record_review(self, book_id: int, rating: int, db: Session) -> None:
+        """Reviews count in proportion to their rating, so a 5-star review counts fully."""
+        self.ensure_seeded(db)
+        self.record_event(book_id, settings.TRENDING_REVIEW_WEIGHT * rating / 5.0)
+
+    def _promote(self, book_id: int, score: float) -> None:
+        """Insert or move a book in the sorted top list after its score grew."""
+        top = [entry for entry in self.top if entry[1] != book_id]
+        if len(top) < self.top_size or score > top[-1][0]:
+            top.append((score, book_id))
+            top.sort(key=lambda entry: (-entry[0], entry[1]))
+            del top[self.top_size:]
+        self.top = top
+
+    def _rescale_local(self, now: float) -> None:
+        factor = 2 ** -self._exponent(now, self.epoch)
+        self.scores = {book_id: score * factor for book_id, score in self.scores.items()}
+        self.top = [(score * factor, book_id) for score, book_id in self.top]
+        self.epoch = now
+
+    def _redis_epoch(self, client, now: float) -> float:
+        client.setnx(self.EPOCH_KEY, now)
+        return float(client.get(self.EPOCH_KEY))
+
+    def _rescale_redis(self, client, now: float) -> float:
+        """Scale every score down and move the epoch to now, in one transaction."""
+        with client.pipeline() as pipe:
+            pipe.watch(self.EPOCH_KEY)
+            epoch = float(pipe.get(self.EPOCH_KEY))
+            if self._exponent(now, epoch) <= self.MAX_EXPONENT:
+                return epoch
+            pipe.multi()
+            pipe.zunionstore(self.KEY, {self.KEY: 2 ** -self._exponent(now, epoch)})
+            pipe.set(self.EPOCH_KEY, now)
+            pipe.execute()
+        return now
+
+    def top_books(self, limit: int, now: Optional[float] = None) -> List[Tuple[int, float]]:
+        """The `limit` most popular books as (book_id, decayed score), best first."""
+        if limit <= 0:
+            return []
+        now = time.time() if now is None else now
+        client = get_redis()
+        if client is not None:
+            try:
+                epoch = self._redis_epoch(client, now)
+                decay = 2 ** -self._exponent(now, epoch)
+                entries = client.zrevrange(self.KEY, 0, limit - 1, withscores=True)
+                return [(int(book_id), score * decay) for book_id, score in entries]
+            except Exception as e:
+                logger.error(f"Redis trending read failed: {e}")
+        with self.lock:
+            decay = 2 ** -self._exponent(now, self.epoch)
+            if limit > len(self.top) and len(self.scores) > len(self.top):
+                entries = heapq.nlargest(limit, ((score, book_id) for book_id, score in self.scores.items()),
+                                         key=lambda entry: (entry[0], -entry[1]))
+            else:
+                entries = self.top[:limit]
+            return [(book_id, score * decay) for score, book_id in entries]
+
+    def ensure_seeded(self, db: Session) -> bool:
+        """
+        Seed an empty leaderboard from recent borrows, once per process.
+        Returns True when this call ran the seed.
+        """
+        if self.seeded:
+            return False
+        with self.seed_lock:
+            if self.seeded:
+                return False
+            client = get_redis()
+            try:
+                empty = client.zcard(self.KEY) == 0 if client is not None else not self.scores
+            except Exception as e:
+                logger.error(f"Redis trending size check failed: {e}")
+                empty = not self.scores
+            try:
+                if empty:
+                    self.rebuild(db)
+            except Exception as e:
+                logger.error(f"Failed to seed trending leaderboard: {e}")
+                empty = False
+            self.seeded = True
+            return empty
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Recompute the leaderboard from borrows of the last `seed_days` days.
+        Reviews carry no timestamp, so they only enter through live events.
+        """
+        now = time.time()
+        current = datetime.utcnow()
+        since = current - timedelta(days=self.seed_days)
+        rows = (
+            db.query(Borrow.book_id, Borrow.borrowed_at)
+            .filter(Borrow.borrowed_at >= since, Borrow.book_id != None)
+            .all()
+        )
+        scores = {}
+        for book_id, borrowed_at in rows:
+            age = max(0.0, (current - borrowed_at).total_seconds())
+            scores[book_id] = scores.get(book_id, 0.0) + settings.TRENDING_BORROW_WEIGHT * 2 ** (-age / self.half_life_seconds)
+
+        client = get_redis()
+        if client is not None:
+            try:
+                # Build under a temporary key and swap it in, so concurrent seeds do not double count
+                tmp_key = f"{self.KEY}:rebuild:{threading.get_ident()}:{now}"
+                with client.pipeline() as pipe:
+                    if scores:
+                        pipe.zadd(tmp_key, scores)
+                        pipe.rename(tmp_key, self.KEY)
+                    else:
+                        pipe.delete(self.KEY)
+                    pipe.set(self.EPOCH_KEY, now)
+                    pipe.execute()
+                logger.info(f"Rebuilt trending leaderboard from {len(rows)} recent borrows")
+                return len(rows)
+            except Exception as e:
+                logger.error(f"Redis trending rebuild failed: {e}")
+        with self.lock:
+            self.epoch = now
+            self.scores = scores
+            self.top = sorted(((score, book_id) for book_id, score in scores.items()),
+                              key=lambda entry: (-entry[0], entry[1]))[:self.top_size]
+        logger.info(f"Rebuilt trending leaderboard from {len(rows)} recent borrows")
+        return len(rows)
+
+
+# Shared instance used by the API and the Celery worker
+trending_books = TrendingLeaderboard()
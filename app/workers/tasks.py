@@ -1,9 +1,20 @@
 from celery import Celery
 import asyncio
 # Import all models to ensure SQLAlchemy can resolve relationships
-from app.models import Book, Review, Borrow, User
+from app.models import Book, Review, Borrow, User, UserRecommendation, UserPreference
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from app.core.config import settings
+from app.core.deadline import Deadline
 from app.services.ai_service import AIService
+from app.services.book_index_service import book_index
+from app.services.sentiment_service import SentimentService
+from app.services.recommendation_service import RecommendationService
+from app.services.cooccurrence_service import CooccurrenceService
+from app.services.preference_service import PreferenceService
+from app.services.trending_service import trending_books
 from app.core.database import SessionLocal
+from app.core.cache import cache_versions
 from app.core.logging import get_logger
 
 #logging configuration
@@ -16,21 +27,195 @@ celery_app = Celery(
     backend="redis://redis:6379/0"
 )
 
+# Periodic jobs, run with `celery -A app.workers.tasks.celery_app beat`
+celery_app.conf.beat_schedule = {
+    "refresh-user-recommendations": {
+        "task": "app.workers.tasks.refresh_user_recommendations",
+        "schedule": settings.RECOMMENDATION_REFRESH_INTERVAL_SECONDS,
+    },
+}
+
 @celery_app.task
 def generate_summary(book_id: int, content: str):
     try:
         db = SessionLocal()
         # AIService.summarize is async, so we need to run it with asyncio
-        summary = asyncio.run(AIService().summarize(content))
+        deadline = Deadline.after(settings.LLM_DEADLINE_BACKGROUND_SECONDS)
+        summary = asyncio.run(AIService().summarize(content, deadline=deadline, map_reduce=True))
         if summary:
             logger.info(f"Generated summary for book {book_id}: {summary}")
             book = db.query(Book).filter(Book.id == book_id).first()
             if book:
                 book.summary = summary
                 db.commit()
+                book_index.refresh_books([book_id], db)
         else:
             logger.warning(f"Failed to generate summary for book {book_id}")
     except Exception as e:
         logger.error(f"Error generating summary for book {book_id}: {e}")
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@celery_app.task
+def update_book_index(book_ids: list):
+    """Persist uploaded, edited or deleted books in the book index, refitting it once the vocabulary is stale."""
+    db = SessionLocal()
+    try:
+        book_index.refresh_books(book_ids, db)
+    except Exception as e:
+        logger.error(f"Error updating book index for books {book_ids}: {e}")
+    finally:
+        db.close()
+
+@celery_app.task
+def backfill_review_sentiment(batch_size: int = 500):
+    """Score reviews that were written before sentiment was stored at write time."""
+    db = SessionLocal()
+    total = 0
+    try:
+        sentiment_service = SentimentService()
+        last_id = 0
+        while True:
+            reviews = (
+                db.query(Review)
+                .filter(Review.sentiment_label == None, Review.id > last_id)
+                .order_by(Review.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not reviews:
+                break
+            for review in reviews:
+                sentiment_service.score_review(review)
+            db.commit()
+            last_id = reviews[-1].id
+            total += len(reviews)
+        logger.info(f"Backfilled sentiment for {total} reviews")
+        return total
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error backfilling review sentiment after {total} reviews: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def backfill_user_preferences(batch_size: int = 500):
+    """Build the preference profiles of users who reviewed or borrowed books before profiles were maintained."""
+    db = SessionLocal()
+    total = 0
+    try:
+        preference_service = PreferenceService()
+        reviewers = db.query(Review.user_id)
+        borrowers = db.query(Borrow.user_id)
+        user_ids = sorted({user_id for (user_id,) in reviewers.union(borrowers)})
+        existing = {user_id for (user_id,) in db.query(UserPreference.user_id)}
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        for start in range(0, len(missing), batch_size):
+            for user_id in missing[start:start + batch_size]:
+                preference_service.rebuild_profile(user_id, db)
+            db.commit()
+            total += len(missing[start:start + batch_size])
+        logger.info(f"Backfilled preference profiles for {total} users")
+        return total
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error backfilling user preferences after {total} users: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def refresh_user_recommendations(batch_size: int = settings.RECOMMENDATION_REFRESH_BATCH_SIZE):
+    """
+    Recompute the stored top-N recommendations of active users.
+    Users with reviews newer than their stored row come first, then rows older than the staleness limit.
+    The newest review per user is read from the preference profiles, not aggregated over all reviews.
+    """
+    db = SessionLocal()
+    try:
+        dirty = (
+            db.query(UserPreference.user_id, UserPreference.last_review_id)
+            .outerjoin(UserRecommendation, UserRecommendation.user_id == UserPreference.user_id)
+            .filter(UserPreference.last_review_id > 0)
+            .filter(or_(
+                UserRecommendation.user_id == None,
+                UserRecommendation.last_review_id < UserPreference.last_review_id,
+            ))
+            .limit(batch_size)
+            .all()
+        )
+        last_review_ids = {user_id: last_review_id for user_id, last_review_id in dirty}
+
+        if len(last_review_ids) < batch_size:
+            stale_before = datetime.utcnow() - timedelta(seconds=settings.RECOMMENDATION_STALENESS_SECONDS)
+            stale = (
+                db.query(UserRecommendation.user_id, UserRecommendation.last_review_id)
+                .filter(UserRecommendation.computed_at < stale_before)
+                .order_by(UserRecommendation.computed_at)
+                .limit(batch_size - len(last_review_ids))
+                .all()
+            )
+            for user_id, last_review_id in stale:
+                last_review_ids.setdefault(user_id, last_review_id)
+
+        if not last_review_ids:
+            return 0
+
+        recommendation_service = RecommendationService(db)
+        catalog_version = cache_versions.get("catalog")
+        results = asyncio.run(recommendation_service.get_batch_recommendations(
+            list(last_review_ids), limit=settings.RECOMMENDATION_TOP_N
+        ))
+        for user_id, recommendations in results.items():
+            recommendation_service.store_recommendations(user_id, recommendations, last_review_ids[user_id], catalog_version)
+            cache_versions.bump(f"user:{user_id}")
+        logger.info(f"Refreshed stored recommendations for {len(results)} users")
+        return len(results)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error refreshing user recommendations: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def rebuild_book_cooccurrence():
+    """Recompute the item-item co-occurrence matrix from all borrows and reviews (initial load or repair)."""
+    db = SessionLocal()
+    try:
+        return CooccurrenceService().rebuild(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rebuilding book co-occurrence: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def rebuild_trending_books():
+    """Recompute the trending leaderboard from recent borrows (initial load or repair)."""
+    db = SessionLocal()
+    try:
+        return trending_books.rebuild(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rebuilding trending books: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def refresh_book_consensus(book_id: int):
+    """Fold every review newer than the book's consensus watermark, e.g. to catch up a book with many reviews."""
+    db = SessionLocal()
+    try:
+        deadline = Deadline.after(settings.LLM_DEADLINE_BACKGROUND_SECONDS)
+        analysis = asyncio.run(RecommendationService(db).get_book_reviews_analysis(book_id, max_consensus_batches=None,
+                                                                                   deadline=deadline))
+        return analysis.get("total_reviews", 0)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error refreshing review consensus for book {book_id}: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,98 @@
+"""
+Benchmark exact vs LSH candidate retrieval for book recommendations.
+
+Generates a synthetic TF-IDF-like catalog with topical structure, then
+compares recall@k and per-query latency of the exact path (score every
+book) against the LSH path (score only LSH candidates) for a few
+table/bit/probe settings.
+
+Usage:
+    python -m benchmarks.ann_benchmark --books 200000 --queries 200 --k 10
+"""
+import argparse
+import time
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from app.services.ann_index_service import LSHIndex
+
+
+def synthetic_catalog(num_books: int, vocab_size: int, num_topics: int, seed: int = 7):
+    """Sparse L2-normalised book vectors; most books follow one topic, some mix two."""
+    rng = np.random.default_rng(seed)
+    topic_terms = rng.integers(0, vocab_size, size=(num_topics, 25))
+    rows, cols, vals = [], [], []
+    for book in range(num_books):
+        topics = rng.choice(num_topics, size=1 if rng.random() < 0.75 else 2, replace=False)
+        terms = np.concatenate([rng.choice(topic_terms[t], size=15) for t in topics])
+        noise = rng.integers(0, vocab_size, size=5)
+        terms = np.concatenate([terms, noise])
+        rows.append(np.full(len(terms), book))
+        cols.append(terms)
+        vals.append(rng.random(len(terms)) + 0.5)
+    matrix = sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(num_books, vocab_size),
+    )
+    return normalize(matrix)
+
+
+def top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return rows
+    best = np.argpartition(-scores, k)[:k]
+    return rows[best]
+
+
+def exact_search(matrix, liked, k: int) -> np.ndarray:
+    scores = (matrix @ liked.T).max(axis=1).toarray().ravel()
+    return top_k(np.arange(matrix.shape[0]), scores, k)
+
+
+def lsh_search(index: LSHIndex, matrix, liked, k: int):
+    rows = index.query(liked)
+    if len(rows) == 0:
+        return rows, 0
+    scores = (matrix[rows] @ liked.T).max(axis=1).toarray().ravel()
+    return top_k(rows, scores, k), len(rows)
+
+
+def run(args) -> None:
+    print(f"Building catalog: {args.books} books, {args.vocab} terms, {args.topics} topics")
+    matrix = synthetic_catalog(args.books, args.vocab, args.topics)
+    rng = np.random.default_rng(11)
+    queries = [rng.choice(args.books, size=rng.integers(1, 4), replace=False) for _ in range(args.queries)]
+
+    exact_results, exact_times = [], []
+    for liked_rows in queries:
+        start = time.perf_counter()
+        exact_results.append(set(exact_search(matrix, matrix[liked_rows], args.k)))
+        exact_times.append(time.perf_counter() - start)
+    print(f"{'mode':<28}{'recall@' + str(args.k):>10}{'mean ms':>10}{'p95 ms':>10}{'candidates':>12}")
+    print(f"{'exact':<28}{1.0:>10.3f}{np.mean(exact_times) * 1000:>10.2f}{np.percentile(exact_times, 95) * 1000:>10.2f}{args.books:>12}")
+
+    for tables, bits, probes in [(8, 12, 2), (16, 10, 4), (16, 8, 2), (24, 8, 4), (32, 8, 4)]:
+        index = LSHIndex(num_tables=tables, num_bits=bits, probes=probes)
+        build_start = time.perf_counter()
+        index.build(matrix)
+        build_time = time.perf_counter() - build_start
+        recalls, times, candidates = [], [], []
+        for liked_rows, expected in zip(queries, exact_results):
+            start = time.perf_counter()
+            found, num_candidates = lsh_search(index, matrix, matrix[liked_rows], args.k)
+            times.append(time.perf_counter() - start)
+            recalls.append(len(expected & set(found)) / len(expected))
+            candidates.append(num_candidates)
+        label = f"lsh t={tables} b={bits} p={probes}"
+        print(f"{label:<28}{np.mean(recalls):>10.3f}{np.mean(times) * 1000:>10.2f}{np.percentile(times, 95) * 1000:>10.2f}{int(np.mean(candidates)):>12}"
+              f"   (build {build_time:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--vocab", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    run(parser.parse_args())
@@ -2,6 +2,7 @@
 Pytest configuration and fixtures for LuminaLib API tests.
 """
 import pytest
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -49,6 +50,62 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def isolated_book_index(tmp_path):
+    """Point the shared TF-IDF book index at a per-test directory."""
+    from app.services.book_index_service import book_index
+    book_index.index_dir = str(tmp_path / "index")
+    book_index.clear()
+    yield book_index
+    book_index.clear()
+
+
+@pytest.fixture(autouse=True)
+def book_index_task():
+    """Keep the book index Celery task from reaching the broker; tests call `refresh_books` directly."""
+    with patch('app.services.book_service.update_book_index') as mock_task:
+        yield mock_task
+
+
+@pytest.fixture(autouse=True)
+def consensus_refresh_task():
+    """Keep the consensus catch-up Celery task from reaching the broker."""
+    from app.services.recommendation_service import consensus_refresh_marks
+    consensus_refresh_marks.clear()
+    with patch('app.api.v1.books.refresh_book_consensus') as mock_task:
+        yield mock_task
+
+
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path):
+    """Point the on-disk LLM response cache at a per-test file."""
+    from app.services.ai_service import llm_response_cache
+    llm_response_cache.path = str(tmp_path / "llm_cache" / "llm_responses.sqlite3")
+    llm_response_cache.clear()
+    yield llm_response_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches():
+    """Start every test with empty result caches, version counters, trending leaderboard, a full LLM rate limit and closed circuits."""
+    from app.core.cache import cache_versions
+    from app.services.recommendation_service import recommendation_cache, review_summary_cache, book_analysis_cache
+    from app.services.trending_service import trending_books
+    from app.services.ai_service import llm_rate_limiter, llm_router
+    llm_rate_limiter.clear()
+    llm_router.reset()
+    caches = (recommendation_cache, review_summary_cache, book_analysis_cache)
+    for cache in caches:
+        cache.clear()
+    cache_versions.clear()
+    trending_books.clear()
+    yield
+    for cache in caches:
+        cache.clear()
+    cache_versions.clear()
+    trending_books.clear()
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Create a test client with database override."""
@@ -0,0 +1,772 @@
+"""
+Test cases for the LLM client layer.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Custom-backend stub that answers after a fixed delay, prefixing answers with its tag."""
+    delay = 0.5
+    status = 200
+    tag = ""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.delay)
+        payload = json.dumps({"response": f"{self.tag}echo: {body['message'][-5:]}"}).encode()
+        self.send_response(self.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_llm_server():
+    """Factory starting stub backends: stub_llm_server(delay, status, tag) returns the endpoint URL."""
+    servers = []
+    
+    def start(delay=0.5, status=200, tag=""):
+        handler = type("Handler", (StubLLMHandler,), {"delay": delay, "status": status, "tag": tag})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/api/v1/chat"
+    
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def stub_llm_url(stub_llm_server):
+    return stub_llm_server()
+
+
+class TestCustomLLMBackend:
+    """Test cases for the pooled async client of the custom HTTP backend."""
+    
+    async def test_llm_call_does_not_block_event_loop(self, stub_llm_url):
+        """Test that other coroutines keep running and concurrent calls overlap while the backend is slow."""
+        from unittest.mock import patch
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        from app.services.llm_router import LLMRouter
+        
+        ticks = 0
+        
+        async def heartbeat(stop):
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+        
+        with patch('app.services.ai_service.llm_router', LLMRouter([CustomHTTPBackend(stub_llm_url)])):
+            stop = asyncio.Event()
+            beat = asyncio.create_task(heartbeat(stop))
+            started = time.perf_counter()
+            answers = await asyncio.gather(*(LLMAgent(system_prompt="sys").generate_answer(f"q{i:04d}") for i in range(5)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await beat
+            await close_http_client()
+        
+        assert answers == [f"echo: q{i:04d}" for i in range(5)]
+        # Five 0.5s calls in flight together, not one after another
+        assert elapsed < 5 * StubLLMHandler.delay
+        # The loop kept serving other work during the calls
+        assert ticks >= 10
+    
+    async def test_failed_call_retries_without_sleeping_the_loop(self):
+        """Test that a failing backend returns None after the awaited retry delay."""
+        from unittest.mock import patch
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        from app.services.llm_router import LLMRouter
+        
+        with patch('app.services.ai_service.llm_router', LLMRouter([CustomHTTPBackend("http://127.0.0.1:9/unreachable")])), \
+                patch('app.services.ai_service.settings.LLM_BACKOFF_BASE_SECONDS', 0.01):
+            assert await LLMAgent(system_prompt="sys").generate_answer("hello") is None
+            await close_http_client()
+
+
+class TestMapReduceSummary:
+    """Test cases for chunked summarization of long texts."""
+    
+    def test_split_text_respects_chunk_budget(self):
+        """Test that chunks stay within the token budget and keep all the text."""
+        from app.services.ai_service import AIService
+        service = AIService(chunk_tokens=50)
+        text = "\n\n".join(f"Paragraph {i}. " + "word " * (30 + i * 7) for i in range(10))
+        
+        chunks = service.split_text(text)
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 50 * service.CHARS_PER_TOKEN for chunk in chunks)
+        assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+    
+    async def test_long_text_is_mapped_concurrently_and_reduced(self, caplog):
+        """Test that chunk calls respect the concurrency limit and partials are reduced hierarchically."""
+        import logging
+        from unittest.mock import patch
+        from app.services.ai_service import AIService, LLMAgent
+        
+        in_flight, peak, prompts = 0, 0, []
+        
+        async def fake_generate_answer(agent, user_query, hedge=False, deadline=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            prompts.append(agent.system_prompt)
+            return "reduced" if "sequence of summaries" in agent.system_prompt else "partial"
+        
+        service = AIService(chunk_tokens=20, max_concurrency=3, reduce_fanin=4)
+        text = "\n\n".join(f"Section {i} " + "text " * 10 for i in range(10))
+        with patch.object(LLMAgent, "generate_answer", fake_generate_answer), caplog.at_level(logging.INFO):
+            assert await service.summarize(text, map_reduce=True) == "reduced"
+        
+        chunk_calls = [p for p in prompts if "one section of a longer document" in p]
+        reduce_calls = [p for p in prompts if "sequence of summaries" in p]
+        assert len(chunk_calls) == len(service.split_text(text)) == 10
+        # 10 partials -> 3 groups -> 1 summary
+        assert len(reduce_calls) == 4
+        assert peak == 3
+        assert "split" in caplog.text and "map" in caplog.text and "reduce" in caplog.text
+    
+    async def test_short_text_is_summarized_in_one_call(self):
+        """Test that text within one chunk keeps the single-call path."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import AIService, LLMAgent
+        with patch.object(LLMAgent, "generate_answer", new_callable=AsyncMock, return_value="summary") as mock_answer:
+            assert await AIService(chunk_tokens=100).summarize("A short text.") == "summary"
+        assert mock_answer.call_count == 1
+    
+    async def test_instruction_prompts_are_never_chunked(self):
+        """Test that a long prompt with its own instructions stays one call unless map-reduce is asked for."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import AIService, LLMAgent
+        prompt = "Summarize these reviews.\n\n" + "\n\n".join("- Rating: 5/5, Comment: " + "great " * 20 for _ in range(20))
+        with patch.object(LLMAgent, "generate_answer", new_callable=AsyncMock, return_value="summary") as mock_answer:
+            assert await AIService(chunk_tokens=20).summarize(prompt, hedge=True) == "summary"
+        mock_answer.assert_called_once_with(prompt, hedge=True, deadline=None)
+    
+    async def test_failed_reduce_gives_no_summary(self):
+        """Test that map-reduce returns None, not the joined partials, when every reduce call fails."""
+        from unittest.mock import patch
+        from app.services.ai_service import AIService, LLMAgent
+        
+        async def fake_generate_answer(agent, user_query, hedge=False, deadline=None):
+            return None if "sequence of summaries" in agent.system_prompt else "partial"
+        
+        text = "\n\n".join(f"Section {i} " + "text " * 10 for i in range(6))
+        with patch.object(LLMAgent, "generate_answer", fake_generate_answer):
+            assert await AIService(chunk_tokens=20).summarize(text, map_reduce=True) is None
+
+
+class TestLLMResponseCache:
+    """Test cases for the content-addressed LLM response cache."""
+    
+    async def test_identical_prompts_are_served_from_cache(self, isolated_llm_cache):
+        """Test that a repeated prompt skips the backend and different prompts do not collide."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        
+        with patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock, return_value="answer") as mock_call:
+            assert await LLMAgent(system_prompt="Summarize: book").generate_answer("") == "answer"
+            assert await LLMAgent(system_prompt="Summarize: book").generate_answer("") == "answer"
+            assert mock_call.call_count == 1
+            
+            await LLMAgent(system_prompt="Summarize: other book").generate_answer("")
+            assert mock_call.call_count == 2
+        
+        info = isolated_llm_cache.info()
+        assert info["backend"] == "disk" and info["size"] == 2
+        assert info["hits"] == 1 and info["misses"] == 2
+    
+    async def test_failed_answers_are_not_cached(self):
+        """Test that a backend failure is retried on the next call."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        
+        with patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock, return_value=None) as mock_call:
+            assert await LLMAgent(system_prompt="Summarize").generate_answer("") is None
+            assert await LLMAgent(system_prompt="Summarize").generate_answer("") is None
+        assert mock_call.call_count == 2
+    
+    def test_disk_cache_evicts_least_recently_used_and_expires(self, tmp_path):
+        """Test the size bound and the TTL of the SQLite-backed cache."""
+        from unittest.mock import patch
+        from app.core.cache import DiskCache
+        cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_size=2, ttl_seconds=60)
+        
+        with patch('app.core.cache.time.time', return_value=1000.0):
+            cache.set("a", "1")
+        with patch('app.core.cache.time.time', return_value=1001.0):
+            cache.set("b", "2")
+        with patch('app.core.cache.time.time', return_value=1002.0):
+            assert cache.get("a") == "1"
+        with patch('app.core.cache.time.time', return_value=1003.0):
+            cache.set("c", "3")
+            assert cache.get("b") is None
+            assert cache.get("a") == "1" and cache.get("c") == "3"
+        with patch('app.core.cache.time.time', return_value=1100.0):
+            assert cache.get("a") is None
+    
+    async def test_disk_cache_keeps_one_connection_and_evicts_in_batches(self, tmp_path):
+        """Test that the SQLite connection is opened once and eviction runs every max_size // 100 writes."""
+        import sqlite3
+        from unittest.mock import patch
+        from app.core.cache import DiskCache
+        cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_size=500)
+        
+        with patch('app.core.cache.sqlite3.connect', wraps=sqlite3.connect) as mock_connect:
+            for i in range(504):
+                await cache.aset(f"key {i}", i)
+            # 504 writes, eviction after every 5th: the last batch ran at 500, nothing to evict yet
+            assert cache.size() == 504
+            await cache.aset("key 504", 504)
+            assert await cache.aget("key 504") == 504
+        assert cache.size() == 500
+        assert await cache.aget("key 0") is None
+        assert mock_connect.call_count == 1
+    
+    def test_redis_cache_bounds_entry_count(self):
+        """Test that the Redis cache evicts its least recently used keys above max_size."""
+        from app.core.cache import RedisCache
+        
+        class FakeRedis:
+            """Just enough of a Redis client for the cache and its access index."""
+            
+            def __init__(self):
+                self.values, self.zsets = {}, {}
+            
+            def pipeline(self, transaction=True):
+                client = self
+                
+                class Pipeline:
+                    def __init__(self):
+                        self.calls = []
+                    
+                    def __enter__(self):
+                        return self
+                    
+                    def __exit__(self, *args):
+                        return False
+                    
+                    def __getattr__(self, name):
+                        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+                    
+                    def execute(self):
+                        return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+                
+                return Pipeline()
+            
+            def get(self, key):
+                return self.values.get(key)
+            
+            def set(self, key, value, ex=None):
+                self.values[key] = value
+            
+            def delete(self, *keys):
+                for key in keys:
+                    self.values.pop(key, None)
+            
+            def zadd(self, key, mapping, xx=False):
+                zset = self.zsets.setdefault(key, {})
+                for member, score in mapping.items():
+                    if not xx or member in zset:
+                        zset[member] = score
+            
+            def zcard(self, key):
+                return len(self.zsets.get(key, {}))
+            
+            def zrange(self, key, start, end):
+                return sorted(self.zsets.get(key, {}), key=self.zsets[key].get)[start:end + 1]
+            
+            def zrem(self, key, *members):
+                for member in members:
+                    self.zsets.get(key, {}).pop(member, None)
+            
+            def zremrangebyscore(self, key, low, high):
+                zset = self.zsets.get(key, {})
+                for member in [m for m, score in zset.items() if low <= score <= high]:
+                    del zset[member]
+        
+        client = FakeRedis()
+        cache = RedisCache(client, "test", ttl_seconds=60, max_size=3)
+        for key in "abc":
+            cache.set(key, key)
+        assert cache.get("a") == "a"
+        cache.set("d", "d")
+        assert cache.get("b") is None
+        assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+
+
+class TestLLMRateLimiter:
+    """Test cases for the shared request and token budget of LLM calls."""
+    
+    def test_request_and_token_buckets(self):
+        """Test that both buckets are enforced and refill at their rate."""
+        from app.core.rate_limit import TokenBucketLimiter
+        limiter = TokenBucketLimiter("test", requests_per_second=2, tokens_per_minute=600)
+        
+        assert limiter.try_acquire(100, now=0.0) == 0
+        assert limiter.try_acquire(100, now=0.0) == 0
+        # Out of requests: the next one is free after half a second
+        assert limiter.try_acquire(100, now=0.0) == pytest.approx(0.5)
+        # 400 tokens left and 10 tokens/s refill; 500 tokens need another 10s
+        assert limiter.try_acquire(500, now=1.0) == pytest.approx(9.0)
+        assert limiter.try_acquire(500, now=10.0) == 0
+        # A call over the whole minute budget is clamped instead of waiting forever
+        assert limiter.try_acquire(10**6, now=70.0) == 0
+    
+    def test_disabled_limiter_never_waits(self):
+        """Test that zero rates disable limiting."""
+        from app.core.rate_limit import TokenBucketLimiter
+        limiter = TokenBucketLimiter("test", requests_per_second=0, tokens_per_minute=0)
+        assert all(limiter.try_acquire(10**6, now=0.0) == 0 for _ in range(100))
+    
+    async def test_generate_answer_waits_for_budget(self):
+        """Test that bursts above the request rate are spread out instead of failing."""
+        from unittest.mock import patch, AsyncMock
+        from app.core.rate_limit import TokenBucketLimiter
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        
+        limiter = TokenBucketLimiter("test", requests_per_second=20, tokens_per_minute=0)
+        with patch('app.services.ai_service.llm_rate_limiter', limiter), \
+                patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock, return_value="ok") as mock_call:
+            started = time.perf_counter()
+            answers = await asyncio.gather(*(LLMAgent(system_prompt=f"prompt {i}").generate_answer("") for i in range(25)))
+            elapsed = time.perf_counter() - started
+        
+        assert answers == ["ok"] * 25 and mock_call.call_count == 25
+        # 20 calls fit the burst, the other 5 need a quarter of a second of refill
+        assert elapsed >= 0.2
+
+
+class TestLLMRetriesAndCircuitBreaker:
+    """Test cases for backoff and fail-fast behaviour when a backend is down."""
+    
+    def test_backoff_is_exponential_with_jitter(self):
+        """Test that the backoff ceiling doubles per attempt up to the maximum."""
+        from unittest.mock import patch
+        from app.core.resilience import backoff_delay
+        with patch('app.core.resilience.random.uniform', side_effect=lambda low, high: high):
+            assert [backoff_delay(attempt, 0.5, 3.0) for attempt in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+        assert all(0 <= backoff_delay(3, 0.5, 3.0) <= 3.0 for _ in range(100))
+    
+    def test_circuit_opens_and_lets_one_trial_through(self):
+        """Test the closed -> open -> half-open -> closed cycle."""
+        from app.core.resilience import CircuitBreaker
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+        
+        breaker.record_failure(now=0.0)
+        assert breaker.allow(now=0.0)
+        breaker.record_failure(now=1.0)
+        assert not breaker.allow(now=5.0)
+        # After the reset period exactly one trial call goes through
+        assert breaker.allow(now=11.0)
+        assert not breaker.allow(now=11.0)
+        breaker.record_failure(now=12.0)
+        assert not breaker.allow(now=15.0)
+        assert breaker.allow(now=22.0)
+        breaker.record_success()
+        assert breaker.allow(now=22.0) and breaker.allow(now=22.0)
+    
+    async def test_open_circuit_fails_fast(self):
+        """Test that once the circuit opens no call is attempted and None comes back at once."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent, LLMBackendError, llm_router
+        
+        with patch('app.services.ai_service.settings.LLM_MAX_RETRIES', 2), \
+                patch('app.services.ai_service.settings.LLM_BACKOFF_BASE_SECONDS', 0.001), \
+                patch('app.services.llm_router.settings.LLM_CIRCUIT_FAILURE_THRESHOLD', 3), \
+                patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock, side_effect=LLMBackendError("down")) as mock_call:
+            llm_router.reset()
+            assert await LLMAgent(system_prompt="first").generate_answer("") is None
+            assert mock_call.call_count == 3
+            
+            started = time.perf_counter()
+            assert await LLMAgent(system_prompt="second").generate_answer("") is None
+            assert time.perf_counter() - started < 0.05
+            assert mock_call.call_count == 3
+    
+    async def test_client_errors_are_not_retried(self):
+        """Test that a non-retryable error returns after one attempt and leaves the circuit closed."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent, LLMBackendError, llm_router
+        
+        with patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock,
+                          side_effect=LLMBackendError("bad request", retryable=False)) as mock_call:
+            assert await LLMAgent(system_prompt="prompt").generate_answer("") is None
+            assert mock_call.call_count == 1
+            assert all(breaker.failures == 0 for breaker in llm_router.breakers.values())
+    
+    async def test_analysis_falls_back_when_circuit_is_open(self, db_session, test_review):
+        """Test that the analysis endpoint serves the fallback summary without waiting on the backend."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, llm_router
+        from app.services.recommendation_service import RecommendationService
+        
+        with patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock) as mock_call:
+            breaker = llm_router.breakers[llm_router.backends[0].name]
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+            started = time.perf_counter()
+            analysis = await RecommendationService(db_session).get_book_reviews_analysis(test_review.book_id)
+            elapsed = time.perf_counter() - started
+        
+        mock_call.assert_not_called()
+        assert analysis["summary"] and analysis["total_reviews"] == 1
+        assert elapsed < 1.0
+
+
+
+class TestRequestDeadlines:
+    """Test cases for LLM calls bounded by the request's deadline."""
+    
+    async def test_slow_call_is_cut_off_at_deadline(self):
+        """Test that a call still running when the deadline passes is cancelled and returns None."""
+        from unittest.mock import patch
+        from app.core.deadline import Deadline
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        
+        async def slow_call(backend, system_prompt, query):
+            await asyncio.sleep(5)
+            return "too late"
+        
+        with patch.object(CustomHTTPBackend, "call", slow_call):
+            started = time.perf_counter()
+            answer = await LLMAgent(system_prompt="prompt").generate_answer("", deadline=Deadline.after(0.2))
+            elapsed = time.perf_counter() - started
+        
+        assert answer is None
+        assert elapsed < 1.0
+    
+    async def test_no_retry_without_budget_for_backoff(self):
+        """Test that a failed call is not retried when the backoff would outlast the deadline."""
+        from unittest.mock import patch, AsyncMock
+        from app.core.deadline import Deadline
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent, LLMBackendError
+        
+        with patch('app.services.ai_service.backoff_delay', return_value=5.0), \
+                patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock,
+                             side_effect=LLMBackendError("unavailable", retryable=True)) as mock_call:
+            started = time.perf_counter()
+            answer = await LLMAgent(system_prompt="prompt").generate_answer("", deadline=Deadline.after(1.0))
+            elapsed = time.perf_counter() - started
+        
+        assert answer is None and mock_call.call_count == 1
+        assert elapsed < 0.5
+    
+    async def test_rate_limiter_gives_up_past_budget(self):
+        """Test that a wait for rate budget longer than the remaining deadline is not started."""
+        from app.core.rate_limit import TokenBucketLimiter
+        
+        limiter = TokenBucketLimiter("test", requests_per_second=1, tokens_per_minute=0)
+        assert await limiter.acquire(max_wait=0.1)
+        started = time.perf_counter()
+        assert not await limiter.acquire(max_wait=0.1)
+        assert time.perf_counter() - started < 0.1
+    
+    def test_analysis_endpoint_serves_fallback_at_deadline(self, client, auth_headers, test_review):
+        """Test that the analysis endpoint answers with the fallback summary when its deadline runs out."""
+        from unittest.mock import patch
+        from app.services.ai_service import CustomHTTPBackend
+        
+        async def slow_call(backend, system_prompt, query):
+            await asyncio.sleep(5)
+            return "too late"
+        
+        with patch('app.api.v1.books.settings.LLM_DEADLINE_ANALYSIS_SECONDS', 0.2), \
+                patch.object(CustomHTTPBackend, "call", slow_call):
+            started = time.perf_counter()
+            response = client.get(f"/api/books/{test_review.book_id}/analysis", headers=auth_headers)
+            elapsed = time.perf_counter() - started
+        
+        assert response.status_code == 200
+        assert "has received 1 review(s)" in response.json()["summary"]
+        assert elapsed < 1.5
+    
+    def test_deadline_is_optional(self):
+        """Test that a zero or missing budget means no deadline."""
+        from app.core.deadline import Deadline
+        
+        assert Deadline.after(0) is None and Deadline.after(None) is None
+        deadline = Deadline.after(60)
+        assert not deadline.expired and 0 < deadline.remaining() <= 60
+
+class TestLLMRouter:
+    """Test cases for routing, failover and hedging over local stub backends."""
+    
+    async def test_routes_to_fastest_backend(self, stub_llm_server):
+        """Test that once both backends are measured most calls go to the faster one."""
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import CustomHTTPBackend
+        from app.services.llm_router import LLMRouter
+        slow = CustomHTTPBackend(stub_llm_server(delay=0.15, tag="slow "))
+        fast = CustomHTTPBackend(stub_llm_server(delay=0.01, tag="fast "))
+        router = LLMRouter([slow, fast], explore_rate=0.0)
+        
+        answers = [await router.call("sys", f"q{i:04d}") for i in range(6)]
+        await close_http_client()
+        
+        # The first two calls measure each backend, the rest stick to the fast one
+        assert answers[0].startswith("slow ") and answers[1].startswith("fast ")
+        assert all(answer.startswith("fast ") for answer in answers[2:])
+        stats = router.info()
+        assert stats[fast.name]["calls"] == 5 and stats[slow.name]["calls"] == 1
+        assert stats[fast.name]["mean_latency"] < stats[slow.name]["mean_latency"]
+    
+    async def test_fails_over_to_healthy_backend(self, stub_llm_server):
+        """Test that an erroring backend is skipped within the same call and ranked last afterwards."""
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import CustomHTTPBackend
+        from app.services.llm_router import LLMRouter
+        broken = CustomHTTPBackend(stub_llm_server(delay=0.0, status=503, tag="broken "))
+        healthy = CustomHTTPBackend(stub_llm_server(delay=0.05, tag="healthy "))
+        router = LLMRouter([broken, healthy], explore_rate=0.0)
+        
+        assert (await router.call("sys", "q0001")).startswith("healthy ")
+        assert (await router.call("sys", "q0002")).startswith("healthy ")
+        await close_http_client()
+        
+        stats = router.info()
+        assert stats[broken.name]["calls"] == 1 and stats[broken.name]["error_rate"] == 1.0
+        assert stats[healthy.name]["calls"] == 2 and stats[healthy.name]["error_rate"] == 0.0
+    
+    async def test_hedged_call_races_second_backend(self, stub_llm_server):
+        """Test that a slow primary is hedged after the hedge delay and the faster answer wins."""
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import CustomHTTPBackend
+        from app.services.llm_router import LLMRouter
+        stalled = CustomHTTPBackend(stub_llm_server(delay=1.0, tag="stalled "))
+        backup = CustomHTTPBackend(stub_llm_server(delay=0.05, tag="backup "))
+        router = LLMRouter([stalled, backup], explore_rate=0.0, hedge_delay_seconds=0.1)
+        
+        started = time.perf_counter()
+        answer = await router.call("sys", "q0001", hedge=True)
+        elapsed = time.perf_counter() - started
+        await close_http_client()
+        
+        assert answer.startswith("backup ")
+        assert elapsed < 0.5
+        # The abandoned request is not counted as a sample of the stalled backend
+        assert router.info()[stalled.name]["calls"] == 0
+    
+    async def test_unhedged_call_waits_for_primary(self, stub_llm_server):
+        """Test that hedging is opt-in per call."""
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import CustomHTTPBackend
+        from app.services.llm_router import LLMRouter
+        primary = CustomHTTPBackend(stub_llm_server(delay=0.2, tag="primary "))
+        backup = CustomHTTPBackend(stub_llm_server(delay=0.01, tag="backup "))
+        router = LLMRouter([primary, backup], explore_rate=0.0, hedge_delay_seconds=0.05)
+        
+        assert (await router.call("sys", "q0001")).startswith("primary ")
+        await close_http_client()
+        assert router.info()[backup.name]["calls"] == 0
+
+    
+    def test_backends_from_spec(self):
+        """Test parsing of the LLM_BACKENDS setting."""
+        from app.services.ai_service import build_llm_backends
+        backends = build_llm_backends("openai, custom, http://localhost:9000/chat")
+        assert [backend.name for backend in backends] == [
+            "openai", "custom:https://apifreellm.com/api/v1/chat", "custom:http://localhost:9000/chat"
+        ]
+
+
+class TestSharedAgents:
+    """Test cases for long-lived, concurrency-safe agents per backend."""
+    
+    async def test_backend_reuses_one_agent_for_concurrent_calls(self):
+        """Test that the agent is built once and each concurrent call keeps its own instructions."""
+        from unittest.mock import patch
+        from pydantic_ai.messages import ModelResponse, TextPart
+        from pydantic_ai.models.function import FunctionModel
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import PydanticAIBackend
+        
+        async def respond(messages, info):
+            await asyncio.sleep(0.01)
+            request = messages[-1]
+            return ModelResponse(parts=[TextPart(f"{request.instructions}|{request.parts[-1].content}")])
+        
+        backend = PydanticAIBackend("openai")
+        with patch.object(PydanticAIBackend, "_model", return_value=FunctionModel(respond)) as mock_model:
+            answers = await asyncio.gather(*(backend.call(f"prompt {i}", f"text {i}") for i in range(5)))
+            await backend.call("prompt 5", "text 5")
+            await close_http_client()
+        
+        assert answers == [f"prompt {i}|text {i}" for i in range(5)]
+        assert mock_model.call_count == 1
+    
+    async def test_summarize_sends_text_as_user_message(self):
+        """Test that the document goes in the user message under a fixed system prompt."""
+        from unittest.mock import patch
+        from app.services.ai_service import AIService, LLMAgent
+        calls = []
+        
+        async def fake_generate_answer(agent, user_query, hedge=False, deadline=None):
+            calls.append((agent.system_prompt, user_query))
+            return "summary"
+        
+        service = AIService()
+        with patch.object(LLMAgent, "generate_answer", fake_generate_answer):
+            await service.summarize("First book.")
+            await service.summarize("Second book.")
+        
+        assert calls == [(AIService.SUMMARY_PROMPT, "First book."), (AIService.SUMMARY_PROMPT, "Second book.")]
+
+
+def parse_sse(body: str):
+    """(event, data) pairs of a text/event-stream body."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestStreamedSummaries:
+    """Test cases for summaries streamed as server-sent events."""
+    
+    def test_text_pieces_cover_the_text(self):
+        """Test that the chunked fallback cuts after spaces and loses nothing."""
+        from app.services.ai_service import text_pieces
+        
+        text = "Readers love the pacing of this book and the twist at the end."
+        pieces = list(text_pieces(text, 10))
+        assert "".join(pieces) == text and len(pieces) > 3
+        assert all(piece.endswith(" ") for piece in pieces[:-1])
+    
+    async def test_pydantic_ai_backend_streams_deltas(self):
+        """Test that the OpenAI-style backend forwards the model's streamed text as it arrives."""
+        from unittest.mock import patch
+        from pydantic_ai.models.function import FunctionModel
+        from app.core.http_client import close_http_client
+        from app.services.ai_service import PydanticAIBackend
+        
+        async def stream_respond(messages, info):
+            for word in ["Readers ", "love ", "it."]:
+                yield word
+        
+        backend = PydanticAIBackend("openai")
+        with patch.object(PydanticAIBackend, "_model", return_value=FunctionModel(stream_function=stream_respond)):
+            pieces = [piece async for piece in backend.stream("prompt", "text")]
+            await close_http_client()
+        
+        assert "".join(pieces) == "Readers love it."
+        assert len(pieces) > 1
+    
+    async def test_stream_fails_over_before_first_piece(self):
+        """Test that a backend failing before it streams anything is replaced by the next one."""
+        from app.services.llm_router import LLMBackendError, LLMRouter
+        
+        class FailingBackend:
+            name = "failing"
+            
+            async def stream(self, system_prompt, query):
+                raise LLMBackendError("unavailable")
+                yield
+        
+        class WorkingBackend:
+            name = "working"
+            
+            async def stream(self, system_prompt, query):
+                for piece in ["a ", "b"]:
+                    yield piece
+        
+        router = LLMRouter([FailingBackend(), WorkingBackend()], explore_rate=0)
+        assert [piece async for piece in router.stream("prompt", "query")] == ["a ", "b"]
+        assert router.stats["failing"].error_rate() == 1.0
+        assert router.stats["working"].error_rate() == 0.0
+    
+    async def test_streamed_answer_is_cached(self):
+        """Test that a completed stream is cached and replayed whole on the next request."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, LLMAgent
+        
+        answer = "Readers praise the characters and the pacing of the second half."
+        with patch('app.services.ai_service.settings.LLM_STREAM_CHUNK_CHARS', 8), \
+                patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock, return_value=answer) as mock_call:
+            agent = LLMAgent(system_prompt="prompt")
+            first = [piece async for piece in agent.stream_answer("reviews")]
+            second = [piece async for piece in agent.stream_answer("reviews")]
+        
+        assert "".join(first) == answer and len(first) > 1
+        assert second == [answer]
+        assert mock_call.call_count == 1
+    
+    async def test_stats_are_sent_before_the_llm_answers(self, db_session, test_review):
+        """Test that the first event goes out at once, while the LLM is still working."""
+        from unittest.mock import patch
+        from app.services.ai_service import CustomHTTPBackend
+        from app.services.recommendation_service import RecommendationService
+        
+        async def slow_call(backend, system_prompt, query):
+            await asyncio.sleep(0.5)
+            return "Readers enjoyed it."
+        
+        with patch.object(CustomHTTPBackend, "call", slow_call):
+            started = time.perf_counter()
+            events = RecommendationService(db_session).stream_book_reviews_analysis(test_review.book_id)
+            event, stats = await events.__anext__()
+            first_event_seconds = time.perf_counter() - started
+            rest = [item async for item in events]
+        
+        assert event == "stats" and stats["total_reviews"] == 1 and "summary" not in stats
+        assert first_event_seconds < 0.2
+        assert rest[-1][0] == "done" and rest[-1][1]["summary"] == "Readers enjoyed it."
+    
+    def test_analysis_stream_endpoint(self, client, auth_headers, test_review):
+        """Test the analysis event stream and that the streamed summary becomes the stored consensus."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend
+        
+        answer = "Readers found the story moving and well paced."
+        with patch('app.services.ai_service.settings.LLM_STREAM_CHUNK_CHARS', 8), \
+                patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock, return_value=answer):
+            response = client.get(f"/api/books/{test_review.book_id}/analysis/stream", headers=auth_headers)
+            events = parse_sse(response.text)
+            # The completed analysis is cached, the next request replays it
+            cached = client.get(f"/api/books/{test_review.book_id}/analysis", headers=auth_headers).json()
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert events[0][0] == "stats" and events[-1][0] == "done"
+        deltas = [data["delta"] for event, data in events if event == "summary"]
+        assert len(deltas) > 1 and "".join(deltas) == answer
+        assert events[-1][1]["summary"] == answer and cached["summary"] == answer
+    
+    def test_analysis_stream_unknown_book(self, client, auth_headers):
+        """Test that streaming the analysis of a missing book is a 404, not an event stream."""
+        response = client.get("/api/books/99999/analysis/stream", headers=auth_headers)
+        assert response.status_code == 404
+    
+    def test_summary_stream_falls_back_when_llm_fails(self, client, auth_headers, test_review):
+        """Test that the final event carries the fallback summary when the LLM gives no answer."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.ai_service import CustomHTTPBackend, LLMBackendError
+        
+        with patch.object(CustomHTTPBackend, "call", new_callable=AsyncMock,
+                          side_effect=LLMBackendError("bad request", retryable=False)):
+            response = client.get(f"/recommendations/reviews/summary/stream?user_id={test_review.user_id}",
+                                  headers=auth_headers)
+        
+        events = parse_sse(response.text)
+        assert [event for event, _ in events] == ["stats", "done"]
+        assert events[0][1]["total_reviews"] == 1
+        assert events[-1][1]["summary"]
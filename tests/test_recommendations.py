@@ -2,6 +2,7 @@
 Test cases for Recommendations API endpoints.
 """
 import pytest
+import numpy as np
 from fastapi import status
 from unittest.mock import patch, AsyncMock
 
@@ -170,3 +171,773 @@ class TestRecommendationResponse:
             assert response.status_code == status.HTTP_200_OK
             data = response.json()
             assert data == []
+
+
+class TestBookIndex:
+    """Test cases for the persistent TF-IDF book index."""
+    
+    def _add_books(self, db_session):
+        from app.models.book import Book
+        books = [
+            Book(title="Dragons of the North", author="A. Writer", description="Epic fantasy with dragons and magic", file_path="/tmp/a.pdf"),
+            Book(title="Dragon Riders", author="B. Writer", description="Fantasy adventure with dragons", file_path="/tmp/b.pdf"),
+            Book(title="Cooking Basics", author="C. Chef", description="Recipes for the home kitchen", file_path="/tmp/c.pdf"),
+        ]
+        db_session.add_all(books)
+        db_session.commit()
+        return books
+    
+    def test_index_persists_and_reloads(self, db_session, isolated_book_index):
+        """Test that a built index can be loaded from disk by a fresh instance."""
+        from app.services.book_index_service import BookIndexService
+        books = self._add_books(db_session)
+        isolated_book_index.build(db_session)
+        
+        reloaded = BookIndexService(index_dir=isolated_book_index.index_dir)
+        assert reloaded.load()
+        assert reloaded.size == len(books)
+        assert (reloaded.vectors_for(books, db_session) != isolated_book_index.vectors_for(books, db_session)).nnz == 0
+    
+    def test_upsert_updates_vector_in_place(self, db_session, isolated_book_index):
+        """Test that editing a book re-vectorizes only that row."""
+        books = self._add_books(db_session)
+        isolated_book_index.rebuild_ratio = 10
+        isolated_book_index.build(db_session)
+        before = isolated_book_index.vectors_for([books[2]], db_session).toarray()
+        
+        books[2].description = "Fantasy dragons cookbook"
+        db_session.commit()
+        isolated_book_index.upsert_book(books[2], db_session)
+        
+        after = isolated_book_index.vectors_for([books[2]], db_session).toarray()
+        assert isolated_book_index.size == len(books)
+        assert not np.allclose(before, after)
+    
+    def test_request_path_only_writes_rows_and_task_persists(self, db_session, isolated_book_index):
+        """Test that upserts stay in memory and refresh_books saves or refits the index."""
+        from app.services.book_index_service import BookIndexService
+        books = self._add_books(db_session)
+        isolated_book_index.rebuild_ratio = 10
+        isolated_book_index.build(db_session)
+        saved_mtime = isolated_book_index.loaded_mtime
+        
+        books[2].description = "Fantasy dragons cookbook"
+        db_session.commit()
+        with patch('app.services.book_index_service.TfidfVectorizer.fit_transform') as mock_fit:
+            isolated_book_index.upsert_book(books[2], db_session)
+            mock_fit.assert_not_called()
+        assert isolated_book_index._disk_mtime() == saved_mtime
+        
+        # The task persists the edit and the removal of a deleted book
+        deleted_id = books[1].id
+        db_session.delete(books[1])
+        db_session.commit()
+        isolated_book_index.refresh_books([books[2].id, deleted_id], db_session)
+        reloaded = BookIndexService(index_dir=isolated_book_index.index_dir)
+        assert reloaded.load()
+        assert reloaded.size == len(books) - 1 and deleted_id not in reloaded.row_of
+        assert np.allclose(reloaded.vectors_for([books[2]], db_session).toarray(),
+                           isolated_book_index.vectors_for([books[2]], db_session).toarray())
+        
+        # Past the drift threshold the task refits the vocabulary
+        isolated_book_index.rebuild_ratio = 0
+        with patch.object(BookIndexService, 'build', wraps=isolated_book_index.build) as mock_build:
+            isolated_book_index.refresh_books([books[0].id], db_session)
+            mock_build.assert_called_once()
+    
+    def test_request_path_updates_leave_base_matrix_alone(self, db_session, isolated_book_index):
+        """Test that uploads, edits and deletes go to the delta and are folded in only by refresh_books."""
+        from app.models.book import Book
+        books = self._add_books(db_session)
+        isolated_book_index.rebuild_ratio = 10
+        isolated_book_index.build(db_session)
+        base = isolated_book_index.matrix
+        liked = isolated_book_index.vectors_for([books[0]], db_session)
+        
+        books[2].description = "Epic fantasy with dragons and magic"
+        new_book = Book(title="Dragons again", author="D. Writer", description="Dragons and magic", file_path="/tmp/d.pdf")
+        db_session.add(new_book)
+        db_session.commit()
+        isolated_book_index.upsert_books([books[2], new_book], db_session)
+        deleted_id = books[1].id
+        db_session.delete(books[1])
+        db_session.commit()
+        isolated_book_index.remove_book(deleted_id)
+        
+        assert isolated_book_index.matrix is base and isolated_book_index.size == 3
+        book_ids, scores = isolated_book_index.most_similar(liked, exclude_ids=[books[0].id])
+        assert sorted(book_ids) == sorted([books[2].id, new_book.id])
+        assert scores[list(book_ids).index(books[2].id)] > 0.5
+        
+        isolated_book_index.refresh_books([books[2].id, new_book.id, deleted_id], db_session)
+        assert isolated_book_index.matrix is not base and not isolated_book_index.delta_ids
+        assert sorted(isolated_book_index.book_ids) == sorted([books[0].id, books[2].id, new_book.id])
+    
+    def test_other_process_saves_are_reloaded_on_interval(self, db_session, isolated_book_index):
+        """Test that a save by another process is picked up on the reload interval, not on every request."""
+        from app.services.book_index_service import BookIndexService
+        books = self._add_books(db_session)
+        isolated_book_index.build(db_session)
+        worker = BookIndexService(index_dir=isolated_book_index.index_dir)
+        isolated_book_index.reload_seconds = 3600
+        
+        with patch.object(BookIndexService, 'load', wraps=isolated_book_index.load) as mock_load:
+            worker.build(db_session)
+            assert isolated_book_index.ensure_ready(db_session)
+            mock_load.assert_not_called()
+            isolated_book_index.checked_at -= 3600
+            assert isolated_book_index.ensure_ready(db_session)
+            mock_load.assert_called_once()
+        assert isolated_book_index.size == len(books)
+    
+    def test_sync_catalog_reads_only_new_books(self, db_session, isolated_book_index):
+        """Test that syncing the catalog is one primary-key range query, not a scan of every id."""
+        from sqlalchemy import event
+        from app.models.book import Book
+        books = self._add_books(db_session)
+        isolated_book_index.build(db_session)
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            assert isolated_book_index.sync_catalog(db_session)
+            new_book = Book(title="Space opera", author="Author", description="Stars and ships", file_path="/tmp/new.pdf")
+            db_session.add(new_book)
+            db_session.commit()
+            statements.clear()
+            assert isolated_book_index.sync_catalog(db_session)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        
+        assert len(statements) == 1 and "books.id >" in statements[0]
+        assert isolated_book_index.contains([new_book.id])[0] and isolated_book_index.size == len(books) + 1
+    
+    async def test_recommendations_do_not_refit_vectorizer(self, db_session, test_user, isolated_book_index):
+        """Test that recommendation requests reuse the index instead of refitting TF-IDF."""
+        from app.models.review import Review
+        from app.services.recommendation_service import RecommendationService
+        books = self._add_books(db_session)
+        db_session.add(Review(user_id=test_user.id, book_id=books[0].id, rating=5, comment="Wonderful, I loved it"))
+        db_session.commit()
+        isolated_book_index.build(db_session)
+        
+        with patch('app.services.book_index_service.TfidfVectorizer.fit_transform') as mock_fit:
+            recommendations = await RecommendationService(db_session).get_recommendations(test_user.id)
+            mock_fit.assert_not_called()
+        
+        assert recommendations[0]["id"] == books[1].id
+
+    
+    def test_lsh_index_finds_identical_vectors(self):
+        """Test that LSH always retrieves a vector identical to the query."""
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        from app.services.ann_index_service import LSHIndex
+        matrix = normalize(sparse.random(500, 200, density=0.05, format="csr", random_state=3))
+        index = LSHIndex(num_tables=4, num_bits=8, probes=1)
+        index.build(matrix)
+        
+        candidates = index.query(matrix[[7, 42]])
+        assert 7 in candidates and 42 in candidates
+        assert len(candidates) < matrix.shape[0]
+    
+    def test_lsh_chunked_build_matches_single_pass(self):
+        """Test that building in row chunks hashes every row exactly as one full projection does."""
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        from app.services.ann_index_service import LSHIndex
+        matrix = normalize(sparse.random(500, 200, density=0.05, format="csr", random_state=3))
+        whole, chunked = LSHIndex(num_tables=4, num_bits=8), LSHIndex(num_tables=4, num_bits=8, chunk_rows=64)
+        whole.build(matrix)
+        chunked.build(matrix)
+        
+        for table in range(4):
+            assert np.array_equal(whole.sorted_codes[table], chunked.sorted_codes[table])
+            assert np.array_equal(whole.sorted_rows[table], chunked.sorted_rows[table])
+    
+    def test_lsh_tables_are_built_by_the_saving_process(self, db_session, isolated_book_index):
+        """Test that processes loading a saved index reuse its LSH tables, and deletes keep them."""
+        from app.services.ann_index_service import LSHIndex
+        from app.services.book_index_service import BookIndexService
+        books = self._add_books(db_session)
+        isolated_book_index.mode = "lsh"
+        isolated_book_index.lsh_min_catalog_size = 0
+        isolated_book_index.build(db_session)
+        
+        reader = BookIndexService(index_dir=isolated_book_index.index_dir, mode="lsh")
+        reader.lsh_min_catalog_size = 0
+        reader.lsh_max_candidate_ratio = 1.0
+        with patch.object(LSHIndex, 'build') as mock_build:
+            assert reader.load() and reader.lsh is not None
+            liked = reader.vectors_for([books[0]], db_session)
+            reader.remove_book(books[2].id)
+            book_ids, _ = reader.most_similar(liked, exclude_ids=[books[0].id])
+            mock_build.assert_not_called()
+        assert reader.lsh is not None and books[2].id not in book_ids
+    
+    def test_lsh_mode_matches_exact_top_result(self, db_session, isolated_book_index):
+        """Test that LSH mode returns the exact nearest neighbour and falls back to exact search when needed."""
+        books = self._add_books(db_session)
+        isolated_book_index.lsh_min_catalog_size = 0
+        isolated_book_index.lsh_max_candidate_ratio = 1.0
+        isolated_book_index.build(db_session)
+        liked = isolated_book_index.vectors_for([books[0]], db_session)
+        
+        exact_ids, exact_scores = isolated_book_index.most_similar(liked, exclude_ids=[books[0].id], mode="exact")
+        lsh_ids, lsh_scores = isolated_book_index.most_similar(liked, exclude_ids=[books[0].id], mode="lsh")
+        assert lsh_ids[np.argmax(lsh_scores)] == exact_ids[np.argmax(exact_scores)] == books[1].id
+        
+        fallback_ids, _ = isolated_book_index.most_similar(liked, exclude_ids=[books[0].id], mode="lsh", min_candidates=10)
+        assert sorted(fallback_ids) == sorted(exact_ids)
+
+
+class TestQueryCount:
+    """Regression tests for the number of SQL statements issued per request."""
+    
+    def _add_reviewed_books(self, db_session, user_id, count):
+        from app.models.book import Book
+        from app.models.review import Review
+        from app.services.preference_service import PreferenceService
+        reviews = []
+        for i in range(count):
+            book = Book(title=f"Book {i}", author=f"Author {i}", description=f"Story number {i}", file_path=f"/tmp/{i}.pdf")
+            db_session.add(book)
+            db_session.flush()
+            reviews.append(Review(user_id=user_id, book_id=book.id, rating=5, comment="Wonderful, loved it"))
+        db_session.add_all(reviews)
+        db_session.commit()
+        # Fold the reviews into the preference profile, as ReviewService.submit_review does
+        for review in reviews:
+            PreferenceService().record_review(review, db_session)
+        db_session.expire_all()
+        return user_id
+    
+    async def _count_statements(self, db_session, coro_factory):
+        from sqlalchemy import event
+        from tests.conftest import engine
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            await coro_factory()
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        return len(statements)
+    
+    @pytest.mark.parametrize("review_count", [3, 30])
+    async def test_reviews_summary_query_count_is_constant(self, db_session, test_user, review_count):
+        """Test that the GenAI reviews summary fetches reviews and books together."""
+        from app.services.recommendation_service import RecommendationService
+        user_id = self._add_reviewed_books(db_session, test_user.id, review_count)
+        service = RecommendationService(db_session)
+        
+        async def run():
+            with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Summary"):
+                summary = await service.get_genai_reviews_summary(user_id)
+            assert len(summary["reviewed_books"]) == review_count
+        
+        assert await self._count_statements(db_session, run) == 1
+    
+    async def test_recommendations_query_count_is_constant(self, db_session, test_user):
+        """Test that recommendation requests issue the same number of statements regardless of review count."""
+        from app.services.recommendation_service import RecommendationService
+        service = RecommendationService(db_session)
+        user_id = test_user.id
+        counts = []
+        for review_count in (3, 30):
+            self._add_reviewed_books(db_session, user_id, review_count)
+            # Warm up the book index so both runs only measure the request itself
+            await service.compute_recommendations(user_id)
+            db_session.expire_all()
+            counts.append(await self._count_statements(db_session, lambda: service.compute_recommendations(user_id)))
+        assert counts[0] == counts[1]
+
+
+class TestBatchRecommendations:
+    """Test cases for POST /recommendations/recommendations/batch."""
+    
+    def _seed(self, db_session):
+        from app.models.book import Book
+        from app.models.review import Review
+        books = [
+            Book(title=f"Title {i}", author=f"Author {i % 3}", description=f"Genre {i % 4} story about topic {i % 5}", file_path=f"/tmp/{i}.pdf")
+            for i in range(12)
+        ]
+        db_session.add_all(books)
+        db_session.commit()
+        reviews = [
+            Review(user_id=1, book_id=books[0].id, rating=5, comment="Loved it, wonderful"),
+            Review(user_id=1, book_id=books[5].id, rating=4, comment="Great read"),
+            Review(user_id=2, book_id=books[3].id, rating=5, comment="Excellent and beautiful"),
+            Review(user_id=3, book_id=books[7].id, rating=1, comment="Terrible, boring"),
+        ]
+        db_session.add_all(reviews)
+        db_session.commit()
+        return books
+    
+    async def test_batch_matches_single_user_path(self, db_session):
+        """Test that batch output equals the single-user recommendations for every user."""
+        from app.services.recommendation_service import RecommendationService
+        self._seed(db_session)
+        service = RecommendationService(db_session)
+        user_ids = [1, 2, 3, 4]
+        
+        batch = await service.get_batch_recommendations(user_ids, limit=4)
+        
+        assert list(batch.keys()) == user_ids
+        for user_id in user_ids:
+            assert batch[user_id] == await service.get_recommendations(user_id, limit=4)
+    
+    def test_batch_endpoint(self, client, auth_headers, db_session):
+        """Test the batch endpoint response structure."""
+        self._seed(db_session)
+        response = client.post(
+            "/recommendations/recommendations/batch",
+            headers=auth_headers,
+            json={"user_ids": [1, 2], "limit": 3}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [entry["user_id"] for entry in data] == [1, 2]
+        assert all(len(entry["recommendations"]) == 3 for entry in data)
+    
+    def test_batch_endpoint_requires_user_ids(self, client, auth_headers):
+        """Test that an empty user list is rejected."""
+        response = client.post(
+            "/recommendations/recommendations/batch",
+            headers=auth_headers,
+            json={"user_ids": []}
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestStoredRecommendations:
+    """Test cases for the precomputed user_recommendations table."""
+    
+    def _seed(self, db_session, user_id):
+        from app.models.book import Book
+        from app.models.review import Review
+        books = [
+            Book(title=f"Title {i}", author="Author", description=f"Story about topic {i % 2}", file_path=f"/tmp/{i}.pdf")
+            for i in range(4)
+        ]
+        db_session.add_all(books)
+        db_session.commit()
+        db_session.add(Review(user_id=user_id, book_id=books[0].id, rating=5, comment="Wonderful"))
+        db_session.commit()
+        return books
+    
+    async def test_miss_computes_and_stores(self, db_session, test_user):
+        """Test that a miss computes live once and later requests read the stored row."""
+        from app.models.user_recommendation import UserRecommendation
+        from app.services.recommendation_service import RecommendationService
+        self._seed(db_session, test_user.id)
+        service = RecommendationService(db_session)
+        
+        first = await service.get_recommendations(test_user.id)
+        row = db_session.get(UserRecommendation, test_user.id)
+        assert row is not None and row.last_review_id > 0
+        
+        with patch.object(RecommendationService, 'compute_recommendations', new_callable=AsyncMock) as mock_compute:
+            second = await service.get_recommendations(test_user.id)
+            mock_compute.assert_not_called()
+        assert second == first
+    
+    async def test_stale_row_is_recomputed(self, db_session, test_user):
+        """Test that rows older than the staleness limit fall back to live computation."""
+        from datetime import datetime, timedelta
+        from app.models.user_recommendation import UserRecommendation
+        from app.services.recommendation_service import RecommendationService
+        self._seed(db_session, test_user.id)
+        db_session.add(UserRecommendation(
+            user_id=test_user.id, recommendations=[{"id": 999}], last_review_id=0,
+            computed_at=datetime.utcnow() - timedelta(days=30)
+        ))
+        db_session.commit()
+        
+        recommendations = await RecommendationService(db_session).get_recommendations(test_user.id)
+        assert all(r["id"] != 999 for r in recommendations)
+    
+    async def test_row_older_than_latest_review_is_recomputed(self, db_session, test_user):
+        """Test that a fresh row computed before the user's newest review is not served."""
+        from datetime import datetime
+        from app.models.user_recommendation import UserRecommendation
+        from app.services.recommendation_service import RecommendationService
+        self._seed(db_session, test_user.id)
+        db_session.add(UserRecommendation(
+            user_id=test_user.id, recommendations=[{"id": 999}], last_review_id=0,
+            computed_at=datetime.utcnow()
+        ))
+        db_session.commit()
+        
+        service = RecommendationService(db_session)
+        assert service.get_stored_recommendations(test_user.id, 5) is None
+        recommendations = await service.get_recommendations(test_user.id)
+        assert all(r["id"] != 999 for r in recommendations)
+    
+    async def test_deleted_book_leaves_stored_row(self, db_session, test_user):
+        """Test that a row computed before a catalog change is recomputed, so deleted books are not served."""
+        from app.services.book_service import BookService
+        from app.services.recommendation_service import RecommendationService
+        books = self._seed(db_session, test_user.id)
+        service = RecommendationService(db_session)
+        
+        first = await service.get_recommendations(test_user.id)
+        deleted_id = first[0]["id"]
+        BookService().delete_book(deleted_id, db_session)
+        
+        assert service.get_stored_recommendations(test_user.id, 5) is None
+        recommendations = await service.get_recommendations(test_user.id)
+        assert all(r["id"] != deleted_id for r in recommendations)
+        assert {r["id"] for r in recommendations} <= {book.id for book in books}
+    
+    def test_refresh_task_recomputes_users_with_new_reviews(self, db_session, test_user, test_user2):
+        """Test that the periodic job picks users whose preference profile is ahead of their stored row."""
+        from datetime import datetime
+        from app.models.review import Review
+        from app.models.user_recommendation import UserRecommendation
+        from app.services.preference_service import PreferenceService
+        from app.workers.tasks import refresh_user_recommendations
+        from tests.conftest import TestingSessionLocal
+        books = self._seed(db_session, test_user.id)
+        db_session.add(UserRecommendation(
+            user_id=test_user2.id, recommendations=[], last_review_id=10**6, computed_at=datetime.utcnow()
+        ))
+        db_session.add(Review(user_id=test_user2.id, book_id=books[1].id, rating=5, comment="Great"))
+        db_session.commit()
+        preference_service = PreferenceService()
+        for review in db_session.query(Review).all():
+            preference_service.record_review(review, db_session)
+        
+        from sqlalchemy import event
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            with patch('app.workers.tasks.SessionLocal', TestingSessionLocal):
+                assert refresh_user_recommendations() == 1
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert not any("GROUP BY reviews.user_id" in statement for statement in statements)
+        
+        db_session.expire_all()
+        row = db_session.get(UserRecommendation, test_user.id)
+        assert row is not None
+        assert len(row.recommendations) == 3
+
+
+class TestCooccurrence:
+    """Test cases for item-item collaborative filtering from borrow/review co-occurrence."""
+    
+    def _books(self, db_session, count):
+        from app.models.book import Book
+        books = [Book(title=f"Title {i}", author="Author", description="Same description", file_path=f"/tmp/{i}.pdf") for i in range(count)]
+        db_session.add_all(books)
+        db_session.commit()
+        return books
+    
+    def _borrow_and_return(self, db_session, user_id, book_id):
+        from app.services.borrow_service import BorrowService
+        service = BorrowService()
+        service.borrow_book(user_id, book_id, db_session)
+        service.return_book(user_id, book_id, db_session)
+    
+    def test_incremental_updates_match_rebuild(self, db_session):
+        """Test that borrow/review events keep the matrix equal to a full rebuild."""
+        from app.models.book_cooccurrence import BookCooccurrence
+        from app.services.cooccurrence_service import CooccurrenceService
+        from app.services.review_service import ReviewService
+        books = self._books(db_session, 3)
+        for user_id, book_ids in {1: [0, 1, 2], 2: [0, 1], 3: [1]}.items():
+            for index in book_ids:
+                self._borrow_and_return(db_session, user_id, books[index].id)
+        # A second borrow and a review of an already borrowed book must not count twice
+        self._borrow_and_return(db_session, 2, books[0].id)
+        ReviewService().submit_review(2, books[1].id, "Nice", 4, db_session)
+        
+        def snapshot():
+            return {(row.book_id, row.neighbor_id): row.weight for row in db_session.query(BookCooccurrence).all()}
+        
+        incremental = snapshot()
+        assert incremental[(books[0].id, books[1].id)] == 2
+        assert incremental[(books[1].id, books[1].id)] == 3
+        CooccurrenceService().rebuild(db_session)
+        assert snapshot() == incremental
+    
+    def test_history_and_neighbors_are_capped(self, db_session):
+        """Test that only a user's most recent books pair up and neighbour lists keep the strongest entries."""
+        from datetime import datetime, timedelta
+        from app.models.book_cooccurrence import BookCooccurrence
+        from app.models.borrow import Borrow
+        from app.services.cooccurrence_service import CooccurrenceService
+        books = self._books(db_session, 6)
+        start = datetime(2024, 1, 1)
+        # Borrowed in reverse id order, so recency and id order disagree
+        history = {1: [4, 3, 2, 1, 0], 2: [1, 0]}
+        for user_id, indexes in history.items():
+            for minute, index in enumerate(indexes):
+                db_session.add(Borrow(user_id=user_id, book_id=books[index].id, borrowed_at=start + timedelta(minutes=minute)))
+        db_session.commit()
+        service = CooccurrenceService(max_history=3, max_neighbors=1)
+        service.rebuild(db_session)
+        
+        def entries():
+            return {(row.book_id, row.neighbor_id): row.weight for row in db_session.query(BookCooccurrence).all()}
+        
+        # User 1 keeps books 2, 1 and 0, their latest three
+        assert (books[0].id, books[2].id) in entries()
+        assert (books[4].id, books[4].id) not in entries()
+        
+        db_session.add(Borrow(user_id=1, book_id=books[5].id, borrowed_at=start + timedelta(hours=1)))
+        db_session.commit()
+        service.record_interaction(1, books[5].id, db_session)
+        assert {pair for pair in entries() if pair[0] == books[5].id} == {
+            (books[5].id, books[5].id), (books[5].id, books[0].id), (books[5].id, books[1].id)}
+        
+        # Book 0 co-occurs twice with book 1 and once with books 2 and 5
+        assert service.neighbor_similarities([books[0].id], db_session) == {
+            books[0].id: {books[1].id: pytest.approx(1.0)}}
+    
+    async def test_cooccurrence_boosts_recommendations(self, db_session, test_user):
+        """Test that books borrowed together with a liked book rank first when content is identical."""
+        from app.models.review import Review
+        from app.services.recommendation_service import RecommendationService
+        books = self._books(db_session, 4)
+        for user_id in (10, 11):
+            self._borrow_and_return(db_session, user_id, books[0].id)
+            self._borrow_and_return(db_session, user_id, books[3].id)
+        db_session.add(Review(user_id=test_user.id, book_id=books[0].id, rating=5, comment="Wonderful"))
+        db_session.commit()
+        
+        recommendations = await RecommendationService(db_session).compute_recommendations(test_user.id)
+        assert recommendations[0]["id"] == books[3].id
+        assert recommendations[0]["score"] > recommendations[1]["score"]
+
+
+class TestRecommendationCache:
+    """Test cases for the versioned per-user recommendation cache."""
+    
+    async def test_versions_are_read_in_one_round_trip_off_the_loop(self):
+        """Test that a cache key reads its version counters with one MGET on a worker thread."""
+        import asyncio
+        from unittest.mock import MagicMock
+        from app.services.recommendation_service import recommendation_cache_key
+        redis = MagicMock()
+        redis.mget.return_value = [b"3", None]
+        
+        with patch('app.core.cache.get_redis', return_value=redis), \
+                patch('app.core.cache.asyncio.to_thread', wraps=asyncio.to_thread) as mock_thread:
+            assert await recommendation_cache_key(7, 5) == "7:5:v3:c0"
+        redis.mget.assert_called_once_with(["luminalib:version:user:7", "luminalib:version:catalog"])
+        redis.get.assert_not_called()
+        mock_thread.assert_called_once()
+    
+    def test_lru_evicts_least_recently_used(self):
+        """Test that the in-process cache keeps at most max_size entries."""
+        from app.core.cache import LRUCache
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.info()["hits"] == 3 and cache.info()["misses"] == 1
+    
+    async def test_repeat_request_is_served_from_cache(self, db_session, test_user):
+        """Test that a second request does not touch the stored row or recompute."""
+        from app.services.recommendation_service import RecommendationService, recommendation_cache
+        TestStoredRecommendations()._seed(db_session, test_user.id)
+        service = RecommendationService(db_session)
+        first = await service.get_recommendations(test_user.id)
+        
+        with patch.object(RecommendationService, 'get_stored_recommendations') as mock_stored:
+            second = await service.get_recommendations(test_user.id)
+            mock_stored.assert_not_called()
+        assert second == first
+        assert recommendation_cache.info()["hits"] == 1
+    
+    async def test_new_review_invalidates_user_entry(self, db_session, test_user):
+        """Test that after a review the cached and stored results are replaced by a fresh computation."""
+        from app.models.borrow import Borrow
+        from app.services.review_service import ReviewService
+        from app.services.recommendation_service import RecommendationService
+        books = TestStoredRecommendations()._seed(db_session, test_user.id)
+        service = RecommendationService(db_session)
+        before = await service.get_recommendations(test_user.id)
+        assert books[1].id in [r["id"] for r in before]
+        
+        db_session.add(Borrow(user_id=test_user.id, book_id=books[1].id))
+        db_session.commit()
+        ReviewService().submit_review(test_user.id, books[1].id, "Loved it", 5, db_session)
+        
+        after = await service.get_recommendations(test_user.id)
+        assert books[1].id not in [r["id"] for r in after]
+        assert after == await service.compute_recommendations(test_user.id)
+    
+    def test_stats_endpoint(self, client, auth_headers):
+        """Test that the stats endpoint reports the cache counters."""
+        response = client.get("/recommendations/recommendations/cache/stats", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert {"backend", "hits", "misses", "hit_rate"} <= set(response.json())
+
+
+class TestTopKRanking:
+    """Test cases for partial top-k selection in rank_by_score."""
+    
+    def test_top_k_matches_full_sort(self):
+        """Test that partial selection returns the same positions as a stable full sort."""
+        from app.services.recommendation_service import RecommendationService
+        scores = np.random.default_rng(0).choice([0.1, 0.2, 0.5, 0.9], size=1000)
+        expected = np.argsort(-scores, kind="stable")[:10]
+        assert list(RecommendationService.top_k(scores, 10)) == list(expected)
+        assert list(RecommendationService.top_k(scores[:3], 10)) == list(np.argsort(-scores[:3], kind="stable"))
+        assert len(RecommendationService.top_k(scores, 0)) == 0
+    
+    def test_rank_by_score_loads_only_selected_books(self, db_session):
+        """Test that response dicts are built only for the selected books."""
+        from app.models.book import Book
+        from app.services.recommendation_service import RecommendationService
+        books = [Book(title=f"Title {i}", author="Author", file_path=f"/tmp/{i}.pdf") for i in range(6)]
+        db_session.add_all(books)
+        db_session.commit()
+        book_ids = np.array([book.id for book in books])
+        scores = np.array([0.1, 0.8, 0.3, 0.9, 0.2, 0.7])
+        
+        ranked = RecommendationService(db_session).rank_by_score(book_ids, scores, 3)
+        assert [entry["id"] for entry in ranked] == [books[3].id, books[1].id, books[5].id]
+        assert [entry["score"] for entry in ranked] == [0.9, 0.8, 0.7]
+
+
+class TestTrendingBooks:
+    """Test cases for the time-decayed trending leaderboard used for cold-start users."""
+    
+    def test_recent_events_outrank_old_ones(self):
+        """Test that scores decay with the configured half-life."""
+        from app.services.trending_service import TrendingLeaderboard
+        leaderboard = TrendingLeaderboard(half_life_hours=1, top_size=2)
+        now = leaderboard.epoch
+        leaderboard.record_event(1, 3.0, now=now)
+        leaderboard.record_event(2, 1.0, now=now + 2 * 3600)
+        leaderboard.record_event(3, 0.5, now=now + 2 * 3600)
+        
+        top = leaderboard.top_books(3, now=now + 2 * 3600)
+        assert [book_id for book_id, _ in top] == [2, 1, 3]
+        assert top[1][1] == pytest.approx(0.75)
+        assert [book_id for book_id, _ in leaderboard.top_books(2, now=now + 2 * 3600)] == [2, 1]
+    
+    def test_epoch_is_moved_before_overflow(self):
+        """Test that rescaling keeps the ranking and the decayed scores."""
+        from app.services.trending_service import TrendingLeaderboard
+        leaderboard = TrendingLeaderboard(half_life_hours=1)
+        now = leaderboard.epoch
+        leaderboard.record_event(1, 1.0, now=now)
+        later = now + (leaderboard.MAX_EXPONENT + 1) * 3600
+        leaderboard.record_event(2, 1.0, now=later)
+        
+        assert leaderboard.epoch == later
+        assert leaderboard.top_books(2, now=later) == [(2, 1.0), (1, pytest.approx(2.0 ** -(leaderboard.MAX_EXPONENT + 1)))]
+    
+    async def test_cold_start_serves_trending_books(self, db_session, test_user, test_user2):
+        """Test that a user without reviews gets the most borrowed books first."""
+        from app.models.book import Book
+        from app.services.borrow_service import BorrowService
+        from app.services.recommendation_service import RecommendationService
+        books = [Book(title=f"Title {i}", author="Author", file_path=f"/tmp/{i}.pdf") for i in range(5)]
+        db_session.add_all(books)
+        db_session.commit()
+        borrow_service = BorrowService()
+        for user_id, book in [(test_user2.id, books[3]), (test_user2.id, books[2]), (99, books[3])]:
+            borrow_service.borrow_book(user_id, book.id, db_session)
+            borrow_service.return_book(user_id, book.id, db_session)
+        
+        recommendations = await RecommendationService(db_session).compute_recommendations(test_user.id, limit=3)
+        assert [entry["id"] for entry in recommendations] == [books[3].id, books[2].id, books[0].id]
+        assert recommendations[0]["reason"] == "Explore our collection"
+    
+    async def test_empty_leaderboard_is_seeded_from_recent_borrows(self, db_session, test_user, test_book, test_book2):
+        """Test that a fresh process seeds the leaderboard from the borrows table."""
+        from datetime import datetime
+        from app.models.borrow import Borrow
+        from app.services.trending_service import trending_books
+        from app.services.recommendation_service import RecommendationService
+        db_session.add(Borrow(user_id=test_user.id + 1, book_id=test_book2.id, borrowed_at=datetime.utcnow()))
+        db_session.commit()
+        
+        recommendations = await RecommendationService(db_session).compute_recommendations(test_user.id, limit=2)
+        assert [entry["id"] for entry in recommendations] == [test_book2.id, test_book.id]
+        assert trending_books.top_books(1)[0][0] == test_book2.id
+
+
+class TestUserPreferences:
+    """Test cases for the incrementally maintained user preference profile."""
+    
+    def _books(self, db_session):
+        from app.models.book import Book
+        books = [
+            Book(title="Dragons", author="A. Writer", description="Fantasy", file_path="/tmp/a.pdf"),
+            Book(title="More Dragons", author="A. Writer", description="Fantasy", file_path="/tmp/b.pdf"),
+            Book(title="Cooking", author="C. Chef", description="Recipes", file_path="/tmp/c.pdf"),
+        ]
+        db_session.add_all(books)
+        db_session.commit()
+        return books
+    
+    def test_profile_updates_incrementally_and_matches_rebuild(self, db_session, test_user):
+        """Test that borrows and reviews update the running aggregates like a full rebuild would."""
+        from app.models.user_preference import UserPreference
+        from app.services.borrow_service import BorrowService
+        from app.services.review_service import ReviewService
+        from app.services.preference_service import PreferenceService
+        books = self._books(db_session)
+        for book, rating, comment in [(books[0], 5, "Wonderful, loved it"), (books[2], 2, "Terrible and boring"), (books[1], 4, "Great read")]:
+            BorrowService().borrow_book(test_user.id, book.id, db_session)
+            BorrowService().return_book(test_user.id, book.id, db_session)
+            ReviewService().submit_review(test_user.id, book.id, comment, rating, db_session)
+        
+        profile = db_session.query(UserPreference).filter(UserPreference.user_id == test_user.id).one()
+        assert profile.review_count == 3 and profile.borrow_count == 3
+        assert profile.avg_rating_given == pytest.approx(11 / 3)
+        assert profile.author_counts == {"A. Writer": 4, "C. Chef": 2}
+        assert profile.favorite_authors == "A. Writer,C. Chef"
+        assert set(profile.preference_vector) == {str(books[0].id), str(books[1].id)}
+        
+        incremental = {column: getattr(profile, column) for column in ("review_count", "borrow_count", "avg_rating_given", "author_counts", "preference_vector")}
+        rebuilt = PreferenceService().rebuild_profile(test_user.id, db_session)
+        assert {column: getattr(rebuilt, column) for column in incremental} == incremental
+    
+    async def test_recommendations_read_profile_not_reviews(self, db_session, test_user):
+        """Test that a recommendation request does not query the reviews table once the profile exists."""
+        from sqlalchemy import event
+        from tests.conftest import engine
+        from app.models.review import Review
+        from app.services.recommendation_service import RecommendationService
+        books = self._books(db_session)
+        db_session.add(Review(user_id=test_user.id, book_id=books[0].id, rating=5, comment="Wonderful, loved it"))
+        db_session.commit()
+        service = RecommendationService(db_session)
+        first = await service.compute_recommendations(test_user.id)
+        
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            assert await service.compute_recommendations(test_user.id) == first
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        assert first[0]["id"] == books[1].id
+        assert not any("FROM reviews" in statement for statement in statements)
@@ -395,3 +395,391 @@ class TestBookAnalysis:
         """Test getting analysis without authentication."""
         response = client.get(f"/api/books/{test_book.id}/analysis")
         assert response.status_code in [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN]
+
+
+class TestReviewSentiment:
+    """Test cases for sentiment stored on reviews at write time."""
+    
+    def test_submit_review_stores_sentiment(self, client, auth_headers, test_user, test_book, test_borrow, db_session):
+        """Test that sentiment is computed once when the review is submitted."""
+        from app.models.review import Review
+        
+        response = client.post(
+            f"/api/books/{test_book.id}/reviews",
+            headers=auth_headers,
+            json={
+                "user_id": test_user.id,
+                "rating": 5,
+                "comment": "Wonderful and beautiful story"
+            }
+        )
+        assert response.status_code == status.HTTP_200_OK
+        review = db_session.query(Review).filter(Review.id == response.json()["reviewed"]["id"]).first()
+        assert review.sentiment_label == "POSITIVE"
+        assert 0.5 < review.sentiment_score <= 1.0
+        assert review.sentiment_polarity > 0.1
+    
+    def test_analysis_reads_stored_sentiment(self, client, auth_headers, test_book, db_session):
+        """Test that the analysis endpoint does not run TextBlob for scored reviews."""
+        from unittest.mock import patch, AsyncMock
+        from app.models.review import Review
+        
+        db_session.add(Review(
+            user_id=1, book_id=test_book.id, rating=4, comment="Loved it",
+            sentiment_label="POSITIVE", sentiment_score=0.9, sentiment_polarity=0.8
+        ))
+        db_session.commit()
+        
+        with patch('app.services.sentiment_service.TextBlob') as mock_blob, \
+                patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Readers liked it"):
+            response = client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers)
+            mock_blob.assert_not_called()
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["sentiment_breakdown"]["positive"] == 1
+    
+    def test_backfill_review_sentiment(self, db_session, test_review):
+        """Test that the backfill task scores reviews written without sentiment."""
+        from unittest.mock import patch
+        from app.workers.tasks import backfill_review_sentiment
+        from tests.conftest import TestingSessionLocal
+        
+        assert test_review.sentiment_label is None
+        with patch('app.workers.tasks.SessionLocal', TestingSessionLocal):
+            assert backfill_review_sentiment(batch_size=1) == 1
+        
+        db_session.refresh(test_review)
+        assert test_review.sentiment_label == "POSITIVE"
+        assert test_review.sentiment_score is not None
+
+
+class TestReviewConsensus:
+    """Test cases for the rolling review consensus behind the analysis endpoint."""
+    
+    def _add_reviews(self, db_session, book_id, comments):
+        from app.core.cache import cache_versions
+        from app.models.review import Review
+        for i, comment in enumerate(comments):
+            db_session.add(Review(user_id=100 + i, book_id=book_id, rating=4, comment=comment))
+        db_session.commit()
+        # Invalidate the cached analysis, as ReviewService.submit_review does
+        cache_versions.bump(f"book:{book_id}")
+    
+    async def test_refresh_sends_only_new_reviews(self, db_session, test_book):
+        """Test that later refreshes send the previous consensus plus the new reviews only."""
+        from unittest.mock import patch, AsyncMock
+        from app.models.book_review_consensus import BookReviewConsensus
+        from app.services.recommendation_service import RecommendationService
+        self._add_reviews(db_session, test_book.id, ["First impressions", "Second opinion"])
+        service = RecommendationService(db_session)
+        
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Consensus v1") as mock_summarize:
+            assert (await service.get_book_reviews_analysis(test_book.id))["summary"] == "Consensus v1"
+            assert "Second opinion" in mock_summarize.call_args.args[0]
+        
+        self._add_reviews(db_session, test_book.id, ["Brand new take"])
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Consensus v2") as mock_summarize:
+            analysis = await service.get_book_reviews_analysis(test_book.id)
+            prompt = mock_summarize.call_args.args[0]
+        assert analysis["summary"] == "Consensus v2" and analysis["total_reviews"] == 3
+        assert "Consensus v1" in prompt and "Brand new take" in prompt
+        assert "First impressions" not in prompt
+        
+        consensus = db_session.get(BookReviewConsensus, test_book.id)
+        assert consensus.review_count == 3
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock) as mock_summarize:
+            assert (await service.get_book_reviews_analysis(test_book.id))["summary"] == "Consensus v2"
+            mock_summarize.assert_not_called()
+    
+    async def test_prompt_is_bounded_by_batch_size(self, db_session, test_book):
+        """Test that each request folds at most one batch and a failed call keeps the watermark."""
+        from unittest.mock import patch, AsyncMock
+        from app.models.book_review_consensus import BookReviewConsensus
+        from app.services.recommendation_service import RecommendationService
+        self._add_reviews(db_session, test_book.id, [f"Comment {i}" for i in range(5)])
+        service = RecommendationService(db_session)
+        
+        with patch('app.services.recommendation_service.settings.BOOK_CONSENSUS_BATCH_SIZE', 2), \
+                patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Partial") as mock_summarize:
+            await service.get_book_reviews_analysis(test_book.id)
+            assert mock_summarize.call_count == 1
+            assert "Comment 1" in mock_summarize.call_args.args[0] and "Comment 2" not in mock_summarize.call_args.args[0]
+            
+            mock_summarize.return_value = None
+            assert (await service.get_book_reviews_analysis(test_book.id))["summary"] == "Partial"
+            assert db_session.get(BookReviewConsensus, test_book.id).review_count == 2
+            
+            mock_summarize.return_value = "Complete"
+            await service.get_book_reviews_analysis(test_book.id, max_consensus_batches=None)
+        assert db_session.get(BookReviewConsensus, test_book.id).review_count == 5
+    
+    def test_pending_batches_enqueue_catch_up_once(self, client, auth_headers, test_book, db_session, consensus_refresh_task):
+        """Test that an analysis leaving reviews unfolded enqueues the catch-up task once per debounce period."""
+        from unittest.mock import patch, AsyncMock
+        self._add_reviews(db_session, test_book.id, [f"Comment {i}" for i in range(5)])
+        
+        with patch('app.services.recommendation_service.settings.BOOK_CONSENSUS_BATCH_SIZE', 2), \
+                patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Partial"):
+            first = client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers).json()
+            client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers)
+        assert first["consensus_pending_reviews"] == 3
+        consensus_refresh_task.delay.assert_called_once_with(test_book.id)
+        
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Complete"):
+            self._add_reviews(db_session, test_book.id, ["Latest"])
+            analysis = client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers).json()
+        assert analysis["consensus_pending_reviews"] == 0
+
+
+class TestAnalysisCache:
+    """Test cases for the versioned result cache of the LLM-backed endpoints."""
+    
+    def test_repeat_analysis_is_served_from_cache(self, client, auth_headers, test_user, test_book, test_borrow, db_session):
+        """Test that the analysis is computed once until a new review lands."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.review_service import ReviewService
+        ReviewService().submit_review(test_user.id, test_book.id, "Great book", 5, db_session)
+        
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Readers liked it") as mock_summarize:
+            first = client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers).json()
+            second = client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers).json()
+            assert mock_summarize.call_count == 1
+        assert first == second
+    
+    async def test_new_review_invalidates_cached_results(self, db_session, test_user, test_book, test_borrow):
+        """Test that submitting a review expires both the book analysis and the user's summary."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.review_service import ReviewService
+        from app.services.recommendation_service import RecommendationService
+        service = RecommendationService(db_session)
+        ReviewService().submit_review(test_user.id, test_book.id, "Great book", 5, db_session)
+        
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Summary") as mock_summarize:
+            await service.get_book_reviews_analysis(test_book.id)
+            await service.get_genai_reviews_summary(test_user.id)
+            await service.get_book_reviews_analysis(test_book.id)
+            await service.get_genai_reviews_summary(test_user.id)
+            assert mock_summarize.call_count == 2
+            
+            ReviewService().submit_review(test_user.id, test_book.id, "Even better the second time", 5, db_session)
+            analysis = await service.get_book_reviews_analysis(test_book.id)
+            summary = await service.get_genai_reviews_summary(test_user.id)
+            assert mock_summarize.call_count == 4
+        assert analysis["total_reviews"] == 2 and summary["total_reviews"] == 2
+    
+    async def test_fallback_summary_is_not_cached(self, db_session, test_user, test_review):
+        """Test that a failed LLM call is retried on the next request."""
+        from unittest.mock import patch, AsyncMock
+        from app.services.recommendation_service import RecommendationService
+        service = RecommendationService(db_session)
+        
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value=None) as mock_summarize:
+            await service.get_genai_reviews_summary(test_user.id)
+            await service.get_genai_reviews_summary(test_user.id)
+            assert mock_summarize.call_count == 2
+
+
+class TestReviewSampling:
+    """Test cases for representative review sampling under a prompt token budget."""
+    
+    def _format(self, review):
+        return f"- Rating: {review['rating']}/5, Comment: {review['comment']}, Sentiment: {review['sentiment']}"
+    
+    def test_sample_fits_budget_and_keeps_distribution(self):
+        """Test that a large review set is sampled within budget, proportionally per stratum."""
+        from app.services.review_sampling_service import ReviewSamplingService
+        reviews = [
+            {"rating": 5, "sentiment": "positive", "comment": f"Loved chapter {i} and the way the plot unfolds around topic {i}"}
+            for i in range(600)
+        ] + [
+            {"rating": 1, "sentiment": "negative", "comment": f"Chapter {i} dragged on and topic {i} felt pointless to me"}
+            for i in range(200)
+        ]
+        sampler = ReviewSamplingService(token_budget=500)
+        sampled = sampler.select(reviews, self._format)
+        
+        assert sum(sampler.estimate_tokens(self._format(r)) + 1 for r in sampled) <= 500
+        ratings = [r["rating"] for r in sampled]
+        assert ratings.count(1) >= 1
+        assert abs(ratings.count(5) / len(ratings) - 0.75) <= 0.1
+    
+    def test_near_duplicates_and_long_comments(self):
+        """Test that near-duplicate comments are dropped and long comments truncated."""
+        from app.services.review_sampling_service import ReviewSamplingService
+        reviews = [
+            {"rating": 4, "sentiment": "positive", "comment": "A gripping story with wonderful characters and a clever ending"},
+            {"rating": 4, "sentiment": "positive", "comment": "A gripping story with wonderful characters and a clever ending!"},
+            {"rating": 4, "sentiment": "positive", "comment": "word " * 1000},
+        ]
+        sampled = ReviewSamplingService(token_budget=10000, comment_max_tokens=20).select(reviews, self._format)
+        
+        assert len(sampled) == 2
+        assert all(len(r["comment"]) <= 20 * ReviewSamplingService.CHARS_PER_TOKEN + 3 for r in sampled)
+    
+    async def test_analysis_prompt_is_bounded(self, db_session, test_book):
+        """Test that a book with many reviews gets a prompt within the token budget while counts cover all reviews."""
+        from unittest.mock import patch, AsyncMock
+        from app.models.review import Review
+        from app.services.review_sampling_service import ReviewSamplingService
+        from app.services.recommendation_service import RecommendationService
+        db_session.add_all([
+            Review(user_id=i, book_id=test_book.id, rating=1 + i % 5, comment=f"Review number {i} " + "detail " * 50)
+            for i in range(300)
+        ])
+        db_session.commit()
+        service = RecommendationService(db_session)
+        service.review_sampling_service = ReviewSamplingService(token_budget=1000)
+        
+        with patch('app.services.ai_service.AIService.summarize', new_callable=AsyncMock, return_value="Consensus") as mock_summarize:
+            analysis = await service.get_book_reviews_analysis(test_book.id, max_consensus_batches=None)
+        assert analysis["total_reviews"] == 300
+        assert mock_summarize.call_count == 2
+        for call in mock_summarize.call_args_list:
+            assert ReviewSamplingService.estimate_tokens(call.args[0]) < 1500
+
+
+class TestListBookReviews:
+    """Test cases for GET /api/books/{book_id}/reviews and the capped analysis list."""
+    
+    def _add_reviews(self, db_session, book_id, count):
+        from app.models.review import Review
+        for i in range(count):
+            db_session.add(Review(user_id=100 + i, book_id=book_id, rating=1 + i % 5, comment=f"Review {i}"))
+        db_session.commit()
+    
+    def test_keyset_pages_cover_every_review_once(self, client, auth_headers, test_book, test_book2, db_session):
+        """Test that following next_after_id walks all of a book's reviews in id order."""
+        self._add_reviews(db_session, test_book.id, 5)
+        self._add_reviews(db_session, test_book2.id, 2)
+        
+        seen, after_id = [], None
+        while True:
+            params = {"limit": 2} if after_id is None else {"limit": 2, "after_id": after_id}
+            response = client.get(f"/api/books/{test_book.id}/reviews", headers=auth_headers, params=params)
+            assert response.status_code == status.HTTP_200_OK
+            data = response.json()
+            assert len(data["reviews"]) <= 2
+            seen.extend(review["id"] for review in data["reviews"])
+            assert all(review["book_id"] == test_book.id for review in data["reviews"])
+            after_id = data["next_after_id"]
+            if after_id is None:
+                break
+        assert len(seen) == 5 and seen == sorted(seen)
+    
+    def test_page_matches_documented_schema(self, client, auth_headers, test_book, db_session):
+        """Test that the OpenAPI schema documents the page envelope the endpoint returns."""
+        from app.schemas.review_schema import ReviewPage
+        self._add_reviews(db_session, test_book.id, 3)
+        
+        data = client.get(f"/api/books/{test_book.id}/reviews", headers=auth_headers, params={"limit": 2}).json()
+        assert ReviewPage.model_validate(data).limit == 2
+        operation = client.get("/openapi.json").json()["paths"]["/api/books/{book_id}/reviews"]["get"]
+        schema = operation["responses"]["200"]["content"]["application/json"]["schema"]
+        assert schema["$ref"].endswith("/ReviewPage")
+    
+    def test_list_reviews_nonexistent_book(self, client, auth_headers):
+        """Test listing reviews of a book that does not exist."""
+        response = client.get("/api/books/99999/reviews", headers=auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_analysis_embeds_capped_review_list(self, client, auth_headers, test_book, db_session):
+        """Test that the analysis embeds only the first reviews and a cursor for the rest."""
+        from unittest.mock import patch
+        self._add_reviews(db_session, test_book.id, 5)
+        
+        with patch('app.services.recommendation_service.settings.ANALYSIS_EMBEDDED_REVIEWS', 3):
+            response = client.get(f"/api/books/{test_book.id}/analysis", headers=auth_headers)
+        data = response.json()
+        assert data["total_reviews"] == 5
+        assert len(data["reviews"]) == 3
+        
+        rest = client.get(f"/api/books/{test_book.id}/reviews", headers=auth_headers,
+                          params={"after_id": data["reviews_next_after_id"]}).json()
+        assert [review["comment"] for review in rest["reviews"]] == ["Review 3", "Review 4"]
+        assert rest["next_after_id"] is None
+
+
+class TestRequestCoalescing:
+    """Test cases for single-flight coalescing of concurrent LLM-backed requests."""
+    
+    class FakeRedis:
+        """Just enough of a Redis client for the single-flight lock."""
+        
+        def __init__(self):
+            self.values = {}
+        
+        def set(self, key, value, nx=False, px=None):
+            if nx and key in self.values:
+                return None
+            self.values[key] = value
+            return True
+        
+        def exists(self, key):
+            return int(key in self.values)
+        
+        def eval(self, script, numkeys, key, token):
+            if self.values.get(key) == token:
+                del self.values[key]
+                return 1
+            return 0
+    
+    async def test_concurrent_analyses_share_one_computation(self, db_session, test_review):
+        """Test that concurrent requests for the same book run the LLM-backed computation once."""
+        import asyncio
+        from unittest.mock import patch
+        from app.services.recommendation_service import RecommendationService
+        calls = 0
+        
+        async def slow_compute(self, book_id, max_consensus_batches=1, deadline=None):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"book_id": book_id, "summary": "shared"}, False
+        
+        with patch.object(RecommendationService, "compute_book_reviews_analysis", slow_compute):
+            results = await asyncio.gather(*(
+                RecommendationService(db_session).get_book_reviews_analysis(test_review.book_id) for _ in range(10)
+            ))
+            assert calls == 1
+            assert all(result == {"book_id": test_review.book_id, "summary": "shared"} for result in results)
+            # Once the flight is over the next request computes again (the result was not cacheable)
+            await RecommendationService(db_session).get_book_reviews_analysis(test_review.book_id)
+            assert calls == 2
+    
+    async def test_errors_are_shared_with_waiting_callers(self):
+        """Test that followers receive the leader's exception and the key is freed afterwards."""
+        import asyncio
+        from app.core.single_flight import SingleFlight
+        flights = SingleFlight("test")
+        
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("backend down")
+        
+        results = await asyncio.gather(*(flights.do("key", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert not flights.in_flight
+    
+    async def test_other_process_result_is_awaited_through_cache(self):
+        """Test that a held Redis lock makes this process wait for the cached result instead of computing."""
+        from unittest.mock import patch, AsyncMock
+        from app.core.single_flight import SingleFlight
+        redis = self.FakeRedis()
+        flights = SingleFlight("test", wait_seconds=5, poll_seconds=0.01)
+        redis.values["luminalib:singleflight:test:key"] = "other-process"
+        polls = []
+        
+        async def cache_get():
+            polls.append(1)
+            return "from other process" if len(polls) >= 3 else None
+        
+        compute = AsyncMock(return_value="computed here")
+        with patch('app.core.single_flight.get_redis', return_value=redis):
+            assert await flights.do("key", compute, cache_get=cache_get) == "from other process"
+            compute.assert_not_called()
+            
+            # The lock disappears without a cached result: compute locally
+            del redis.values["luminalib:singleflight:test:key"]
+            assert await flights.do("key", compute, cache_get=AsyncMock(return_value=None)) == "computed here"
+        # The leader released its own lock
+        assert not redis.values
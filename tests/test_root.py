@@ -18,3 +18,20 @@ class TestRootEndpoint:
         """Test that POST to root is not allowed."""
         response = client.post("/")
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+    
+    def test_startup_warns_without_shared_cache(self, caplog):
+        """Test that startup warns when REDIS_URL is unset and invalidation stays per process."""
+        import logging
+        from unittest.mock import patch
+        from fastapi.testclient import TestClient
+        from app.main import app
+        with patch('app.main.settings.REDIS_URL', None), caplog.at_level(logging.WARNING, logger="app.main"):
+            with TestClient(app):
+                pass
+        assert any("REDIS_URL is not set" in record.getMessage() for record in caplog.records)
+        
+        caplog.clear()
+        with patch('app.main.settings.REDIS_URL', "redis://redis:6379/1"), caplog.at_level(logging.WARNING, logger="app.main"):
+            with TestClient(app):
+                pass
+        assert not any("REDIS_URL" in record.getMessage() for record in caplog.records)